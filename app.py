@@ -3,7 +3,7 @@ Main Flask application configuration and routes.
 
 This module serves as the entry point for the Flask web application.
 It handles:
-- Application initialization and configuration
+- Application initialization and configuration (``create_app``)
 - Environment variable loading
 - Blueprint registration for auth and OAuth routes
 - Core application routes
@@ -16,72 +16,140 @@ The application uses:
 - Flask-Login for authentication
 - OAuthLib for third-party authentication
 - dotenv for environment management
+
+Importing this module builds nothing: ``create_app`` reads the
+environment, imports the extensions and blueprints, and returns a new
+app. Serve it with ``gunicorn 'app:create_app()'`` (``app:app`` also
+works); each call reconfigures the shared extensions for the new app.
 """
 
 from flask import Flask, render_template
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
-from flask_mail import Mail
-from auth.routes.oauth import oauth_bp, init_oauth
-from auth.routes.auth import auth_bp
-from auth.routes.twofa import twofa_bp
-from auth.routes.docs import docs_bp
-from auth import init_auth
 from dotenv import load_dotenv
 import os
 
-load_dotenv()
-
-app = Flask(__name__, template_folder='auth/templates')
-app.secret_key = os.getenv('FLASK_SECRET_KEY')
-if not app.secret_key:
-    raise ValueError("No FLASK_SECRET_KEY set in environment variables")
-
-# Load OAuth provider credentials
-app.config.update(
-    GOOGLE_CLIENT_ID=os.getenv('GOOGLE_CLIENT_ID'),
-    GOOGLE_CLIENT_SECRET=os.getenv('GOOGLE_CLIENT_SECRET'),
-    GITHUB_CLIENT_ID=os.getenv('GITHUB_CLIENT_ID'),
-    GITHUB_CLIENT_SECRET=os.getenv('GITHUB_CLIENT_SECRET'),
-    INSTAGRAM_CLIENT_ID=os.getenv('INSTAGRAM_CLIENT_ID'),
-    INSTAGRAM_CLIENT_SECRET=os.getenv('INSTAGRAM_CLIENT_SECRET'),
-    TWITTER_CLIENT_ID=os.getenv('TWITTER_CLIENT_ID'),
-    TWITTER_CLIENT_SECRET=os.getenv('TWITTER_CLIENT_SECRET')
-)
-
-# Configure email settings
-app.config.update(
-    MAIL_SERVER=os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
-    MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
-    MAIL_USE_TLS=os.getenv('MAIL_USE_TLS', 'True').lower() in ('true', 'yes', '1'),
-    MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
-    MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
-    MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
-)
-
-# Initialize rate limiter
-limiter = Limiter(
-    app,
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
-
-# Initialize Flask-Mail
-mail = Mail(app)
-
-# Initialize Auth and Database
-init_auth(app)
-
-# Initialize OAuth
-init_oauth(app)
-
-# Register blueprints
-app.register_blueprint(oauth_bp, url_prefix='/auth')
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(twofa_bp, url_prefix='/auth/2fa')
-app.register_blueprint(docs_bp, url_prefix='/docs')
-
-@app.errorhandler(404)
+
+def create_app(config=None):
+    """
+    Build and configure the application.
+
+    Args:
+        config (dict): Settings applied over the environment before the
+            extensions read their defaults, e.g.
+            ``{'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'}``
+
+    Returns:
+        Flask: Configured application
+
+    Raises:
+        ValueError: If no secret key is set
+
+    Extensions are module-level objects shared by every app in the
+    process. Only the config, database engines, routes and session
+    store are per app; the mail queue, hashing pool, identity cache,
+    login guard, rate limiter, OAuth registry, metrics, profiler and
+    log handler are configured by each call, so they follow the most
+    recently built app. Build one app per process to serve; tests and
+    benchmarks may build several, one after another.
+    """
+    load_dotenv()
+
+    from flask_mail import Mail
+    from auth import init_auth, init_migration_commands, db
+    from auth.logs import init_logging
+    from auth.mail_queue import mail_queue
+    from auth.metrics import metrics
+    from auth.profiling import profiler
+    from auth.rate_limit import init_rate_limiting
+    from auth.routes.auth import auth_bp
+    from auth.routes.docs import docs_bp
+    from auth.routes.oauth import oauth_bp, init_oauth
+    from auth.routes.twofa import twofa_bp
+    from auth.sessions import init_sessions
+
+    app = Flask(__name__, template_folder='auth/templates')
+    app.secret_key = os.getenv('FLASK_SECRET_KEY')
+
+    # Load OAuth provider credentials
+    app.config.update(
+        GOOGLE_CLIENT_ID=os.getenv('GOOGLE_CLIENT_ID'),
+        GOOGLE_CLIENT_SECRET=os.getenv('GOOGLE_CLIENT_SECRET'),
+        GITHUB_CLIENT_ID=os.getenv('GITHUB_CLIENT_ID'),
+        GITHUB_CLIENT_SECRET=os.getenv('GITHUB_CLIENT_SECRET'),
+        INSTAGRAM_CLIENT_ID=os.getenv('INSTAGRAM_CLIENT_ID'),
+        INSTAGRAM_CLIENT_SECRET=os.getenv('INSTAGRAM_CLIENT_SECRET'),
+        TWITTER_CLIENT_ID=os.getenv('TWITTER_CLIENT_ID'),
+        TWITTER_CLIENT_SECRET=os.getenv('TWITTER_CLIENT_SECRET')
+    )
+
+    # Configure email settings
+    app.config.update(
+        MAIL_SERVER=os.getenv('MAIL_SERVER', 'smtp.gmail.com'),
+        MAIL_PORT=int(os.getenv('MAIL_PORT', 587)),
+        MAIL_USE_TLS=os.getenv('MAIL_USE_TLS', 'True').lower() in ('true', 'yes', '1'),
+        MAIL_USERNAME=os.getenv('MAIL_USERNAME'),
+        MAIL_PASSWORD=os.getenv('MAIL_PASSWORD'),
+        MAIL_DEFAULT_SENDER=os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+    )
+
+    # Configure password hashing policy (see calibrate_password_hash.py)
+    app.config.update(
+        PASSWORD_HASH_ALGORITHM=os.getenv('PASSWORD_HASH_ALGORITHM', 'pbkdf2:sha256'),
+        PASSWORD_HASH_ITERATIONS=int(os.getenv('PASSWORD_HASH_ITERATIONS', 260000)),
+        PASSWORD_SALT_LENGTH=int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+    )
+
+    # Configure 2FA code storage ('hmac' or 'bcrypt')
+    app.config.update(
+        TWOFA_CODE_HASHER=os.getenv('TWOFA_CODE_HASHER', 'hmac'),
+        TWOFA_CODE_KEY=os.getenv('TWOFA_CODE_KEY')
+    )
+
+    # Caller's settings win over the environment; the extensions below
+    # only fill in what is still unset
+    app.config.update(config or {})
+    if not app.secret_key:
+        raise ValueError("No FLASK_SECRET_KEY set in environment variables")
+
+    # Structured, queued logging for the auth package (see auth/logs.py)
+    init_logging(app)
+
+    # Keep sessions server-side when SESSION_BACKEND is set (see auth/sessions.py)
+    init_sessions(app)
+
+    # Initialize the shared rate limiter (storage and limits from env)
+    init_rate_limiting(app)
+
+    # Initialize Flask-Mail and the background delivery queue
+    mail_queue.init_app(app, Mail(app), db)
+
+    # Initialize Auth and Database
+    init_auth(app)
+
+    # `flask db`; Flask-Migrate is imported when a migration command runs
+    init_migration_commands(app)
+
+    # Initialize OAuth
+    init_oauth(app)
+
+    # Record request, SQL, hashing, template, mail and OAuth timings on /metrics
+    # when METRICS_ENABLED is set (see auth/metrics.py)
+    metrics.init_app(app, db)
+
+    # Profile requests on demand and log slow ones when PROFILING_ENABLED or
+    # SLOW_REQUEST_MS is set (see auth/profiling.py)
+    profiler.init_app(app, db)
+
+    # Register blueprints
+    app.register_blueprint(oauth_bp, url_prefix='/auth')
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(twofa_bp, url_prefix='/auth/2fa')
+    app.register_blueprint(docs_bp, url_prefix='/docs')
+
+    app.register_error_handler(404, page_not_found)
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/create_test_user', 'create_test_user', create_test_user)
+    return app
+
 def page_not_found(e):
     """
     Handle 404 errors by rendering a custom 404 page.
@@ -94,7 +162,6 @@ def page_not_found(e):
     """
     return render_template('404.html'), 404
 
-@app.route('/')
 def index():
     """
     Render the main application index page.
@@ -104,7 +171,6 @@ def index():
     """
     return render_template('index.html')
 
-@app.route('/create_test_user')
 def create_test_user():
     """
     Development endpoint to create a test user.
@@ -142,5 +208,14 @@ def create_test_user():
         
         return f"Test user created: {test_username}/{test_password}"
 
+def __getattr__(name):
+    # `gunicorn app:app` and `from app import app` get a default app,
+    # built on first access rather than when the module is imported
+    if name == 'app':
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    create_app().run(debug=True, port=5001)
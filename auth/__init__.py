@@ -1,13 +1,22 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, current_user
-from flask_migrate import Migrate
 from functools import wraps
 from flask import redirect, url_for
+from flask.cli import ScriptInfo
+import click
 import ssl
+from .hashing import hashing
+from .identity_cache import identity_cache
+from .database import load_database_config, init_engine
+from .db_routing import RoutingSession, init_routing
+from .query_stats import init_query_stats
+from .challenges import challenge_store
+from .login_guard import login_guard
+from .tokens import token_service
 
-db = SQLAlchemy()
+# Reads go to replica binds when configured (see db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
-migrate = Migrate()
 
 # Configure SSL context using standard library
 ssl_context = ssl.create_default_context()
@@ -22,16 +31,57 @@ def verification_required(f):
     return decorated_function
 
 def init_auth(app):
-    # Database configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///auth.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Database configuration (DATABASE_URL, pool and SQLite tuning from env)
+    load_database_config(app)
     
     db.init_app(app)
+    init_engine(app, db)
+    init_routing(app, db)
+    init_query_stats(app, db)
     login_manager.init_app(app)
-    migrate.init_app(app, db)
+    hashing.init_app(app)
+    challenge_store.init_app(app, db)
+    token_service.init_app(app)
         
     from .models import User
+    identity_cache.init_app(app, db, User)
+    login_guard.init_app(app, db, User)
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Served from the identity cache; entries are invalidated when a
+        # commit writes the user's row
+        return identity_cache.get_user(int(user_id))
+
+
+def init_migrations(app):
+    """
+    Bind Flask-Migrate, for ``flask db`` and run_migrations.py.
+
+    Alembic takes longer to import than the rest of the app's extensions
+    and is only needed to change the schema, so init_auth leaves it out.
+    """
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
+
+class _LazyMigrateGroup(click.Group):
+    """``flask db``, binding Flask-Migrate when a subcommand is looked up."""
+
+    def _migrate_commands(self, ctx):
+        app = ctx.ensure_object(ScriptInfo).load_app()
+        if 'migrate' not in app.extensions:
+            init_migrations(app)
+        from flask_migrate.cli import db as migrate_commands
+        return migrate_commands
+
+    def list_commands(self, ctx):
+        return self._migrate_commands(ctx).list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._migrate_commands(ctx).get_command(ctx, name)
+
+
+def init_migration_commands(app):
+    """Register ``flask db`` without importing Alembic until it is used."""
+    app.cli.add_command(_LazyMigrateGroup('db', help='Perform database migrations.'))
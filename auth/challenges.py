@@ -0,0 +1,455 @@
+"""
+Store for pending two-factor authentication challenges.
+
+A challenge is one issued verification code: who it was issued to, the
+code hash, when it expires and how many wrong guesses have been made.
+Keeping challenges out of the users table means issuing and checking
+codes never rewrites the user row, which stays read-mostly and cacheable.
+Provides:
+- SQL backend (twofa_challenges table with an expiry index); writes join
+  the caller's unit of work and are committed with it
+- In-memory backend for single-process development
+- Redis backend with server-side TTLs (requires the ``redis`` package)
+- Token backend: the challenge travels in a signed, encrypted token kept
+  in the user's session, so issuing a code writes nothing; verification
+  only checks the token's one-time nonce in a small TTL store
+- A background sweeper that deletes expired challenges
+- Attempt counting with a per-challenge limit
+
+Configuration (app.config / environment):
+- TWOFA_CHALLENGE_BACKEND: 'sql' (default), 'memory', 'redis' or 'token'
+- TWOFA_CHALLENGE_URL: Redis URL for the redis backend and token nonces
+- TWOFA_NONCE_BACKEND: Nonce store for the token backend, 'memory'
+  (default, single process only) or 'redis'
+- TWOFA_TOKEN_KEY: Token signing/encryption key (default: derived from
+  the app SECRET_KEY)
+- TWOFA_MAX_ATTEMPTS: Wrong codes allowed per challenge (default 5)
+- TWOFA_CHALLENGE_SWEEP_INTERVAL: Seconds between sweeps (default 300)
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from .login_guard import MemoryCounterStore, RedisCounterStore
+
+logger = logging.getLogger(__name__)
+
+Challenge = namedtuple('Challenge', ['id', 'user_id', 'code_hash', 'expires_at', 'attempts'])
+
+
+class SqlChallengeBackend:
+    """
+    Challenges in the twofa_challenges table.
+
+    Writes are added to the current session and not committed, so the
+    route that issues or checks a code commits once for the request.
+    Verification reads the row with SELECT ... FOR UPDATE and counts
+    wrong codes with an UPDATE in SQL, so concurrent guesses at one
+    code are checked one at a time and every one is counted.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def _model(self):
+        from .models import TwoFactorChallenge
+        return TwoFactorChallenge
+
+    def save(self, challenge):
+        self.db.session.add(self._model()(**challenge._asdict()))
+        return challenge.id
+
+    def get(self, challenge_id):
+        # Locks the row until the request commits (also keeps it on the primary)
+        row = self.db.session.get(self._model(), challenge_id, with_for_update=True)
+        if row is None:
+            return None
+        return Challenge(row.id, row.user_id, row.code_hash, row.expires_at, row.attempts)
+
+    def record_failure(self, challenge_id):
+        model = self._model()
+        stmt = (
+            self.db.update(model)
+            .where(model.id == challenge_id)
+            .values(attempts=model.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        dialect = self.db.engine.dialect
+        if getattr(dialect, 'update_returning', getattr(dialect, 'full_returning', False)):
+            return self.db.session.execute(stmt.returning(model.attempts)).scalar() or 0
+        if self.db.session.execute(stmt).rowcount == 0:
+            return 0
+        return self.db.session.execute(
+            self.db.select(model.attempts).where(model.id == challenge_id),
+            bind_arguments={'bind': self.db.engine}
+        ).scalar()
+
+    def delete(self, challenge_id):
+        model = self._model()
+        model.query.filter_by(id=challenge_id).delete(synchronize_session=False)
+
+    def consume(self, challenge_id):
+        # One DELETE; of two concurrent consumes only one removes the row
+        model = self._model()
+        return model.query.filter_by(id=challenge_id).delete(synchronize_session=False) == 1
+
+    def sweep(self, now):
+        model = self._model()
+        deleted = model.query.filter(model.expires_at < now).delete(synchronize_session=False)
+        self.db.session.commit()
+        return deleted
+
+
+class MemoryChallengeBackend:
+    """
+    Challenges in a process-local dict.
+
+    Only suitable for a single worker process: a challenge issued by one
+    process cannot be verified by another.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def save(self, challenge):
+        with self._lock:
+            self._data[challenge.id] = challenge
+        return challenge.id
+
+    def get(self, challenge_id):
+        with self._lock:
+            return self._data.get(challenge_id)
+
+    def record_failure(self, challenge_id):
+        with self._lock:
+            challenge = self._data.get(challenge_id)
+            if challenge is None:
+                return 0
+            challenge = challenge._replace(attempts=challenge.attempts + 1)
+            self._data[challenge_id] = challenge
+            return challenge.attempts
+
+    def delete(self, challenge_id):
+        with self._lock:
+            self._data.pop(challenge_id, None)
+
+    def consume(self, challenge_id):
+        with self._lock:
+            return self._data.pop(challenge_id, None) is not None
+
+    def sweep(self, now):
+        with self._lock:
+            expired = [cid for cid, c in self._data.items() if c.expires_at < now]
+            for challenge_id in expired:
+                del self._data[challenge_id]
+        return len(expired)
+
+
+class RedisChallengeBackend:
+    """
+    Challenges in a Redis-protocol server, expired by Redis itself.
+
+    Args:
+        url (str): Redis connection URL
+        prefix (str): Key prefix
+    """
+
+    def __init__(self, url, prefix='twofa:challenge:'):
+        import redis
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    def save(self, challenge):
+        key = f'{self.prefix}{challenge.id}'
+        ttl = max(1, int((challenge.expires_at - datetime.utcnow()).total_seconds()))
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            'user_id': challenge.user_id,
+            'code_hash': challenge.code_hash,
+            'expires_at': challenge.expires_at.isoformat(),
+            'attempts': challenge.attempts,
+        })
+        pipe.expire(key, ttl)
+        pipe.execute()
+        return challenge.id
+
+    def get(self, challenge_id):
+        data = self.client.hgetall(f'{self.prefix}{challenge_id}')
+        if not data:
+            return None
+        return Challenge(
+            challenge_id,
+            int(data['user_id']),
+            data['code_hash'],
+            datetime.fromisoformat(data['expires_at']),
+            int(data['attempts']),
+        )
+
+    def record_failure(self, challenge_id):
+        key = f'{self.prefix}{challenge_id}'
+        if not self.client.exists(key):
+            return 0
+        return self.client.hincrby(key, 'attempts', 1)
+
+    def delete(self, challenge_id):
+        self.client.delete(f'{self.prefix}{challenge_id}')
+
+    def consume(self, challenge_id):
+        return self.client.delete(f'{self.prefix}{challenge_id}') == 1
+
+    def sweep(self, now):
+        # Redis expires keys on its own
+        return 0
+
+
+class _EncryptedJSON:
+    """JSON payload serializer that encrypts with Fernet."""
+
+    def __init__(self, fernet):
+        self.fernet = fernet
+
+    def dumps(self, obj):
+        return self.fernet.encrypt(json.dumps(obj, separators=(',', ':')).encode('utf-8'))
+
+    def loads(self, data):
+        return json.loads(self.fernet.decrypt(data))
+
+
+class TokenChallengeBackend:
+    """
+    Challenges carried in signed, encrypted tokens instead of stored.
+
+    The token (user id, code MAC, expiry and a random nonce) is the
+    challenge id the caller keeps in the session, so issuing a code makes
+    no database write. The payload is encrypted so the code MAC never
+    reaches the client, and signed with the itsdangerous serializer used
+    for password reset tokens. Failed attempts and use are recorded
+    against the nonce in a TTL store that forgets it once the token has
+    expired.
+
+    Args:
+        secret_key (bytes): Key for signing and encryption
+        nonces: Counter store with ``incr``, ``set`` and ``exists``
+            (see login_guard.py)
+    """
+
+    _EPOCH = datetime(1970, 1, 1)
+
+    def __init__(self, secret_key, nonces):
+        from cryptography.fernet import Fernet
+        fernet_key = hmac.new(secret_key, b'twofa-challenge-token', hashlib.sha256).digest()
+        self.serializer = URLSafeTimedSerializer(
+            secret_key,
+            salt='twofa-challenge',
+            serializer=_EncryptedJSON(Fernet(base64.urlsafe_b64encode(fernet_key)))
+        )
+        self.nonces = nonces
+
+    def _load(self, token):
+        """Decode a token into (nonce, user_id, code_hash, expires_at)."""
+        from cryptography.fernet import InvalidToken
+        try:
+            nonce, user_id, code_hash, expires = self.serializer.loads(token)
+        except (BadSignature, InvalidToken, TypeError, ValueError):
+            return None
+        return nonce, user_id, code_hash, datetime.utcfromtimestamp(expires)
+
+    def _ttl(self, expires_at):
+        # Nonce state is only needed while the token itself is valid
+        return max(1, int((expires_at - datetime.utcnow()).total_seconds()) + 1)
+
+    def save(self, challenge):
+        expires = (challenge.expires_at - self._EPOCH).total_seconds()
+        return self.serializer.dumps([challenge.id, challenge.user_id, challenge.code_hash, expires])
+
+    def get(self, token):
+        data = self._load(token)
+        if data is None:
+            return None
+        nonce, user_id, code_hash, expires_at = data
+        if self.nonces.exists(f'used:{nonce}'):
+            return None
+        # Exhausted challenges are marked used, so attempts are not needed here
+        return Challenge(token, user_id, code_hash, expires_at, 0)
+
+    def record_failure(self, token):
+        data = self._load(token)
+        if data is None:
+            return 0
+        return self.nonces.incr(f'fail:{data[0]}', self._ttl(data[3]))
+
+    def delete(self, token):
+        data = self._load(token)
+        if data is not None:
+            self.nonces.set(f'used:{data[0]}', self._ttl(data[3]))
+
+    def consume(self, token):
+        data = self._load(token)
+        if data is None:
+            return False
+        return self.nonces.incr(f'used:{data[0]}', self._ttl(data[3])) == 1
+
+    def sweep(self, now):
+        # Nothing is stored; the nonce store expires entries itself
+        return 0
+
+
+class ChallengeStore:
+    """
+    Issues and checks 2FA challenges against a pluggable backend.
+
+    Create once at module level and bind with ``init_app``. The sweeper
+    thread is started lazily in each process on first use.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.backend = None
+        self.max_attempts = 5
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db):
+        """
+        Configure the backend from the application config.
+
+        Args:
+            app: Flask application instance
+            db: Flask-SQLAlchemy extension (for the SQL backend)
+        """
+        app.config.setdefault('TWOFA_CHALLENGE_BACKEND', os.getenv('TWOFA_CHALLENGE_BACKEND', 'sql'))
+        app.config.setdefault('TWOFA_CHALLENGE_URL', os.getenv('TWOFA_CHALLENGE_URL', 'redis://localhost:6379/0'))
+        app.config.setdefault('TWOFA_NONCE_BACKEND', os.getenv('TWOFA_NONCE_BACKEND', 'memory'))
+        app.config.setdefault('TWOFA_TOKEN_KEY', os.getenv('TWOFA_TOKEN_KEY'))
+        app.config.setdefault('TWOFA_MAX_ATTEMPTS', int(os.getenv('TWOFA_MAX_ATTEMPTS', 5)))
+        app.config.setdefault(
+            'TWOFA_CHALLENGE_SWEEP_INTERVAL',
+            float(os.getenv('TWOFA_CHALLENGE_SWEEP_INTERVAL', 300))
+        )
+
+        backend = app.config['TWOFA_CHALLENGE_BACKEND']
+        if backend == 'sql':
+            self.backend = SqlChallengeBackend(db)
+        elif backend == 'memory':
+            self.backend = MemoryChallengeBackend()
+        elif backend == 'redis':
+            self.backend = RedisChallengeBackend(app.config['TWOFA_CHALLENGE_URL'])
+        elif backend == 'token':
+            self.backend = TokenChallengeBackend(self._token_key(app), self._nonce_store(app))
+        else:
+            raise ValueError(f"Unknown TWOFA_CHALLENGE_BACKEND: {backend}")
+
+        self.app = app
+        self.max_attempts = app.config['TWOFA_MAX_ATTEMPTS']
+        app.extensions['twofa_challenges'] = self
+
+    @staticmethod
+    def _token_key(app):
+        key = app.config['TWOFA_TOKEN_KEY'] or app.config['SECRET_KEY']
+        return key.encode('utf-8') if isinstance(key, str) else key
+
+    @staticmethod
+    def _nonce_store(app):
+        backend = app.config['TWOFA_NONCE_BACKEND']
+        if backend == 'memory':
+            return MemoryCounterStore()
+        if backend == 'redis':
+            return RedisCounterStore(app.config['TWOFA_CHALLENGE_URL'], prefix='twofa:nonce:')
+        raise ValueError(f"Unknown TWOFA_NONCE_BACKEND: {backend}")
+
+    def create(self, user_id, code_hash, expires_at):
+        """
+        Store a new challenge.
+
+        Args:
+            user_id (int): User the code is issued to
+            code_hash (str): Hash of the code
+            expires_at (datetime): Expiration time (UTC)
+
+        Returns:
+            str: Challenge id to keep in the user's session (with the
+            token backend, the token itself)
+        """
+        self._ensure_sweeper()
+        challenge = Challenge(secrets.token_urlsafe(24), user_id, code_hash, expires_at, 0)
+        return self.backend.save(challenge)
+
+    def verify(self, challenge_id, user_id, check):
+        """
+        Check a submitted code against a challenge.
+
+        Args:
+            challenge_id (str): Challenge id from the session
+            user_id (int): User attempting verification
+            check: Callable taking the stored code hash, returning bool
+
+        Returns:
+            bool: True if the code matched. The challenge is consumed on
+            success, and deleted once expired or out of attempts.
+        """
+        challenge = self.backend.get(challenge_id)
+        if challenge is None or challenge.user_id != user_id:
+            return False
+        if challenge.expires_at < datetime.utcnow() or challenge.attempts >= self.max_attempts:
+            self.backend.delete(challenge_id)
+            return False
+        if check(challenge.code_hash):
+            # Only one of several concurrent correct submissions wins
+            return self.backend.consume(challenge_id)
+        if self.backend.record_failure(challenge_id) >= self.max_attempts:
+            self.backend.delete(challenge_id)
+        return False
+
+    def discard(self, challenge_id):
+        """Delete a challenge, e.g. when a new code replaces it."""
+        self.backend.delete(challenge_id)
+
+    def sweep(self):
+        """
+        Delete expired challenges.
+
+        Returns:
+            int: Number of challenges removed
+        """
+        return self.backend.sweep(datetime.utcnow())
+
+    def _ensure_sweeper(self):
+        """Start the sweeper thread once per process."""
+        interval = self.app.config['TWOFA_CHALLENGE_SWEEP_INTERVAL']
+        if not interval or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            thread = threading.Thread(
+                target=self._sweep_loop,
+                args=(interval,),
+                name='twofa-challenge-sweeper',
+                daemon=True
+            )
+            thread.start()
+            self._sweeper_pid = os.getpid()
+
+    def _sweep_loop(self, interval):
+        stopped = threading.Event()
+        while not stopped.wait(interval):
+            with self.app.app_context():
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error("Challenge sweep failed: %s", e)
+
+
+# Shared instance, bound to the app in init_auth
+challenge_store = ChallengeStore()
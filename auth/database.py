@@ -0,0 +1,115 @@
+"""
+Database engine configuration.
+
+Builds the SQLAlchemy URI and engine options from the environment so
+deployments can point at a pooled server database, and tunes SQLite
+connections for concurrent workers. Provides:
+- DATABASE_URL with connection pool settings for server databases
+- A tuned SQLite mode applied through connect-event pragmas: WAL
+  journaling, synchronous=NORMAL, a busy timeout and memory-mapped I/O
+
+Configuration (app.config / environment):
+- DATABASE_URL: SQLAlchemy URI (default sqlite:///auth.db)
+- DB_POOL_SIZE: Persistent connections per process (server databases)
+- DB_MAX_OVERFLOW: Extra connections allowed above the pool size
+- DB_POOL_PRE_PING: Test connections before use (default True)
+- DB_POOL_RECYCLE: Seconds before a connection is replaced (default 1800)
+- SQLITE_TUNED: Apply the SQLite pragmas below (default True)
+- SQLITE_BUSY_TIMEOUT_MS: Wait this long for a lock (default 5000)
+- SQLITE_SYNCHRONOUS: SQLite synchronous level (default NORMAL)
+- SQLITE_MMAP_SIZE: Bytes of the database to memory-map (default 256MB)
+- DATABASE_REPLICA_URLS: Comma-separated read replica URIs (see db_routing.py)
+"""
+
+import os
+
+from sqlalchemy import event
+
+from .db_routing import replica_binds
+
+
+def _env_flag(name, default):
+    return os.getenv(name, default).lower() in ('true', 'yes', '1')
+
+
+def load_database_config(app):
+    """
+    Populate database settings from the environment.
+
+    Args:
+        app: Flask application instance
+
+    Values already present in ``app.config`` take precedence, so callers
+    (and benchmarks) can override any setting before ``init_auth``.
+    """
+    uri = os.getenv('DATABASE_URL', 'sqlite:///auth.db')
+    # Some hosts still hand out the deprecated postgres:// scheme
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', uri)
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+
+    replica_urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config.setdefault('SQLALCHEMY_BINDS', replica_binds(replica_urls))
+    app.config.setdefault('DB_REPLICA_STICKY_SECONDS', int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5)))
+    app.config.setdefault('SQLITE_REPLICA_SYNC_INTERVAL', float(os.getenv('SQLITE_REPLICA_SYNC_INTERVAL', 0)))
+
+    app.config.setdefault('SQLITE_TUNED', _env_flag('SQLITE_TUNED', 'True'))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)))
+    app.config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    app.config.setdefault('SQLITE_MMAP_SIZE', int(os.getenv('SQLITE_MMAP_SIZE', 268435456)))
+
+    options = {
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', 'True'),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    # Pool sizing only applies to pooled server databases; SQLite file
+    # databases use a pool class that rejects these arguments
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', 10))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', options)
+
+
+def init_engine(app, db):
+    """
+    Install connection hooks on the application's engines.
+
+    Args:
+        app: Flask application instance (after ``db.init_app``)
+        db: Flask-SQLAlchemy extension
+    """
+    if not app.config['SQLITE_TUNED']:
+        return
+    pragmas = _sqlite_pragmas(app.config)
+
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    # Primary and any replica binds
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _apply_sqlite_pragmas)
+
+
+def _sqlite_pragmas(config):
+    """
+    Build the pragma statements for tuned SQLite connections.
+
+    Args:
+        config: Application config
+
+    Returns:
+        list: PRAGMA statements run on each new connection
+    """
+    return [
+        'PRAGMA journal_mode=WAL',
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
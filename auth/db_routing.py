@@ -0,0 +1,181 @@
+"""
+Read/write session routing for primary and replica databases.
+
+Most requests only read (user loader, login lookup, reset token lookup),
+so reads can be spread over replicas while writes go to the primary.
+Provides:
+- RoutingSession: sends flushes, DML and locking reads to the primary
+  and other reads to a randomly chosen replica
+- Read-your-writes stickiness: after a commit, the rest of the request
+  and (via a short-lived marker in the Flask session) the next few
+  seconds of that client's requests read from the primary
+- SqliteReplicator: a development stand-in that keeps replica SQLite
+  files in sync with the primary by periodic online backups
+
+Configuration (app.config / environment):
+- DATABASE_REPLICA_URLS: Comma-separated replica URIs (default: none)
+- DB_REPLICA_STICKY_SECONDS: Read-from-primary window after a commit
+  (default 5)
+- SQLITE_REPLICA_SYNC_INTERVAL: Seconds between stand-in syncs; 0
+  disables the stand-in (default 0)
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+_STICKY_KEY = 'db_sticky_primary'
+_SESSION_STICKY_KEY = '_db_primary_until'
+
+
+class RoutingSession(Session):
+    """
+    Flask-SQLAlchemy session that routes reads to replica binds.
+
+    Replica engines are the binds whose key starts with ``replica_``
+    (see ``replica_binds``). Without any replica binds configured the
+    session behaves exactly like the default one, and never reads the
+    Flask session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            replicas = replica_engines(self._db)
+            if replicas and self._read_from_replica(clause):
+                return random.choice(replicas)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _read_from_replica(self, clause):
+        """Decide whether a statement may be served by a replica."""
+        if self._flushing or self.info.get(_STICKY_KEY):
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        if has_request_context():
+            primary_until = flask_session.get(_SESSION_STICKY_KEY)
+            if primary_until and primary_until > time.time():
+                return False
+        return True
+
+
+def replica_binds(urls):
+    """
+    Build SQLALCHEMY_BINDS entries for replica URIs.
+
+    Args:
+        urls (list): Replica database URIs
+
+    Returns:
+        dict: Bind key to URI mapping
+    """
+    return {f'{REPLICA_BIND_PREFIX}{i}': url for i, url in enumerate(urls)}
+
+
+def replica_engines(db):
+    """
+    Replica engines of the current app.
+
+    Args:
+        db: Flask-SQLAlchemy extension
+
+    Returns:
+        list: Engines of the ``replica_*`` binds (empty without replicas)
+    """
+    return [
+        engine for key, engine in db.engines.items()
+        if key and key.startswith(REPLICA_BIND_PREFIX)
+    ]
+
+
+def init_routing(app, db):
+    """
+    Register read-your-writes stickiness for the routing session.
+
+    Args:
+        app: Flask application instance
+        db: Flask-SQLAlchemy extension created with RoutingSession
+    """
+    if app.extensions.get('db_routing'):
+        return
+
+    @event.listens_for(db.session, 'after_commit')
+    def _stick_to_primary(session):
+        session.info[_STICKY_KEY] = True
+        # The marker is only read when routing to replicas; setting it
+        # otherwise would write the Flask session on every commit
+        if has_request_context() and replica_engines(db):
+            sticky_seconds = current_app.config['DB_REPLICA_STICKY_SECONDS']
+            if sticky_seconds:
+                flask_session[_SESSION_STICKY_KEY] = time.time() + sticky_seconds
+
+    app.extensions['db_routing'] = True
+
+    interval = app.config['SQLITE_REPLICA_SYNC_INTERVAL']
+    if interval:
+        with app.app_context():
+            primary = db.engine.url.database
+            replicas = [engine.url.database for engine in replica_engines(db)]
+        SqliteReplicator(primary, replicas, interval).start()
+
+
+class SqliteReplicator:
+    """
+    Development stand-in for database replication.
+
+    Copies the primary SQLite file onto each replica file with the
+    SQLite online backup API, so replicas lag the primary by up to one
+    interval, much like asynchronous replication. Not for production.
+
+    Args:
+        primary (str): Path of the primary database file
+        replicas (list): Paths of the replica database files
+        interval (float): Seconds between syncs
+    """
+
+    def __init__(self, primary, replicas, interval):
+        self.primary = primary
+        self.replicas = replicas
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def sync(self):
+        """Copy the primary onto every replica once."""
+        source = sqlite3.connect(self.primary)
+        try:
+            for path in self.replicas:
+                target = sqlite3.connect(path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+        finally:
+            source.close()
+
+    def start(self):
+        """Sync once, then keep syncing in a daemon thread."""
+        self.sync()
+        thread = threading.Thread(target=self._run, name='sqlite-replicator', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop the background sync thread."""
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.sync()
+            except sqlite3.Error as e:
+                logger.error("Replica sync failed: %s", e)
@@ -0,0 +1,241 @@
+"""
+Hashing service for password and 2FA-code hashing.
+
+Password hashing (Werkzeug PBKDF2) and bcrypt are CPU-bound and hold
+the GIL, so running them on the request thread lets a burst of login
+attempts starve every other route. This module runs them in a
+fixed-size process pool instead and provides:
+- Admission control: a cap on outstanding hash jobs that fails fast
+  with 503 Service Unavailable rather than queuing without bound; a
+  job that outlives HASH_TIMEOUT also answers 503 and keeps its slot
+  until the worker has finished it
+- Recovery from dead workers: a pool broken by a crashed or killed
+  worker process is replaced, and its jobs answer 503
+- Per-job latency counters and an outstanding-jobs gauge for sizing
+  the pool per node
+
+Configuration (app.config / environment):
+- HASH_POOL_SIZE: Worker processes (default: CPU count, 0 runs inline)
+- HASH_MAX_PENDING: Maximum outstanding jobs (default: 8 per worker)
+- HASH_TIMEOUT: Seconds to wait for a job before giving up (default 10)
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug import security
+
+from .metrics import metrics
+from .profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class HashingBusy(ServiceUnavailable):
+    """Raised when the hashing pool is saturated; renders as a 503."""
+    description = 'The server is busy. Please try again in a moment.'
+
+
+def _bcrypt_hash(value):
+    """Hash a string with bcrypt (runs in a worker process)."""
+    return bcrypt.hashpw(value.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def _bcrypt_check(value, hashed):
+    """Check a string against a bcrypt hash (runs in a worker process)."""
+    return bcrypt.checkpw(value.encode('utf-8'), hashed.encode('utf-8'))
+
+
+class HashingService:
+    """
+    Process-pool executor for CPU-bound hashing with admission control.
+
+    Create once at module level and bind with ``init_app``. The pool is
+    created lazily per process so forked workers do not inherit a pool
+    whose processes belong to the parent. When unbound (e.g. in CLI
+    scripts) or with ``HASH_POOL_SIZE=0``, jobs run inline.
+    """
+
+    def __init__(self, app=None):
+        self.pool_size = 0
+        self.max_pending = 0
+        self.timeout = None
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._restarts = 0
+        self._jobs = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Read pool configuration from the application.
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('HASH_POOL_SIZE', int(os.getenv('HASH_POOL_SIZE', os.cpu_count() or 1)))
+        app.config.setdefault(
+            'HASH_MAX_PENDING',
+            int(os.getenv('HASH_MAX_PENDING', max(app.config['HASH_POOL_SIZE'], 1) * 8))
+        )
+        app.config.setdefault('HASH_TIMEOUT', float(os.getenv('HASH_TIMEOUT', 10)))
+
+        self.pool_size = app.config['HASH_POOL_SIZE']
+        self.max_pending = app.config['HASH_MAX_PENDING']
+        self.timeout = app.config['HASH_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['hashing'] = self
+
+    def generate_password_hash(self, password, **kwargs):
+        """Hash a password with Werkzeug in the pool."""
+        return self.run('password_hash', security.generate_password_hash, password, **kwargs)
+
+    def check_password_hash(self, pwhash, password):
+        """Verify a password against a Werkzeug hash in the pool."""
+        return self.run('password_verify', security.check_password_hash, pwhash, password)
+
+    def bcrypt_hash(self, value):
+        """Hash a short secret (e.g. a 2FA code) with bcrypt in the pool."""
+        return self.run('bcrypt_hash', _bcrypt_hash, value)
+
+    def bcrypt_check(self, value, hashed):
+        """Verify a short secret against a bcrypt hash in the pool."""
+        return self.run('bcrypt_check', _bcrypt_check, value, hashed)
+
+    def run(self, name, fn, *args, **kwargs):
+        """
+        Run a hashing job, subject to admission control.
+
+        Args:
+            name (str): Job name used for latency counters
+            fn: Picklable module-level function to run
+            *args: Positional arguments for ``fn``
+            **kwargs: Keyword arguments for ``fn``
+
+        Returns:
+            Result of ``fn``
+
+        Raises:
+            HashingBusy: If the number of outstanding jobs is at the cap,
+                the job does not finish within HASH_TIMEOUT, or its worker
+                process died
+        """
+        if self._slots is not None and not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy()
+
+        with self._lock:
+            self._pending += 1
+        started = time.perf_counter()
+        try:
+            if self.pool_size > 0:
+                try:
+                    executor, future = self._submit(fn, *args, **kwargs)
+                except BaseException:
+                    self._release()
+                    raise
+                # The slot is freed when the worker is done with the job,
+                # not when this caller stops waiting for it
+                future.add_done_callback(self._release)
+                try:
+                    return future.result(timeout=self.timeout)
+                except FutureTimeout:
+                    future.cancel()
+                    with self._lock:
+                        self._timed_out += 1
+                    raise HashingBusy()
+                except BrokenProcessPool:
+                    # A worker died with this job queued or running; the job
+                    # is not retried, in case it is what killed the worker
+                    self._replace_executor(executor)
+                    raise HashingBusy()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._release()
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                job = self._jobs.setdefault(name, {'count': 0, 'seconds_total': 0.0, 'seconds_max': 0.0})
+                job['count'] += 1
+                job['seconds_total'] += elapsed
+                job['seconds_max'] = max(job['seconds_max'], elapsed)
+            metrics.observe('hash_duration_seconds', elapsed, job=name)
+            profiler.record_hash(name, elapsed)
+
+    def _submit(self, fn, *args, **kwargs):
+        """Submit a job, replacing the pool once if it is broken."""
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._replace_executor(executor)
+            raise HashingBusy()
+
+    def _replace_executor(self, broken):
+        """Swap a broken pool for a new one (once, however many jobs saw it)."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+            self._restarts += 1
+        logger.error("Hashing pool broken by a dead worker process; replaced it",
+                     extra={'event': 'hash_pool_restarted'})
+        broken.shutdown(wait=False)
+
+    def _release(self, future=None):
+        """Give back a job's admission slot (also a future done-callback)."""
+        with self._lock:
+            self._pending -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def stats(self):
+        """
+        Return a snapshot of pool counters.
+
+        Returns:
+            dict: ``pending``, ``max_pending``, ``rejected``, ``timed_out``,
+            ``restarts``, ``pool_size`` and per-job ``jobs`` latency counters
+        """
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'restarts': self._restarts,
+                'jobs': {name: dict(job) for name, job in self._jobs.items()},
+            }
+
+    def _get_executor(self):
+        """Create the process pool once per process."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ProcessPoolExecutor(max_workers=self.pool_size)
+                    self._pid = os.getpid()
+        return self._executor
+
+
+# Shared instance, bound to the app in init_auth
+hashing = HashingService()
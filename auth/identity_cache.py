@@ -0,0 +1,361 @@
+"""
+Identity cache for the Flask-Login user loader.
+
+Flask-Login calls ``load_user`` on every authenticated request, which
+costs a database round trip just to read the current user's row. This
+module keeps a snapshot of each user's row (a plain dict of the columns
+requests display, without secrets) in a bounded TTL cache and rebuilds
+the user from it without a query. Provides:
+- In-process LRU backend with TTL
+- Shared Redis backend for multi-worker deployments (requires the
+  ``redis`` package; any Redis-protocol server works)
+- Automatic invalidation when a User row is inserted, updated or deleted
+  and the transaction commits; a row read on a miss is only cached if
+  no invalidation ran meanwhile, so a concurrent commit cannot leave a
+  stale snapshot behind
+- An in-process map of OAuth identities (provider, provider id) to user
+  ids, so returning OAuth users are found without a query. It stays in
+  memory with every backend: each hit is checked against the loaded
+  row, so a stale id costs one query and is never trusted
+- Hit/miss counters
+
+Configuration (app.config / environment):
+- IDENTITY_CACHE_BACKEND: 'memory' (default), 'redis' or 'none'
+- IDENTITY_CACHE_SIZE: Maximum entries for the memory backend (default 10000)
+- IDENTITY_CACHE_TTL: Seconds before an entry expires (default 300)
+- IDENTITY_CACHE_URL: Redis URL for the redis backend
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+_PENDING_KEY = 'identity_cache_invalidate'
+
+# User columns kept in a snapshot: what the user loader, templates and
+# OAuth lookups read. Secrets (password hash, TOTP secret, legacy code
+# hash) are never cached; on a cached user they load from the database
+# when first accessed.
+_SNAPSHOT_COLUMNS = (
+    'id', 'username', 'email', 'fullname', 'provider', 'provider_id', 'profile_pic',
+    'twofa_enabled', 'twofa_method', 'twofa_verified',
+)
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache with per-entry TTL.
+
+    Args:
+        max_size (int): Maximum number of entries
+        ttl (int): Seconds before an entry expires
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def generation(self, user_id):
+        """Token that changes on every invalidation (of any user)."""
+        return self._generation
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is None:
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.monotonic():
+                del self._data[user_id]
+                return None
+            self._data.move_to_end(user_id)
+            return dict(snapshot)
+
+    def set(self, user_id, snapshot, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[user_id] = (time.monotonic() + self.ttl, dict(snapshot))
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+
+class RedisBackend:
+    """
+    Shared cache in a Redis-protocol server.
+
+    Snapshots are stored as JSON with a server-side TTL, so all worker
+    processes see the same entries and the same invalidations. Each
+    invalidation also bumps a per-user generation key, which ``set``
+    checks in a WATCH/MULTI transaction.
+
+    Args:
+        url (str): Redis connection URL
+        ttl (int): Seconds before an entry expires
+        prefix (str): Key prefix
+    """
+
+    def __init__(self, url, ttl, prefix='identity:user:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._watch_error = redis.WatchError
+
+    def generation(self, user_id):
+        """Token that changes on every invalidation of ``user_id``."""
+        return int(self.client.get(f'{self.prefix}gen:{user_id}') or 0)
+
+    def get(self, user_id):
+        raw = self.client.get(f'{self.prefix}{user_id}')
+        if raw is None:
+            return None
+        return json.loads(raw, object_hook=_decode_value)
+
+    def set(self, user_id, snapshot, generation=None):
+        key = f'{self.prefix}{user_id}'
+        value = json.dumps(snapshot, default=_encode_value)
+        if generation is None:
+            self.client.setex(key, self.ttl, value)
+            return
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(f'{self.prefix}gen:{user_id}')
+                if int(pipe.get(f'{self.prefix}gen:{user_id}') or 0) != generation:
+                    return
+                pipe.multi()
+                pipe.setex(key, self.ttl, value)
+                pipe.execute()
+            except self._watch_error:
+                # Invalidated while we were writing
+                pass
+
+    def delete(self, user_id):
+        with self.client.pipeline() as pipe:
+            pipe.delete(f'{self.prefix}{user_id}')
+            pipe.incr(f'{self.prefix}gen:{user_id}')
+            # Outlives any miss still in flight
+            pipe.expire(f'{self.prefix}gen:{user_id}', self.ttl)
+            pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+def _encode_value(value):
+    """JSON encoder hook for datetime columns."""
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+def _decode_value(obj):
+    """JSON decoder hook for datetime columns."""
+    if '$dt' in obj:
+        return datetime.fromisoformat(obj['$dt'])
+    return obj
+
+
+class IdentityCache:
+    """
+    Cache of user row snapshots in front of the Flask-Login user loader.
+
+    Create once at module level and bind with ``init_app``. Cached users
+    are merged into the current session without a query, so they behave
+    like normally loaded rows: changes made through ``current_user`` are
+    flushed and committed as usual, and the commit invalidates the entry.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.provider_ids = None
+        self.db = None
+        self.model = None
+        self.hits = 0
+        self.misses = 0
+        self._listening = False
+
+    def init_app(self, app, db, model):
+        """
+        Configure the backend and register invalidation listeners.
+
+        Args:
+            app: Flask application instance
+            db: Flask-SQLAlchemy extension
+            model: User model class
+        """
+        app.config.setdefault('IDENTITY_CACHE_BACKEND', os.getenv('IDENTITY_CACHE_BACKEND', 'memory'))
+        app.config.setdefault('IDENTITY_CACHE_SIZE', int(os.getenv('IDENTITY_CACHE_SIZE', 10000)))
+        app.config.setdefault('IDENTITY_CACHE_TTL', int(os.getenv('IDENTITY_CACHE_TTL', 300)))
+        app.config.setdefault('IDENTITY_CACHE_URL', os.getenv('IDENTITY_CACHE_URL', 'redis://localhost:6379/0'))
+
+        backend = app.config['IDENTITY_CACHE_BACKEND']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['IDENTITY_CACHE_URL'], app.config['IDENTITY_CACHE_TTL'])
+        elif backend == 'none':
+            self.backend = None
+        else:
+            raise ValueError(f"Unknown IDENTITY_CACHE_BACKEND: {backend}")
+        # Identities never move between users and get_or_create checks
+        # every hit against the loaded row, so a per-process map suffices
+        # even when the user cache is shared
+        self.provider_ids = (
+            MemoryBackend(app.config['IDENTITY_CACHE_SIZE'], app.config['IDENTITY_CACHE_TTL'])
+            if self.backend is not None else None
+        )
+
+        self.db = db
+        self.model = model
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._collect_changes)
+            event.listen(db.session, 'after_commit', self._apply_invalidations)
+            event.listen(db.session, 'after_rollback', self._discard_invalidations)
+            self._listening = True
+        app.extensions['identity_cache'] = self
+
+    def get_user(self, user_id):
+        """
+        Load a user by id, from the cache when possible.
+
+        Args:
+            user_id (int): User primary key
+
+        Returns:
+            User|None: User attached to the current session, or None
+        """
+        if self.backend is None:
+            return self.model.query.get(user_id)
+
+        snapshot = self.backend.get(user_id)
+        if snapshot is not None:
+            self.hits += 1
+            return self.attach(snapshot)
+
+        self.misses += 1
+        # Taken before the query: if a commit invalidates this user
+        # before we store the row, the row may predate it and is dropped
+        generation = self.backend.generation(user_id)
+        # Read from the primary: a replica row may predate the commit that
+        # invalidated the entry, and would then be cached for the whole TTL
+        stmt = self.db.select(self.model).filter_by(id=user_id)
+        user = self.db.session.execute(stmt, bind_arguments={'bind': self.db.engine}).scalars().first()
+        if user is not None:
+            self.backend.set(user_id, self._snapshot(user), generation)
+        return user
+
+    def attach(self, snapshot):
+        """
+        Build a user from column values and attach it without a query.
+
+        Args:
+            snapshot (dict): Column values of a committed or flushed row
+
+        Returns:
+            User: User attached to the current session
+        """
+        user = self.model(**snapshot)
+        make_transient_to_detached(user)
+        return self.db.session.merge(user, load=False)
+
+    def record_write(self, user_id):
+        """
+        Invalidate a user when the current transaction commits.
+
+        For writes made with Core statements, which the flush listener
+        does not see.
+        """
+        self.db.session.info.setdefault(_PENDING_KEY, set()).add(user_id)
+
+    def provider_user_id(self, provider, provider_id):
+        """
+        Return the remembered user id for an OAuth identity.
+
+        Args:
+            provider (str): OAuth provider name
+            provider_id (str): User id at the provider
+
+        Returns:
+            int|None: Local user id, or None if not remembered
+        """
+        if self.provider_ids is None:
+            return None
+        entry = self.provider_ids.get((provider, provider_id))
+        return entry['id'] if entry else None
+
+    def remember_provider_user(self, provider, provider_id, user_id):
+        """Remember the local user id for an OAuth identity."""
+        if self.provider_ids is not None:
+            self.provider_ids.set((provider, provider_id), {'id': user_id})
+
+    def invalidate(self, user_id):
+        """Drop a cached user."""
+        if self.backend is not None:
+            self.backend.delete(user_id)
+
+    def clear(self):
+        """Drop all cached users."""
+        if self.backend is not None:
+            self.backend.clear()
+        if self.provider_ids is not None:
+            self.provider_ids.clear()
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: ``hits``, ``misses`` and ``backend`` name
+        """
+        return {
+            'backend': type(self.backend).__name__ if self.backend else None,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def _snapshot(self, user):
+        """Copy the user's non-secret column values into a plain dict."""
+        return {key: getattr(user, key) for key in _SNAPSHOT_COLUMNS}
+
+    def _collect_changes(self, session, flush_context):
+        """Record ids of users written by this flush."""
+        pending = session.info.setdefault(_PENDING_KEY, set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, self.model) and obj.id is not None:
+                pending.add(obj.id)
+
+    def _apply_invalidations(self, session):
+        """Invalidate users written by the committed transaction."""
+        for user_id in session.info.pop(_PENDING_KEY, ()):
+            self.invalidate(user_id)
+
+    def _discard_invalidations(self, session):
+        """Forget recorded writes when the transaction rolls back."""
+        session.info.pop(_PENDING_KEY, None)
+
+
+# Shared instance, bound to the app in init_auth
+identity_cache = IdentityCache()
@@ -0,0 +1,346 @@
+"""
+Brute-force protection for password login.
+
+Rejects abusive login attempts before any database or hashing work, so a
+password-spraying attacker cannot drive our CPU. Provides:
+- Failed-attempt tracking per account and per source IP in a TTL store
+  (in-memory or Redis), with exponential lockout once a threshold is hit
+- An optional Bloom filter of registered emails, so logins for unknown
+  addresses skip the user lookup entirely
+- Response-time padding for rejected attempts, so unknown, locked and
+  wrong-password logins take about as long as a real password check
+  (padding sleeps rather than burning CPU)
+
+Configuration (app.config / environment):
+- LOGIN_GUARD_ENABLED: Enable the guard (default True)
+- LOGIN_GUARD_BACKEND: 'memory' (default) or 'redis'
+- LOGIN_GUARD_URL: Redis URL for the redis backend
+- LOGIN_FAILURE_WINDOW: Seconds failures are remembered (default 900)
+- LOGIN_LOCKOUT_THRESHOLD: Failures per account before lockout (default 5)
+- LOGIN_SOURCE_THRESHOLD: Failures per IP before lockout (default 50)
+- LOGIN_LOCKOUT_BASE: First lockout in seconds, doubling after (default 30)
+- LOGIN_LOCKOUT_MAX: Longest lockout in seconds (default 3600)
+- LOGIN_EMAIL_FILTER: Enable the email filter (default False). Each
+  process keeps its own filter; accounts created since the last rebuild
+  are also marked in the counter store, so use the redis backend when
+  running more than one worker process
+- LOGIN_FILTER_REBUILD_INTERVAL: Seconds between rebuilds (default 300)
+- LOGIN_FILTER_FP_RATE: Target false-positive rate (default 0.01)
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_NEW_EMAILS_KEY = 'login_guard_new_emails'
+
+
+class MemoryCounterStore:
+    """In-process TTL counters and flags."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+        self._ops = 0
+
+    def incr(self, key, ttl):
+        now = time.monotonic()
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, 0))
+            if expires_at < now:
+                value, expires_at = 0, now + ttl
+            self._data[key] = (value + 1, expires_at)
+            self._maybe_sweep(now)
+            return value + 1
+
+    def set(self, key, ttl):
+        with self._lock:
+            self._data[key] = (1, time.monotonic() + ttl)
+
+    def exists(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[1] >= time.monotonic()
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def _maybe_sweep(self, now):
+        # Drop expired entries every so often so the dict stays bounded
+        self._ops += 1
+        if self._ops % 1000 == 0:
+            for key in [k for k, (_, exp) in self._data.items() if exp < now]:
+                del self._data[key]
+
+
+class RedisCounterStore:
+    """TTL counters and flags in a Redis-protocol server."""
+
+    def __init__(self, url, prefix='login_guard:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def incr(self, key, ttl):
+        key = self.prefix + key
+        pipe = self.client.pipeline()
+        # Start the window on first failure; later increments keep its TTL
+        pipe.set(key, 0, ex=ttl, nx=True)
+        pipe.incr(key)
+        return pipe.execute()[1]
+
+    def set(self, key, ttl):
+        self.client.setex(self.prefix + key, ttl, 1)
+
+    def exists(self, key):
+        return bool(self.client.exists(self.prefix + key))
+
+    def delete(self, *keys):
+        self.client.delete(*(self.prefix + key for key in keys))
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+
+    Args:
+        capacity (int): Expected number of items
+        fp_rate (float): Target false-positive rate
+    """
+
+    def __init__(self, capacity, fp_rate):
+        capacity = max(capacity, 1024)
+        self.size = int(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        """Bit positions for an item, by double hashing one digest."""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self.positions(item):
+            self.bits[pos >> 3] |= 0x80 >> (pos & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (0x80 >> (pos & 7)) for pos in self.positions(item))
+
+
+class LoginGuard:
+    """
+    Lockout, backoff and unknown-account filtering for password login.
+
+    Create once at module level and bind with ``init_app``. All methods
+    are no-ops (allowing everything) when the guard is disabled.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.store = None
+        self.db = None
+        self.model = None
+        self._filter = None
+        self._filter_pid = None
+        self._lock = threading.Lock()
+        self._listening = False
+        # Running average of real password checks, used to pad rejections
+        self._verify_seconds = 0.0
+
+    def init_app(self, app, db, model):
+        """
+        Configure the guard from the application config.
+
+        Args:
+            app: Flask application instance
+            db: Flask-SQLAlchemy extension
+            model: User model class
+        """
+        def flag(name, default):
+            return os.getenv(name, default).lower() in ('true', 'yes', '1')
+
+        app.config.setdefault('LOGIN_GUARD_ENABLED', flag('LOGIN_GUARD_ENABLED', 'True'))
+        app.config.setdefault('LOGIN_GUARD_BACKEND', os.getenv('LOGIN_GUARD_BACKEND', 'memory'))
+        app.config.setdefault('LOGIN_GUARD_URL', os.getenv('LOGIN_GUARD_URL', 'redis://localhost:6379/0'))
+        app.config.setdefault('LOGIN_FAILURE_WINDOW', int(os.getenv('LOGIN_FAILURE_WINDOW', 900)))
+        app.config.setdefault('LOGIN_LOCKOUT_THRESHOLD', int(os.getenv('LOGIN_LOCKOUT_THRESHOLD', 5)))
+        app.config.setdefault('LOGIN_SOURCE_THRESHOLD', int(os.getenv('LOGIN_SOURCE_THRESHOLD', 50)))
+        app.config.setdefault('LOGIN_LOCKOUT_BASE', int(os.getenv('LOGIN_LOCKOUT_BASE', 30)))
+        app.config.setdefault('LOGIN_LOCKOUT_MAX', int(os.getenv('LOGIN_LOCKOUT_MAX', 3600)))
+        app.config.setdefault('LOGIN_EMAIL_FILTER', flag('LOGIN_EMAIL_FILTER', 'False'))
+        app.config.setdefault(
+            'LOGIN_FILTER_REBUILD_INTERVAL',
+            float(os.getenv('LOGIN_FILTER_REBUILD_INTERVAL', 300))
+        )
+        app.config.setdefault('LOGIN_FILTER_FP_RATE', float(os.getenv('LOGIN_FILTER_FP_RATE', 0.01)))
+
+        backend = app.config['LOGIN_GUARD_BACKEND']
+        if backend == 'memory':
+            self.store = MemoryCounterStore()
+        elif backend == 'redis':
+            self.store = RedisCounterStore(app.config['LOGIN_GUARD_URL'])
+        else:
+            raise ValueError(f"Unknown LOGIN_GUARD_BACKEND: {backend}")
+
+        self.app = app
+        self.enabled = app.config['LOGIN_GUARD_ENABLED']
+        self.db = db
+        self.model = model
+        if not self._listening:
+            event.listen(db.session, 'after_flush', self._collect_new_emails)
+            event.listen(db.session, 'after_commit', self._add_new_emails)
+            event.listen(db.session, 'after_rollback', self._discard_new_emails)
+            self._listening = True
+        app.extensions['login_guard'] = self
+
+    def is_locked(self, email, source):
+        """
+        Check whether an account or source is currently locked out.
+
+        Args:
+            email (str): Normalized email
+            source (str): Client IP address
+
+        Returns:
+            bool: True if the attempt should be rejected without checking
+        """
+        if not self.enabled:
+            return False
+        return self.store.exists(f'lock:acct:{email}') or self.store.exists(f'lock:src:{source}')
+
+    def may_exist(self, email):
+        """
+        Check the email filter for a possibly registered account.
+
+        Args:
+            email (str): Normalized email
+
+        Returns:
+            bool: False only if the account certainly does not exist.
+            True while the filter is disabled or not yet built.
+        """
+        if not self.enabled or not self.app.config['LOGIN_EMAIL_FILTER']:
+            return True
+        self._ensure_filter_builder()
+        bloom = self._filter
+        if bloom is None or email in bloom:
+            return True
+        # Created after the filter was built, possibly by another worker
+        return self.store.exists(f'new:{email}')
+
+    def record_failure(self, email, source):
+        """
+        Count a failed attempt and lock out the account or source if needed.
+
+        Args:
+            email (str): Normalized email
+            source (str): Client IP address
+        """
+        if not self.enabled:
+            return
+        config = self.app.config
+        window = config['LOGIN_FAILURE_WINDOW']
+        for kind, key, threshold in (
+            ('acct', email, config['LOGIN_LOCKOUT_THRESHOLD']),
+            ('src', source, config['LOGIN_SOURCE_THRESHOLD']),
+        ):
+            failures = self.store.incr(f'fail:{kind}:{key}', window)
+            if failures >= threshold:
+                lockout = min(
+                    config['LOGIN_LOCKOUT_BASE'] * 2 ** (failures - threshold),
+                    config['LOGIN_LOCKOUT_MAX']
+                )
+                self.store.set(f'lock:{kind}:{key}', int(lockout))
+
+    def record_success(self, email):
+        """Clear an account's failure count after a successful login."""
+        if self.enabled:
+            self.store.delete(f'fail:acct:{email}', f'lock:acct:{email}')
+
+    def observe_verify(self, seconds):
+        """Feed the duration of a real password check into the average."""
+        self._verify_seconds = self._verify_seconds * 0.9 + seconds * 0.1 if self._verify_seconds else seconds
+
+    def pad(self, started):
+        """
+        Sleep until a rejected attempt has taken as long as a real check.
+
+        Args:
+            started (float): ``time.perf_counter()`` at request start
+        """
+        remaining = self._verify_seconds - (time.perf_counter() - started)
+        if self.enabled and remaining > 0:
+            time.sleep(remaining)
+
+    def rebuild_filter(self):
+        """
+        Rebuild the email filter from the users table.
+
+        Returns:
+            BloomFilter: The new filter (also installed for this process)
+        """
+        count = self.model.query.count()
+        bloom = BloomFilter(count * 2, self.app.config['LOGIN_FILTER_FP_RATE'])
+        for (email,) in self.db.session.query(self.model.email_lower).yield_per(10000):
+            if email:
+                bloom.add(email)
+        self.db.session.remove()
+        self._filter = bloom
+        return bloom
+
+    def _ensure_filter_builder(self):
+        """Start the filter rebuild thread once per process."""
+        if self._filter_pid == os.getpid():
+            return
+        with self._lock:
+            if self._filter_pid == os.getpid():
+                return
+            self._filter = None
+            threading.Thread(target=self._rebuild_loop, name='login-filter', daemon=True).start()
+            self._filter_pid = os.getpid()
+
+    def _rebuild_loop(self):
+        interval = self.app.config['LOGIN_FILTER_REBUILD_INTERVAL']
+        while True:
+            with self.app.app_context():
+                try:
+                    self.rebuild_filter()
+                except Exception as e:
+                    logger.error("Login filter rebuild failed: %s", e)
+            time.sleep(interval)
+
+    def _collect_new_emails(self, session, flush_context):
+        emails = session.info.setdefault(_NEW_EMAILS_KEY, set())
+        for obj in session.new:
+            if isinstance(obj, self.model) and obj.email_lower:
+                emails.add(obj.email_lower)
+
+    def _add_new_emails(self, session):
+        emails = session.info.pop(_NEW_EMAILS_KEY, ())
+        if not emails or not self.enabled or not self.app.config['LOGIN_EMAIL_FILTER']:
+            return
+        ttl = int(self.app.config['LOGIN_FILTER_REBUILD_INTERVAL'] * 2)
+        bloom = self._filter
+        for email in emails:
+            self.store.set(f'new:{email}', ttl)
+            if bloom is not None:
+                bloom.add(email)
+
+    def _discard_new_emails(self, session):
+        session.info.pop(_NEW_EMAILS_KEY, None)
+
+
+# Shared instance, bound to the app in init_auth
+login_guard = LoginGuard()
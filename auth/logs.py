@@ -0,0 +1,229 @@
+"""
+Structured, non-blocking logging for the auth package.
+
+Modules log through ``logging.getLogger(__name__)``, and this module
+configures the ``auth`` logger they share. Provides:
+- JSON records, one object per line, with the time, level, logger and
+  message plus any ``extra`` fields (or plain text with the extra fields
+  appended as key=value pairs)
+- A queue handler: the request thread only puts the record on a bounded
+  queue, and a listener thread formats and writes it. When the queue is
+  full, records are dropped and counted rather than blocking the request
+- Deduplication of repeated errors: an error with the same logger and
+  message template as one logged less than LOG_DEDUP_SECONDS ago is
+  suppressed, and the next one logged carries a ``suppressed`` count
+- A development-only switch that logs 2FA codes
+
+Messages use %-style arguments (``logger.error("... %s", value)``), which
+are merged on the listener thread, so pass values rather than objects
+that change after the call.
+
+Configuration (app.config / environment):
+- LOG_LEVEL: Minimum level for the auth package (default INFO)
+- LOG_FORMAT: 'json' (default) or 'text'
+- LOG_ASYNC: Format and write on a background thread (default True)
+- LOG_QUEUE_SIZE: Maximum records waiting to be written (default 10000)
+- LOG_DEDUP_SECONDS: Window for suppressing repeated errors (default 60,
+  0 disables)
+- TWOFA_ECHO_CODES: Log 2FA codes; honoured only while the app runs in
+  debug or testing mode (default False)
+"""
+
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+LOGGER_NAME = 'auth'
+
+# Attributes every LogRecord has; anything else came from ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+_MAX_DEDUP_KEYS = 1000
+
+
+def _extra_fields(record):
+    return {
+        key: value for key, value in record.__dict__.items()
+        if key not in _RECORD_ATTRS and not key.startswith('_')
+    }
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single-line JSON object."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text, with ``extra`` fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        extra = _extra_fields(record)
+        if extra:
+            text += ' ' + ' '.join(f'{key}={value}' for key, value in extra.items())
+        return text
+
+
+class DedupFilter(logging.Filter):
+    """
+    Suppresses repeats of the same error within a time window.
+
+    Args:
+        window (float): Seconds during which repeats are suppressed
+        level (int): Lowest level that is deduplicated
+    """
+
+    def __init__(self, window, level=logging.ERROR):
+        super().__init__()
+        self.window = window
+        self.level = level
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.window <= 0 or record.levelno < self.level:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.window:
+                seen[1] += 1
+                return False
+            self._seen[key] = [now, 0]
+            if len(self._seen) > _MAX_DEDUP_KEYS:
+                self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.window}
+        if seen is not None and seen[1]:
+            record.suppressed = seen[1]
+        return True
+
+
+class AsyncHandler(QueueHandler):
+    """
+    Queues records for a listener thread that writes them to ``target``.
+
+    The listener is started on first use in each process, so forked
+    workers get their own. Records are formatted by the listener, not
+    by the thread that logged them.
+
+    Args:
+        target (logging.Handler): Handler that formats and writes records
+        size (int): Maximum queued records before new ones are dropped
+    """
+
+    def __init__(self, target, size):
+        super().__init__(queue.SimpleQueue())
+        self.target = target
+        self.size = size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # Leave formatting (and merging the args) to the listener thread
+        return record
+
+    def enqueue(self, record):
+        self._ensure_started()
+        # SimpleQueue has no maxsize, but its put is far cheaper than
+        # Queue's; the bound only needs to be approximate
+        if self.queue.qsize() >= self.size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+    def close(self):
+        """Write out queued records and stop the listener."""
+        with self._lock:
+            if self._listener is not None and self._pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+            self._pid = None
+        super().close()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive fork; start over with an empty queue
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+
+def init_logging(app):
+    """
+    Configure the ``auth`` logger from the application config.
+
+    Args:
+        app: Flask application instance
+
+    Replaces the handler installed by an earlier call, so building
+    another app in the same process does not duplicate records.
+    """
+    app.config.setdefault('LOG_LEVEL', os.getenv('LOG_LEVEL', 'INFO'))
+    app.config.setdefault('LOG_FORMAT', os.getenv('LOG_FORMAT', 'json'))
+    app.config.setdefault(
+        'LOG_ASYNC',
+        os.getenv('LOG_ASYNC', 'True').lower() in ('true', 'yes', '1')
+    )
+    app.config.setdefault('LOG_QUEUE_SIZE', int(os.getenv('LOG_QUEUE_SIZE', 10000)))
+    app.config.setdefault('LOG_DEDUP_SECONDS', float(os.getenv('LOG_DEDUP_SECONDS', 60)))
+    app.config.setdefault(
+        'TWOFA_ECHO_CODES',
+        os.getenv('TWOFA_ECHO_CODES', 'False').lower() in ('true', 'yes', '1')
+    )
+
+    logger = logging.getLogger(LOGGER_NAME)
+    previous = app.extensions.get('logging') or getattr(logger, '_auth_handler', None)
+    if previous is not None:
+        logger.removeHandler(previous)
+        previous.close()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter())
+    handler = AsyncHandler(stream, app.config['LOG_QUEUE_SIZE']) if app.config['LOG_ASYNC'] else stream
+    handler.addFilter(DedupFilter(app.config['LOG_DEDUP_SECONDS']))
+
+    logger.addHandler(handler)
+    logger.setLevel(app.config['LOG_LEVEL'].upper())
+    logger.propagate = False
+    logger._auth_handler = handler
+    app.extensions['logging'] = handler
+
+
+def echo_codes_enabled(app):
+    """
+    Whether 2FA codes may be logged for this app.
+
+    Args:
+        app: Flask application instance
+
+    Returns:
+        bool: TWOFA_ECHO_CODES is set and the app is in debug or testing
+        mode
+    """
+    return app.config.get('TWOFA_ECHO_CODES', False) and (app.debug or app.testing)
@@ -0,0 +1,543 @@
+"""
+Asynchronous outbound mail queue.
+
+Moves SMTP delivery off the request thread so that login, signup and
+2FA routes return as soon as a message has been queued. Provides:
+- A bounded in-process queue drained by a small pool of worker threads
+- One persistent SMTP connection per worker (reconnects on failure)
+- Retries with exponential backoff when a send fails
+- Optional durable spool (SQLite file) so queued codes survive a restart;
+  a message leaves the spool only once it has been sent, and worker
+  processes sharing the spool each queue only the rows they own
+- Queue depth, throughput and send latency counters
+- A transactional outbox: messages staged with ``enqueue_on_commit``
+  are queued only once the database transaction commits
+
+Configuration (app.config / environment):
+- MAIL_QUEUE_ENABLED: Deliver asynchronously (default True)
+- MAIL_QUEUE_SIZE: Maximum number of queued messages (default 1000)
+- MAIL_QUEUE_WORKERS: Number of sender threads (default 2)
+- MAIL_SPOOL_PATH: SQLite file for the durable spool (default: disabled)
+- MAIL_SPOOL_LEASE: Seconds after which the spooled messages of a
+  process that stopped renewing its claim are picked up by another
+  (default 60)
+- MAIL_RETRY_LIMIT: Retries of a failed send before it is given up, or,
+  with the spool, left there for the next process start (default 5)
+- MAIL_RETRY_BACKOFF: Seconds before the first retry, doubled for each
+  further one (default 2)
+
+For local testing, point MAIL_SERVER/MAIL_PORT at a debugging SMTP
+server such as ``python benchmarks/mock_smtp_server.py 8025``.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask_mail import Message
+from sqlalchemy import event
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+_OUTBOX_KEY = 'mail_outbox'
+_IDLE_POLL_SECONDS = 5.0
+
+
+class MailQueue:
+    """
+    Bounded outbound mail queue backed by worker threads.
+
+    Follows the Flask extension pattern: create once at module level and
+    bind to an application with ``init_app``. Workers are started lazily
+    on first use so that pre-forking servers start them in each worker
+    process rather than in the master.
+
+    Attributes:
+        app: Bound Flask application
+        mail: Flask-Mail instance used to open SMTP connections
+    """
+
+    def __init__(self, app=None, mail=None, db=None):
+        self.app = None
+        self.mail = None
+        self.db = None
+        self._queue = None
+        self._workers = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._spool = None
+        self._retries = []
+        self._retry_lock = threading.Lock()
+        self._retry_order = itertools.count()
+        self._claim_lock = threading.Lock()
+        self._next_claim = 0.0
+        self._stats = {
+            'enqueued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retried': 0,
+            'overflow': 0,
+            'send_seconds_total': 0.0,
+            'send_seconds_max': 0.0,
+        }
+        if app is not None and mail is not None:
+            self.init_app(app, mail, db)
+
+    def init_app(self, app, mail, db=None):
+        """
+        Bind the queue to an application and its Flask-Mail instance.
+
+        Args:
+            app: Flask application instance
+            mail: Initialized Flask-Mail extension
+            db: Flask-SQLAlchemy extension, required for ``enqueue_on_commit``
+        """
+        app.config.setdefault(
+            'MAIL_QUEUE_ENABLED',
+            os.getenv('MAIL_QUEUE_ENABLED', 'True').lower() in ('true', 'yes', '1')
+        )
+        app.config.setdefault('MAIL_QUEUE_SIZE', int(os.getenv('MAIL_QUEUE_SIZE', 1000)))
+        app.config.setdefault('MAIL_QUEUE_WORKERS', int(os.getenv('MAIL_QUEUE_WORKERS', 2)))
+        app.config.setdefault('MAIL_SPOOL_PATH', os.getenv('MAIL_SPOOL_PATH'))
+        app.config.setdefault('MAIL_SPOOL_LEASE', float(os.getenv('MAIL_SPOOL_LEASE', 60)))
+        app.config.setdefault('MAIL_RETRY_LIMIT', int(os.getenv('MAIL_RETRY_LIMIT', 5)))
+        app.config.setdefault('MAIL_RETRY_BACKOFF', float(os.getenv('MAIL_RETRY_BACKOFF', 2)))
+
+        self.app = app
+        self.mail = mail
+        self._queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        if app.config['MAIL_SPOOL_PATH']:
+            self._spool = MailSpool(app.config['MAIL_SPOOL_PATH'], app.config['MAIL_SPOOL_LEASE'])
+        if db is not None and self.db is None:
+            event.listen(db.session, 'after_commit', self._flush_outbox)
+            event.listen(db.session, 'after_soft_rollback', self._discard_outbox)
+        self.db = db
+        app.extensions['mail_queue'] = self
+
+    def enqueue_on_commit(self, msg):
+        """
+        Stage a message to be queued when the current transaction commits.
+
+        Args:
+            msg (Message): Flask-Mail message to send
+
+        Keeps the email in step with the database: a code is only mailed
+        once its hash has been stored, and nothing is sent on rollback.
+        Rolling back a savepoint (``begin_nested``) keeps the message.
+        """
+        session = self.db.session()
+        if not session.in_transaction():
+            # A rollback with no transaction fires no rollback events
+            session.begin()
+        session.info.setdefault(_OUTBOX_KEY, []).append(msg)
+
+    def _flush_outbox(self, session):
+        for msg in session.info.pop(_OUTBOX_KEY, ()):
+            self.enqueue(msg)
+
+    def _discard_outbox(self, session, previous_transaction):
+        if previous_transaction.parent is None:
+            session.info.pop(_OUTBOX_KEY, None)
+
+    def enqueue(self, msg):
+        """
+        Queue a message for background delivery.
+
+        Args:
+            msg (Message): Flask-Mail message to send
+
+        When the queue is disabled the message is sent inline. When the
+        queue is full the message is also sent inline so verification
+        codes are never silently dropped; this is counted as ``overflow``,
+        and a failed inline send is retried like a queued one.
+        """
+        if not self.app.config['MAIL_QUEUE_ENABLED']:
+            self._send_inline(msg)
+            return
+
+        self._ensure_started()
+        spool_id = self._spool.add(msg) if self._spool else None
+        try:
+            self._queue.put_nowait((spool_id, msg, 0))
+        except queue.Full:
+            self._incr('overflow')
+            if self._send_inline(msg):
+                if spool_id is not None:
+                    self._spool.remove(spool_id)
+            else:
+                self._schedule_retry(spool_id, msg, 1)
+            return
+        self._incr('enqueued')
+
+    def stats(self):
+        """
+        Return a snapshot of queue counters.
+
+        Returns:
+            dict: Counters plus current ``depth`` and ``workers``
+        """
+        with self._stats_lock:
+            snapshot = dict(self._stats)
+        snapshot['depth'] = self._queue.qsize() if self._queue is not None else 0
+        snapshot['retrying'] = len(self._retries)
+        snapshot['workers'] = sum(1 for w in self._workers if w.is_alive())
+        return snapshot
+
+    def shutdown(self, timeout=5.0):
+        """
+        Stop the worker threads after the queue has drained.
+
+        Args:
+            timeout (float): Seconds to wait for each worker to exit
+        """
+        for _ in self._workers:
+            self._queue.put((None, None, 0))
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        self._pid = None
+
+    def _ensure_started(self):
+        """Start worker threads once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive fork; drop any inherited state
+            self._workers = []
+            self._retries = []
+            for i in range(self.app.config['MAIL_QUEUE_WORKERS']):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f'mail-queue-{i}',
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+            self._pid = os.getpid()
+            self._next_claim = 0.0
+            if self._spool:
+                self._renew_claims()
+
+    def _renew_claims(self):
+        """
+        Renew this process's spool lease and queue rows left by processes
+        that stopped, at most every third of MAIL_SPOOL_LEASE.
+
+        Returns:
+            float: Seconds until the next renewal is due
+        """
+        interval = self._spool.lease / 3
+        with self._claim_lock:
+            now = time.monotonic()
+            if now < self._next_claim:
+                return self._next_claim - now
+            self._next_claim = now + interval
+        free = self._queue.maxsize - self._queue.qsize()
+        for spool_id, msg in self._spool.claim(free):
+            try:
+                self._queue.put_nowait((spool_id, msg, 0))
+            except queue.Full:
+                self._spool.release(spool_id)
+        return interval
+
+    def _worker_loop(self):
+        """Drain the queue over a persistent SMTP connection."""
+        with self.app.app_context():
+            conn = None
+            while True:
+                timeout = self._queue_due_retries()
+                if self._spool:
+                    timeout = min(timeout, self._renew_claims())
+                try:
+                    spool_id, msg, attempts = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+                if msg is None:
+                    break
+                try:
+                    conn, sent = self._deliver(conn, msg)
+                    if not sent:
+                        self._schedule_retry(spool_id, msg, attempts + 1)
+                    elif spool_id is not None:
+                        self._spool.remove(spool_id)
+                finally:
+                    self._queue.task_done()
+            self._close(conn)
+
+    def _schedule_retry(self, spool_id, msg, attempts):
+        """
+        Send a failed message again after a backoff.
+
+        Args:
+            spool_id (int|None): Spool row of the message
+            msg (Message): Message to send
+            attempts (int): Failed sends so far
+
+        Past MAIL_RETRY_LIMIT a spooled message stays in the spool until
+        the next process start; one without a spool is given up.
+        """
+        if attempts > self.app.config['MAIL_RETRY_LIMIT']:
+            return
+        delay = self.app.config['MAIL_RETRY_BACKOFF'] * 2 ** (attempts - 1)
+        with self._retry_lock:
+            heapq.heappush(
+                self._retries,
+                (time.monotonic() + delay, next(self._retry_order), spool_id, msg, attempts)
+            )
+        self._incr('retried')
+
+    def _queue_due_retries(self):
+        """
+        Move retries whose backoff has passed onto the queue.
+
+        Returns:
+            float: Seconds a worker may wait for the queue before calling
+            this again
+        """
+        with self._retry_lock:
+            now = time.monotonic()
+            while self._retries and self._retries[0][0] <= now:
+                _, _, spool_id, msg, attempts = self._retries[0]
+                try:
+                    self._queue.put_nowait((spool_id, msg, attempts))
+                except queue.Full:
+                    return 0.1
+                heapq.heappop(self._retries)
+            # Retries scheduled by a request thread (an overflow send that
+            # failed) wake no worker, so idle workers still poll
+            if self._retries:
+                return min(self._retries[0][0] - now, _IDLE_POLL_SECONDS)
+            return _IDLE_POLL_SECONDS
+
+    def _deliver(self, conn, msg):
+        """
+        Send one message, reconnecting once if the connection was lost.
+
+        Args:
+            conn: Open Flask-Mail connection or None
+            msg (Message): Message to send
+
+        Returns:
+            tuple: (connection to reuse for the next message or None,
+            whether the message was sent)
+        """
+        started = time.perf_counter()
+        for attempt in range(2):
+            try:
+                if conn is None:
+                    conn = self.mail.connect().__enter__()
+                conn.send(msg)
+                self._record_send(time.perf_counter() - started)
+                return conn, True
+            except Exception as e:
+                self._close(conn)
+                conn = None
+                if attempt == 1:
+                    self._incr('failed')
+                    _report_failure(msg, e)
+        return conn, False
+
+    def _send_inline(self, msg):
+        """
+        Send a message on the calling thread.
+
+        Returns:
+            bool: Whether the message was sent
+        """
+        started = time.perf_counter()
+        try:
+            self.mail.send(msg)
+            self._record_send(time.perf_counter() - started)
+            return True
+        except Exception as e:
+            self._incr('failed')
+            _report_failure(msg, e)
+            return False
+
+    @staticmethod
+    def _close(conn):
+        """Close an SMTP connection, ignoring errors from a dead socket."""
+        if conn is None:
+            return
+        try:
+            conn.__exit__(None, None, None)
+        except Exception:
+            pass
+
+    def _incr(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _record_send(self, seconds):
+        with self._stats_lock:
+            self._stats['sent'] += 1
+            self._stats['send_seconds_total'] += seconds
+            self._stats['send_seconds_max'] = max(self._stats['send_seconds_max'], seconds)
+        metrics.observe('mail_send_duration_seconds', seconds)
+
+
+class MailSpool:
+    """
+    Durable SQLite spool for queued messages, shared by worker processes.
+
+    Each message is written before it is queued and deleted once it has
+    been delivered. Every row is owned by one process: the one that
+    queued it, or the one that claimed it. An owner renews a lease on its
+    rows while it runs, and only rows without an owner or with an expired
+    lease (their process died) can be claimed, so a message is queued in
+    one process at a time.
+
+    Args:
+        path (str): SQLite database file for the spool
+        lease (float): Seconds a claim lasts without being renewed
+    """
+
+    def __init__(self, path, lease=60.0):
+        self.path = path
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._owner = None
+        self._owner_pid = None
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS mail_spool ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'payload TEXT NOT NULL, '
+                'created_at REAL NOT NULL, '
+                'owner TEXT, '
+                'lease_until REAL NOT NULL DEFAULT 0)'
+            )
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(mail_spool)')}
+            if 'owner' not in columns:
+                # Spool written before rows had owners; its rows are unclaimed
+                conn.execute('ALTER TABLE mail_spool ADD COLUMN owner TEXT')
+                conn.execute('ALTER TABLE mail_spool ADD COLUMN lease_until REAL NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    @property
+    def owner(self):
+        """Claim token of this process (a reused pid gets a new one)."""
+        if self._owner_pid != os.getpid():
+            self._owner = f'{os.getpid()}-{secrets.token_hex(4)}'
+            self._owner_pid = os.getpid()
+        return self._owner
+
+    def add(self, msg):
+        """
+        Persist a message, owned by this process.
+
+        Args:
+            msg (Message): Message to store
+
+        Returns:
+            int: Spool row id
+        """
+        payload = json.dumps({
+            'subject': msg.subject,
+            'sender': msg.sender,
+            'recipients': msg.recipients,
+            'body': msg.body,
+            'html': msg.html,
+        })
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO mail_spool (payload, created_at, owner, lease_until) VALUES (?, ?, ?, ?)',
+                (payload, now, self.owner, now + self.lease)
+            )
+            return cursor.lastrowid
+
+    def remove(self, spool_id):
+        """Delete a delivered message from the spool."""
+        with self._lock, self._connect() as conn:
+            conn.execute('DELETE FROM mail_spool WHERE id = ?', (spool_id,))
+
+    def release(self, spool_id):
+        """Give up this process's claim on a message it cannot queue."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'UPDATE mail_spool SET owner = NULL WHERE id = ? AND owner = ?',
+                (spool_id, self.owner)
+            )
+
+    def claim(self, limit):
+        """
+        Renew this process's lease and claim unowned or expired rows.
+
+        Args:
+            limit (int): Maximum number of rows to claim
+
+        Returns:
+            list: Newly claimed (spool_id, Message) tuples, oldest first
+        """
+        now = time.time()
+        owner = self.owner
+        with self._lock, self._connect() as conn:
+            # Take the write lock first so two processes cannot select
+            # the same rows
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE mail_spool SET lease_until = ? WHERE owner = ?',
+                (now + self.lease, owner)
+            )
+            rows = []
+            if limit > 0:
+                rows = conn.execute(
+                    'SELECT id, payload FROM mail_spool '
+                    'WHERE owner IS NULL OR lease_until < ? ORDER BY id LIMIT ?',
+                    (now, limit)
+                ).fetchall()
+                conn.executemany(
+                    'UPDATE mail_spool SET owner = ?, lease_until = ? WHERE id = ?',
+                    [(owner, now + self.lease, spool_id) for spool_id, _ in rows]
+                )
+        messages = []
+        for spool_id, payload in rows:
+            data = json.loads(payload)
+            sender = data['sender']
+            messages.append((spool_id, Message(
+                subject=data['subject'],
+                sender=tuple(sender) if isinstance(sender, list) else sender,
+                recipients=data['recipients'],
+                body=data['body'],
+                html=data['html'],
+            )))
+        return messages
+
+
+_SMTP_HINT = (
+    "Expected in development if MAIL_USERNAME and MAIL_PASSWORD are not set. "
+    "For Gmail, use an App Password (https://myaccount.google.com/apppasswords) "
+    "when 2FA is enabled on the account."
+)
+
+
+def _report_failure(msg, error):
+    """
+    Log a delivery failure without exposing it to the user.
+
+    Repeats within LOG_DEDUP_SECONDS are suppressed (see auth/logs.py),
+    so an SMTP outage logs one record per window, not one per message.
+    """
+    logger.error(
+        "Error sending email to %s: %s", ', '.join(msg.recipients), error,
+        extra={'event': 'mail_send_failed', 'hint': _SMTP_HINT}
+    )
+
+
+# Shared instance, bound to the app in app.py
+mail_queue = MailQueue()
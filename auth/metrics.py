@@ -0,0 +1,460 @@
+"""
+Prometheus metrics for request latency and the work behind it.
+
+Records where request time goes and exposes it on ``/metrics`` in the
+Prometheus text format. Provides:
+- Per-endpoint request latency histograms and request counters
+- Latency histograms for SQL statements (by operation), password and
+  2FA-code hashing (by job, including bcrypt), template rendering,
+  outbound mail and OAuth provider calls
+- Gauges for the counters kept by the hashing pool, mail queue, identity
+  cache, OAuth connection pools and OIDC metadata cache
+- Multi-process aggregation for forking servers (gunicorn, uWSGI): each
+  worker writes a snapshot to a shared directory and ``/metrics`` merges
+  them, whichever worker serves the scrape
+- Sampling: only a share of requests have their timings recorded, while
+  request counts stay exact
+
+When disabled (the default) no hooks, listeners or routes are installed,
+and instrumented call sites cost a single attribute check.
+
+Configuration (app.config / environment):
+- METRICS_ENABLED: Record and expose metrics (default False)
+- METRICS_SAMPLE_RATE: Share of requests whose timings are recorded
+  (default 1.0)
+- METRICS_MULTIPROC_DIR: Directory shared by the worker processes
+  (default: disabled, single-process metrics). Empty it when the server
+  starts.
+- METRICS_FLUSH_INTERVAL: Seconds between snapshot writes per worker
+  (default 5)
+- METRICS_PATH: URL of the metrics endpoint (default /metrics)
+- METRICS_TOKEN: Bearer token required to read the endpoint
+  (default: none)
+"""
+
+import atexit
+import glob
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from flask import Response, current_app, request
+from jinja2 import Template
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by endpoint, method and status'),
+    'db_query_duration_seconds': ('histogram', 'Time in SQL statements by operation'),
+    'hash_duration_seconds': ('histogram', 'Password and 2FA code hashing time by job'),
+    'template_render_duration_seconds': ('histogram', 'Template rendering time by template'),
+    'mail_send_duration_seconds': ('histogram', 'SMTP delivery time per message'),
+    'oauth_request_duration_seconds': ('histogram', 'OAuth provider request time by provider'),
+}
+
+_SQL_OPERATIONS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+_QUERY_STARTED = 'metrics_query_started'
+
+
+class Metrics:
+    """
+    In-process metric registry and its Flask bindings.
+
+    Create once at module level and bind with ``init_app``. Instrumented
+    modules call ``observe``, which returns at once while metrics are
+    disabled or the current request is not sampled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.buckets = DEFAULT_BUCKETS
+        self.multiproc_dir = None
+        self.flush_interval = 5.0
+        self._collectors = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._reset()
+
+    def init_app(self, app, db=None):
+        """
+        Read settings and, if enabled, install the hooks and endpoint.
+
+        Args:
+            app: Flask application instance (after the other extensions)
+            db: Flask-SQLAlchemy extension whose engines are timed
+        """
+        app.config.setdefault(
+            'METRICS_ENABLED',
+            os.getenv('METRICS_ENABLED', 'False').lower() in ('true', 'yes', '1')
+        )
+        app.config.setdefault('METRICS_SAMPLE_RATE', float(os.getenv('METRICS_SAMPLE_RATE', 1.0)))
+        app.config.setdefault('METRICS_MULTIPROC_DIR', os.getenv('METRICS_MULTIPROC_DIR'))
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', float(os.getenv('METRICS_FLUSH_INTERVAL', 5)))
+        app.config.setdefault('METRICS_PATH', os.getenv('METRICS_PATH', '/metrics'))
+        app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+
+        app.extensions['metrics'] = self
+        self.enabled = app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+
+        self.sample_rate = min(max(app.config['METRICS_SAMPLE_RATE'], 0.0), 1.0)
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        self.multiproc_dir = app.config['METRICS_MULTIPROC_DIR']
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            atexit.register(self.flush)
+
+        # Run first before the request and last after it, so the other
+        # extensions' hooks are part of the measured time
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+        if db is not None:
+            with app.app_context():
+                engines = list(db.engines.values())
+            for engine in engines:
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+        app.jinja_env.template_class = TimedTemplate
+        self._register_default_collectors()
+
+        app.add_url_rule(app.config['METRICS_PATH'], 'metrics', self._metrics_view)
+        from .rate_limit import limiter
+        limiter.exempt(app.view_functions['metrics'])
+
+    def active(self):
+        """
+        Whether a timing taken now should be recorded.
+
+        Returns:
+            bool: The request's sampling decision, or a fresh one outside
+            requests (e.g. on mail queue threads)
+        """
+        if not self.enabled:
+            return False
+        sampled = getattr(self._local, 'sampled', None)
+        if sampled is None:
+            return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return sampled
+
+    def observe(self, name, seconds, **labels):
+        """
+        Record a duration in a histogram if the current work is sampled.
+
+        Args:
+            name (str): Histogram name from ``METRICS``
+            seconds (float): Observed duration
+            **labels: Label values
+        """
+        if self.enabled and self.active():
+            self._observe(name, seconds, labels)
+
+    def add_collector(self, collect):
+        """
+        Register a callable that reports gauges at scrape time.
+
+        Args:
+            collect: Callable returning ``(name, labels, value)`` tuples
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        Render every metric, merged across worker processes.
+
+        Returns:
+            str: Prometheus text exposition format
+        """
+        histograms, counters, gauges = self._snapshot()
+        if self.multiproc_dir:
+            self.flush()
+            for path in glob.glob(os.path.join(self.multiproc_dir, '*.json')):
+                if os.path.basename(path) == f'{os.getpid()}.json':
+                    continue
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                _merge(histograms, counters, data)
+                # Gauges describe live state; drop those of exited workers
+                if _pid_alive(data['pid']):
+                    for name, labels, value in data['gauges']:
+                        key = (name, tuple(map(tuple, labels)))
+                        gauges[key] = gauges.get(key, 0) + value
+        return _render_text(histograms, counters, gauges, self.buckets)
+
+    def flush(self):
+        """Write this process's snapshot to the multi-process directory."""
+        if not self.multiproc_dir:
+            return
+        histograms, counters, gauges = self._snapshot()
+        data = {
+            'pid': os.getpid(),
+            'histograms': [[name, labels, h[0], h[1], h[2]] for (name, labels), h in histograms.items()],
+            'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+            'gauges': [[name, labels, value] for (name, labels), value in gauges.items()],
+        }
+        path = os.path.join(self.multiproc_dir, f'{os.getpid()}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        self._last_flush = time.monotonic()
+
+    def reset(self):
+        """Clear all recorded values in this process."""
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self._histograms = {}
+        self._counters = {}
+        self._pid = os.getpid()
+
+    def _observe(self, name, seconds, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def _increment(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_pid()
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def _check_pid(self):
+        # A forked worker starts from an empty registry, not the parent's
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _snapshot(self):
+        """Copies of the histograms and counters, and current gauges."""
+        with self._lock:
+            self._check_pid()
+            histograms = {key: [list(h[0]), h[1], h[2]] for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    key = (name, tuple(sorted(labels.items())))
+                    gauges[key] = gauges.get(key, 0) + value
+            except Exception as e:
+                logger.error("Metrics collector %s failed: %s", collect.__name__, e)
+        return histograms, counters, gauges
+
+    def _start_request(self):
+        self._local.sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        self._local.started = time.perf_counter()
+
+    def _finish_request(self, response):
+        self._record_request(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        if exc is not None:
+            self._record_request(500)
+        self._local.sampled = None
+        self._local.started = None
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            if self._flush_lock.acquire(blocking=False):
+                try:
+                    self.flush()
+                finally:
+                    self._flush_lock.release()
+
+    def _record_request(self, status):
+        started = getattr(self._local, 'started', None)
+        if started is None:
+            return
+        self._local.started = None
+        labels = {
+            'endpoint': request.endpoint or 'unmatched',
+            'method': request.method,
+            'status': str(status),
+        }
+        self._increment('http_requests_total', labels)
+        if self._local.sampled:
+            self._observe('http_request_duration_seconds', time.perf_counter() - started, labels)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(_QUERY_STARTED, []).append(
+            time.perf_counter() if self.active() else None
+        )
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get(_QUERY_STARTED)
+        started = stack.pop() if stack else None
+        if started is None:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        self._observe(
+            'db_query_duration_seconds',
+            time.perf_counter() - started,
+            {'operation': operation if operation in _SQL_OPERATIONS else 'OTHER'}
+        )
+
+    def _metrics_view(self):
+        """Serve the merged metrics, behind METRICS_TOKEN if one is set."""
+        token = current_app.config['METRICS_TOKEN']
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    def _register_default_collectors(self):
+        from .hashing import hashing
+        from .identity_cache import identity_cache
+        from .mail_queue import mail_queue
+        from .oauth_http import provider_pools
+        from .oidc_cache import metadata_cache
+
+        def hashing_stats():
+            stats = hashing.stats()
+            yield 'hash_pool_pending', {}, stats['pending']
+            yield 'hash_pool_rejected', {}, stats['rejected']
+            yield 'hash_pool_timed_out', {}, stats['timed_out']
+            yield 'hash_pool_restarts', {}, stats['restarts']
+
+        def mail_queue_stats():
+            stats = mail_queue.stats()
+            for key in ('depth', 'workers', 'enqueued', 'sent', 'failed', 'retried', 'retrying', 'overflow'):
+                yield f'mail_queue_{key}', {}, stats[key]
+
+        def identity_cache_stats():
+            stats = identity_cache.stats()
+            yield 'identity_cache_hits', {}, stats['hits']
+            yield 'identity_cache_misses', {}, stats['misses']
+
+        def oauth_pool_stats():
+            for provider, stats in provider_pools.stats().items():
+                yield 'oauth_pool_requests', {'provider': provider}, stats['requests']
+                yield 'oauth_pool_rejected', {'provider': provider}, stats['rejected']
+
+        def oidc_cache_stats():
+            for key, value in metadata_cache.stats().items():
+                yield f'oidc_cache_{key}', {}, value
+
+        for collect in (hashing_stats, mail_queue_stats, identity_cache_stats,
+                        oauth_pool_stats, oidc_cache_stats):
+            self.add_collector(collect)
+
+
+class TimedTemplate(Template):
+    """Jinja template whose top-level renders are timed."""
+
+    def render(self, *args, **kwargs):
+        if not metrics.active():
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            metrics._observe(
+                'template_render_duration_seconds',
+                time.perf_counter() - started,
+                {'template': self.name or '<string>'}
+            )
+
+
+def _merge(histograms, counters, data):
+    """Add another process's snapshot to ``histograms`` and ``counters``."""
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(map(tuple, labels)))
+        histogram = histograms.get(key)
+        if histogram is None:
+            histograms[key] = [list(buckets), total, count]
+            continue
+        histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+        histogram[1] += total
+        histogram[2] += count
+    for name, labels, value in data['counters']:
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _render_text(histograms, counters, gauges, buckets):
+    """Prometheus text exposition of the merged metrics."""
+    by_name = {}
+    for (name, labels), value in counters.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in histograms.items():
+        by_name.setdefault(name, []).append((labels, value))
+    for (name, labels), value in gauges.items():
+        by_name.setdefault(name, []).append((labels, value))
+
+    bounds = [str(bound) for bound in buckets] + ['+Inf']
+    lines = []
+    for name in sorted(by_name):
+        kind, help_text = METRICS.get(name, ('gauge', name.replace('_', ' ').capitalize()))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(by_name[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -1,5 +1,5 @@
 """
-User model representing application users.
+Database models for users and pending 2FA challenges.
 
 Handles both local and OAuth authentication with:
 - Core user attributes (username, email, password)
@@ -9,7 +9,26 @@ Handles both local and OAuth authentication with:
 """
 
 from flask_login import UserMixin
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import validates
 from . import db
+from . import passwords
+from .identity_cache import identity_cache
+
+def normalize_email(email):
+    """
+    Normalize an email address for case-insensitive lookups.
+    
+    Args:
+        email (str): Email address as entered
+        
+    Returns:
+        str|None: Trimmed, lower-cased address, or None if empty
+    """
+    if not email:
+        return None
+    return email.strip().lower() or None
 
 class User(UserMixin, db.Model):
     """
@@ -19,6 +38,7 @@ class User(UserMixin, db.Model):
         id (int): Primary key
         username (str): Unique username
         email (str): Unique email address
+        email_lower (str): Normalized email used for lookups (indexed)
         fullname (str): User's full name
         password (str): Hashed password (empty for OAuth users)
         provider (str): Auth provider ('local' or OAuth service name)
@@ -27,15 +47,20 @@ class User(UserMixin, db.Model):
         twofa_enabled (bool): Whether 2FA is enabled for this user
         twofa_method (str): 2FA method (email, app, etc.)
         twofa_secret (str): Secret key for 2FA (for authenticator apps)
-        twofa_code_hash (str): Hash of current verification code
-        twofa_code_expires (datetime): Expiration time of verification code
+        twofa_code_hash (str): Legacy code hash; codes now live in TwoFactorChallenge
+        twofa_code_expires (datetime): Legacy code expiry; see TwoFactorChallenge
         twofa_verified (bool): Whether user has completed 2FA verification
     """
     __tablename__ = 'users'
+    __table_args__ = (
+        # One local account per OAuth identity; also serves get_or_create lookups
+        db.Index('ix_users_provider_provider_id', 'provider', 'provider_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True)
     email = db.Column(db.String(120), unique=True)
+    email_lower = db.Column(db.String(120), index=True)
     fullname = db.Column(db.String(120))
     password = db.Column(db.String(128))
     provider = db.Column(db.String(20), default='local')
@@ -50,10 +75,37 @@ class User(UserMixin, db.Model):
     twofa_code_expires = db.Column(db.DateTime, nullable=True)
     twofa_verified = db.Column(db.Boolean, default=True)  # Default True for backward compatibility
     
+    @validates('email')
+    def _sync_email_lower(self, key, email):
+        """Keep the normalized lookup column in step with email."""
+        self.email_lower = normalize_email(email)
+        return email
+    
+    @staticmethod
+    def find_by_email(email):
+        """
+        Look up a user by email, ignoring case and surrounding whitespace.
+        
+        Args:
+            email (str): Email address as entered
+            
+        Returns:
+            User|None: Matching user, found via the email_lower index
+        """
+        normalized = normalize_email(email)
+        if normalized is None:
+            return None
+        return User.query.filter_by(email_lower=normalized).first()
+    
     def check_password(self, password):
         """
         Verify password against stored hash.
         
+        On success, if the stored hash was made under a different password
+        policy (algorithm, iterations or salt length), the password is
+        re-hashed with the current policy. The new hash is persisted by
+        the caller's next commit.
+        
         Args:
             password (str): Plaintext password to verify
             
@@ -61,51 +113,193 @@ class User(UserMixin, db.Model):
             bool: True if password matches hash, False otherwise
             
         Note:
-            For OAuth users (empty password), always returns False
+            For OAuth users (empty password), always returns False.
+            Verification runs in the hashing pool and raises HashingBusy
+            (503) when the pool is saturated.
         """
-        from werkzeug.security import check_password_hash
-        return check_password_hash(self.password, password)
+        if not passwords.verify_password(self.password, password):
+            return False
+        if passwords.needs_rehash(self.password):
+            self.password = passwords.hash_password(password)
+        return True
 
     @staticmethod
-    def get_or_create(provider, user_info):
+    def get_or_create(provider, profile):
         """
         Find or create user based on OAuth provider data.
         
         Args:
             provider (str): OAuth provider name (e.g. 'google')
-            user_info (dict): User data from OAuth provider
+            profile (dict): Normalized provider profile with ``sub``,
+                ``email``, ``name`` and ``picture`` (see
+                auth/oauth_providers.py)
             
         Returns:
             User: Existing or newly created user instance
             
         Handles:
-            - User lookup by provider ID
-            - New user creation with OAuth data
-            - Automatic commit of new users
+            - Returning users via the remembered identity -> user id map
+              and the identity cache, without a query
+            - First logins with one upsert keyed by (provider,
+              provider_id), so concurrent first logins for the same
+              account end up with the same row
+            - Updating fullname and profile_pic only when they changed
+            
+        Writes are not committed; the caller commits as part of its unit
+        of work.
         """
-        # Check if user exists
-        user = User.query.filter_by(
-            provider=provider,
-            provider_id=user_info.get('sub') or user_info.get('id')
-        ).first()
+        provider_id = str(profile['sub'])
+        user_id = identity_cache.provider_user_id(provider, provider_id)
+        if user_id is not None:
+            user = identity_cache.get_user(user_id)
+            # Ids of rolled back inserts can be reused, so check the identity
+            if user is not None and (user.provider, user.provider_id) == (provider, provider_id):
+                user._update_profile(profile)
+                return user
+        
+        user = User._upsert(provider, provider_id, profile)
+        identity_cache.remember_provider_user(provider, provider_id, user.id)
+        return user
+    
+    def _update_profile(self, profile):
+        """Copy changed profile fields; unchanged fields cause no UPDATE."""
+        for attr, key in _PROFILE_FIELDS:
+            value = profile.get(key)
+            if value and getattr(self, attr) != value:
+                setattr(self, attr, value)
+    
+    @staticmethod
+    def _upsert(provider, provider_id, profile):
+        """
+        Insert an OAuth user, or update the existing row's profile fields.
         
-        if not user:
-            # Create new user
-            user = User(
-                username=user_info.get('email'),  # Use email as username for OAuth users
-                email=user_info.get('email'),
-                fullname=user_info.get('name'),
-                password='',  # OAuth users don't need password
-                provider=provider,
-                provider_id=user_info.get('sub') or user_info.get('id'),
-                twofa_verified=True  # New OAuth users don't need 2FA verification initially
+        Uses INSERT ... ON CONFLICT (provider, provider_id) on SQLite and
+        PostgreSQL, returning the row in the same statement where the
+        driver supports RETURNING. Other databases look up, then insert.
+        """
+        table = User.__table__
+        insert = _dialect_insert(db.engine.dialect.name)
+        if insert is None:
+            return User._find_or_insert(provider, provider_id, profile)
+        
+        email = profile.get('email')
+        stmt = insert(table).values(
+            username=email,  # Use email as username for OAuth users
+            email=email,
+            email_lower=normalize_email(email),
+            fullname=profile.get('name'),
+            password='',  # OAuth users don't need password
+            provider=provider,
+            provider_id=provider_id,
+            profile_pic=profile.get('picture') or None,
+            twofa_verified=True  # New OAuth users don't need 2FA verification initially
+        )
+        changes = [attr for attr, key in _PROFILE_FIELDS if profile.get(key)]
+        if changes:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['provider', 'provider_id'],
+                set_={attr: stmt.excluded[attr] for attr in changes},
+                # Leave unchanged rows alone; they are then not returned
+                where=or_(*(table.c[attr].is_distinct_from(stmt.excluded[attr]) for attr in changes))
             )
-            
-            # Add profile picture if available
-            if user_info.get('picture'):
-                user.profile_pic = user_info.get('picture')
-                
-            db.session.add(user)
-            db.session.commit()
-            
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=['provider', 'provider_id'])
+        
+        error = None
+        try:
+            # Savepoint, so a clash undoes only this statement and leaves
+            # the caller's pending work (and staged mail) in place
+            with db.session.begin_nested():
+                if _insert_returning(db.engine.dialect):
+                    row = db.session.execute(stmt.returning(*table.c)).first()
+                else:
+                    row = None
+                    db.session.execute(stmt)
+            if row is not None:
+                identity_cache.record_write(row.id)
+                return identity_cache.attach(dict(row._mapping))
+        except IntegrityError as e:
+            # Another unique column (e.g. email) clashed, possibly with a
+            # row being inserted concurrently for the same identity
+            error = e
+        
+        # Existing row left unchanged, or no RETURNING support
+        user = User._find_by_identity(provider, provider_id)
+        if user is None:
+            raise error
+        identity_cache.record_write(user.id)
+        return user
+    
+    @staticmethod
+    def _find_or_insert(provider, provider_id, profile):
+        """Look up, then insert with the ORM (databases without ON CONFLICT)."""
+        user = User._find_by_identity(provider, provider_id)
+        if user is not None:
+            user._update_profile(profile)
+            return user
+        user = User(
+            username=profile.get('email'),
+            email=profile.get('email'),
+            fullname=profile.get('name'),
+            password='',
+            provider=provider,
+            provider_id=provider_id,
+            profile_pic=profile.get('picture') or None,
+            twofa_verified=True
+        )
+        try:
+            # Flush inside a savepoint; on a clash only the new row is
+            # rolled back and expunged
+            with db.session.begin_nested():
+                db.session.add(user)
+        except IntegrityError:
+            # Lost the race against a concurrent first login
+            user = User._find_by_identity(provider, provider_id)
+            if user is None:
+                raise
         return user
+    
+    @staticmethod
+    def _find_by_identity(provider, provider_id):
+        """Look up an OAuth user on the primary (replicas may lag a fresh insert)."""
+        stmt = db.select(User).filter_by(provider=provider, provider_id=provider_id)
+        return db.session.execute(stmt, bind_arguments={'bind': db.engine}).scalars().first()
+
+# (attribute, normalized profile key) refreshed on every OAuth login
+_PROFILE_FIELDS = (('fullname', 'name'), ('profile_pic', 'picture'))
+
+def _dialect_insert(dialect_name):
+    """Return the dialect's INSERT construct with ON CONFLICT support, if any."""
+    if dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
+def _insert_returning(dialect):
+    """Whether the dialect supports INSERT ... RETURNING (SQLAlchemy 2.0 and 1.4 names)."""
+    return getattr(dialect, 'insert_returning', getattr(dialect, 'full_returning', False))
+
+class TwoFactorChallenge(db.Model):
+    """
+    Pending 2FA verification code, stored apart from the user row.
+    
+    Used by the SQL challenge backend (see auth/challenges.py) so that
+    issuing and checking codes does not rewrite the hot users row.
+    
+    Attributes:
+        id (str): Random challenge id, kept in the user's session
+        user_id (int): User the code was issued to
+        code_hash (str): Hash of the verification code
+        expires_at (datetime): Expiration time (indexed for sweeping)
+        attempts (int): Number of failed verification attempts
+    """
+    __tablename__ = 'twofa_challenges'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    code_hash = db.Column(db.String(128), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
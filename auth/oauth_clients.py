@@ -0,0 +1,59 @@
+"""
+Authlib client classes using the pooled transport.
+
+Kept apart from auth/oauth_http.py so that Authlib is only imported when
+the provider registry builds its first client (see
+auth/oauth_providers.py), not when a worker starts. Provides:
+- Authlib sessions mounted on the provider's shared keep-alive pool
+- Discovery metadata and signing keys served from the shared cache in
+  auth/oidc_cache.py
+"""
+
+from authlib.integrations.flask_client import FlaskOAuth2App, OAuth
+
+from .oauth_http import provider_pools
+from .oidc_cache import metadata_cache
+
+
+class PooledOAuth2App(FlaskOAuth2App):
+    """
+    Authlib Flask client whose sessions use the provider's shared pool.
+
+    Discovery metadata and JWKS are read through ``metadata_cache``
+    instead of being fetched once and kept forever.
+    """
+
+    def _mount(self, session):
+        if provider_pools.enabled:
+            adapter = provider_pools.adapter(self.name)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        return session
+
+    def _get_oauth_client(self, **metadata):
+        return self._mount(super()._get_oauth_client(**metadata))
+
+    def _fetch_document(self, url):
+        with self._mount(self.client_cls(**self.client_kwargs)) as session:
+            return session.request('GET', url, withhold_token=True)
+
+    def load_server_metadata(self):
+        if self._server_metadata_url:
+            document = metadata_cache.get(self._server_metadata_url, self._fetch_document)
+            # Copy only when the cached document changed
+            if document is not getattr(self, '_metadata_document', None):
+                self.server_metadata.update(document)
+                self._metadata_document = document
+        return self.server_metadata
+
+    def fetch_jwk_set(self, force=False):
+        uri = self.load_server_metadata().get('jwks_uri')
+        if not uri:
+            # Statically configured key set
+            return super().fetch_jwk_set(force)
+        return metadata_cache.get(uri, self._fetch_document, force=force)
+
+
+class PooledOAuth(OAuth):
+    """Authlib Flask registry creating PooledOAuth2App clients."""
+    oauth2_client_cls = PooledOAuth2App
@@ -0,0 +1,191 @@
+"""
+Pooled HTTP transport for OAuth provider calls.
+
+Authlib opens a new requests session, and so a new TCP/TLS connection,
+for every token exchange and API call. This module gives each provider
+one shared keep-alive connection pool instead. Provides:
+- A per-provider transport adapter mounted on every Authlib session,
+  surviving the session being closed after each call
+- Default connect/read timeouts per provider
+- A per-provider cap on in-flight requests that fails fast with 503
+  Service Unavailable rather than tying up every worker on a slow
+  provider
+- Request, rejection and latency counters per provider
+
+The Authlib client classes that mount these adapters are in
+auth/oauth_clients.py, so that Authlib is imported on the first OAuth
+login rather than at startup.
+
+The transport is blocking but cooperative under gevent: with
+``gunicorn -k gevent`` the provider round trips of many concurrent
+callbacks overlap on one worker while they share the pooled connections.
+
+Configuration (app.config / environment):
+- OAUTH_HTTP_POOL: Use the shared pools (default True)
+- OAUTH_HTTP_TIMEOUT: Seconds for connect and read (default 5)
+- OAUTH_HTTP_MAX_CONCURRENCY: In-flight requests per provider (default 20)
+- OAUTH_HTTP_ACQUIRE_TIMEOUT: Seconds to wait for a free slot (default 2)
+- OAUTH_<PROVIDER>_TIMEOUT, OAUTH_<PROVIDER>_MAX_CONCURRENCY: Overrides
+  for one provider, e.g. OAUTH_GITHUB_TIMEOUT=3
+"""
+
+import os
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from werkzeug.exceptions import ServiceUnavailable
+
+from .metrics import metrics
+
+
+class ProviderBusy(ServiceUnavailable):
+    """Raised when a provider's request cap is reached; renders as a 503."""
+    description = 'The sign-in provider is busy. Please try again in a moment.'
+
+
+class ProviderAdapter(HTTPAdapter):
+    """
+    Keep-alive transport for one provider with a timeout and request cap.
+
+    Args:
+        provider (str): Provider name, used as the metrics label
+        timeout (float): Default connect/read timeout in seconds
+        max_concurrency (int): Maximum in-flight requests
+        acquire_timeout (float): Seconds to wait for a free slot
+    """
+
+    def __init__(self, provider, timeout, max_concurrency, acquire_timeout):
+        super().__init__(pool_connections=4, pool_maxsize=max_concurrency)
+        self.provider = provider
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise ProviderBusy()
+        started = time.perf_counter()
+        try:
+            return super().send(request, **kwargs)
+        finally:
+            self._slots.release()
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.requests += 1
+                self.seconds += elapsed
+            metrics.observe('oauth_request_duration_seconds', elapsed, provider=self.provider)
+
+    def close(self):
+        # Authlib closes its session after every call; the shared pool
+        # outlives those sessions and is closed by ProviderPools.reset
+        pass
+
+    def shutdown(self):
+        """Close the pooled connections."""
+        super().close()
+
+
+class ProviderPools:
+    """
+    Shared transport adapters, one per provider and process.
+
+    Create once at module level and bind with ``init_app``. Adapters
+    are created on first use in each process, so forked workers do not
+    share the parent's sockets.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.config = {}
+        self._adapters = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Configure pool settings from the application config.
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault(
+            'OAUTH_HTTP_POOL',
+            os.getenv('OAUTH_HTTP_POOL', 'True').lower() in ('true', 'yes', '1')
+        )
+        app.config.setdefault('OAUTH_HTTP_TIMEOUT', float(os.getenv('OAUTH_HTTP_TIMEOUT', 5)))
+        app.config.setdefault('OAUTH_HTTP_MAX_CONCURRENCY', int(os.getenv('OAUTH_HTTP_MAX_CONCURRENCY', 20)))
+        app.config.setdefault('OAUTH_HTTP_ACQUIRE_TIMEOUT', float(os.getenv('OAUTH_HTTP_ACQUIRE_TIMEOUT', 2)))
+        self.enabled = app.config['OAUTH_HTTP_POOL']
+        self.config = app.config
+        self.reset()
+        app.extensions['oauth_http'] = self
+
+    def _setting(self, provider, name, cast):
+        key = f'OAUTH_{provider.upper()}_{name}'
+        value = self.config.get(key, os.getenv(key))
+        return cast(value) if value is not None else self.config[f'OAUTH_HTTP_{name}']
+
+    def adapter(self, provider):
+        """
+        Return the shared adapter for a provider in this process.
+
+        Args:
+            provider (str): Provider name
+
+        Returns:
+            ProviderAdapter: Adapter to mount on the provider's sessions
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._adapters = {}
+                    self._pid = os.getpid()
+        adapter = self._adapters.get(provider)
+        if adapter is None:
+            with self._lock:
+                adapter = self._adapters.get(provider)
+                if adapter is None:
+                    adapter = ProviderAdapter(
+                        provider,
+                        self._setting(provider, 'TIMEOUT', float),
+                        self._setting(provider, 'MAX_CONCURRENCY', int),
+                        self.config['OAUTH_HTTP_ACQUIRE_TIMEOUT'],
+                    )
+                    self._adapters[provider] = adapter
+        return adapter
+
+    def reset(self):
+        """Close all pooled connections."""
+        with self._lock:
+            adapters, self._adapters = self._adapters, {}
+        for adapter in adapters.values():
+            adapter.shutdown()
+
+    def stats(self):
+        """
+        Return request counters per provider for this process.
+
+        Returns:
+            dict: provider -> requests, rejected and mean_ms
+        """
+        return {
+            provider: {
+                'requests': adapter.requests,
+                'rejected': adapter.rejected,
+                'mean_ms': adapter.seconds / adapter.requests * 1000 if adapter.requests else 0.0,
+            }
+            for provider, adapter in self._adapters.items()
+        }
+
+
+# Shared instance, bound to the app in init_oauth
+provider_pools = ProviderPools()
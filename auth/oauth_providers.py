@@ -0,0 +1,216 @@
+"""
+Data-driven registry of OAuth providers.
+
+Each provider is described by data: endpoints, scope, where the user's
+profile comes from, and a mapper that normalizes that profile. Provides:
+- Built-in definitions for Google, GitHub, Instagram and Twitter (X),
+  extendable or overridable with the OAUTH_PROVIDERS setting
+- Only providers with a client id configured are offered
+- Authlib clients are registered on first use rather than at startup
+- Normalized profiles for ``User.get_or_create``: a dict with ``sub``,
+  ``email``, ``name`` and ``picture``
+
+Configuration (app.config):
+- <NAME>_CLIENT_ID, <NAME>_CLIENT_SECRET: Credentials; a provider without
+  a client id is skipped
+- OAUTH_PROVIDERS: Dict of provider name to definition overrides, e.g.
+  ``{'gitlab': {'authorize_url': ..., 'access_token_url': ...,
+  'api_base_url': ..., 'scope': 'read_user',
+  'userinfo': {'endpoint': 'user'}, 'mapper': 'myapp.oauth:map_gitlab'}}``
+
+Definition keys: authorize_url, access_token_url, api_base_url,
+server_metadata_url, scope, userinfo (None to use the verified ID token,
+else a dict with endpoint, optional params and optional data_key) and
+mapper (callable or ``'module:function'`` import path).
+"""
+
+import threading
+
+from werkzeug.utils import import_string
+
+
+def map_google(data):
+    """Normalize OpenID Connect ID token claims (Google)."""
+    return {
+        'sub': data['sub'],
+        'email': data.get('email'),
+        'name': data.get('name'),
+        'picture': data.get('picture'),
+    }
+
+
+def map_github(data):
+    """Normalize a GitHub ``/user`` response."""
+    return {
+        'sub': str(data['id']),
+        'email': data.get('email'),
+        'name': data.get('name') or data.get('login'),
+        'picture': data.get('avatar_url'),
+    }
+
+
+def map_instagram(data):
+    """Normalize an Instagram Graph ``/me`` response."""
+    return {
+        'sub': str(data['id']),
+        'email': None,
+        'name': data.get('username'),
+        'picture': None,
+    }
+
+
+def map_twitter(data):
+    """Normalize the ``data`` object of a Twitter (X) ``users/me`` response."""
+    return {
+        'sub': str(data['id']),
+        'email': None,
+        'name': data.get('name'),
+        'picture': data.get('profile_image_url'),
+    }
+
+
+DEFAULT_PROVIDERS = {
+    'google': {
+        'authorize_url': 'https://accounts.google.com/o/oauth2/auth',
+        'access_token_url': 'https://accounts.google.com/o/oauth2/token',
+        'api_base_url': 'https://www.googleapis.com/oauth2/v1/',
+        # Discovery provides the issuer and signing keys for ID tokens
+        'server_metadata_url': 'https://accounts.google.com/.well-known/openid-configuration',
+        'scope': 'openid email profile',
+        'userinfo': None,
+        'mapper': map_google,
+    },
+    'github': {
+        'authorize_url': 'https://github.com/login/oauth/authorize',
+        'access_token_url': 'https://github.com/login/oauth/access_token',
+        'api_base_url': 'https://api.github.com/',
+        'scope': 'user:email',
+        'userinfo': {'endpoint': 'user'},
+        'mapper': map_github,
+    },
+    'instagram': {
+        'authorize_url': 'https://api.instagram.com/oauth/authorize',
+        'access_token_url': 'https://api.instagram.com/oauth/access_token',
+        'api_base_url': 'https://graph.instagram.com/',
+        'scope': 'user_profile,user_media',
+        'userinfo': {'endpoint': 'me', 'params': {'fields': 'id,username'}},
+        'mapper': map_instagram,
+    },
+    'twitter': {
+        'authorize_url': 'https://twitter.com/i/oauth2/authorize',
+        'access_token_url': 'https://api.twitter.com/2/oauth2/token',
+        'api_base_url': 'https://api.twitter.com/2/',
+        'scope': 'users.read tweet.read',
+        'userinfo': {'endpoint': 'users/me', 'params': {'user.fields': 'id,name,profile_image_url'},
+                     'data_key': 'data'},
+        'mapper': map_twitter,
+    },
+}
+
+_CLIENT_PARAMS = ('authorize_url', 'access_token_url', 'api_base_url', 'server_metadata_url')
+
+
+class ProviderRegistry:
+    """
+    Configured OAuth providers with lazily created Authlib clients.
+
+    Create once at module level and bind with ``init_app``.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.oauth = None
+        self.providers = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app, oauth=None):
+        """
+        Load provider definitions, keeping only configured providers.
+
+        Args:
+            app: Flask application instance
+            oauth: Authlib OAuth registry bound to the app (default: a
+                pooled registry created with the first client, so that
+                Authlib is not imported until a provider is used)
+        """
+        definitions = {name: dict(spec) for name, spec in DEFAULT_PROVIDERS.items()}
+        for name, overrides in app.config.get('OAUTH_PROVIDERS', {}).items():
+            definitions.setdefault(name, {}).update(overrides)
+
+        self.providers = {}
+        for name, spec in definitions.items():
+            if not app.config.get(f'{name.upper()}_CLIENT_ID'):
+                continue
+            if isinstance(spec.get('mapper'), str):
+                spec['mapper'] = import_string(spec['mapper'].replace(':', '.'))
+            self.providers[name] = spec
+
+        self.app = app
+        self.oauth = oauth
+        self._clients = {}
+        app.extensions['oauth_providers'] = self
+
+    def __contains__(self, name):
+        return name in self.providers
+
+    def client(self, name):
+        """
+        Return the Authlib client for a provider, registering it on first use.
+
+        Args:
+            name (str): Provider name
+
+        Returns:
+            Client, or None if the provider is not configured
+        """
+        client = self._clients.get(name)
+        if client is not None or name not in self.providers:
+            return client
+        with self._lock:
+            if self.oauth is None:
+                from .oauth_clients import PooledOAuth
+                self.oauth = PooledOAuth(self.app)
+            if name not in self._clients:
+                spec = self.providers[name]
+                prefix = name.upper()
+                # overwrite=True lets <NAME>_ACCESS_TOKEN_URL etc. in the app
+                # config replace the defaults, e.g. for a local mock provider
+                self._clients[name] = self.oauth.register(
+                    name=name,
+                    overwrite=True,
+                    client_id=self.app.config[f'{prefix}_CLIENT_ID'],
+                    client_secret=self.app.config.get(f'{prefix}_CLIENT_SECRET'),
+                    client_kwargs={'scope': spec['scope']},
+                    **{key: spec[key] for key in _CLIENT_PARAMS if spec.get(key)}
+                )
+        return self._clients[name]
+
+    def fetch_profile(self, name, client, token):
+        """
+        Fetch and normalize the signed-in user's profile.
+
+        Args:
+            name (str): Provider name
+            client: Client returned by ``client(name)``
+            token (dict): Token from ``authorize_access_token``
+
+        Returns:
+            dict: Normalized profile (sub, email, name, picture)
+        """
+        spec = self.providers[name]
+        userinfo = spec.get('userinfo')
+        if userinfo is None:
+            # Verified against the cached JWKS by authorize_access_token
+            data = token.get('userinfo') or client.parse_id_token(token, nonce=None)
+        else:
+            response = client.get(userinfo['endpoint'], params=userinfo.get('params'))
+            response.raise_for_status()
+            data = response.json()
+            if userinfo.get('data_key'):
+                data = data[userinfo['data_key']]
+        return spec['mapper'](data)
+
+
+# Shared instance, bound to the app in init_oauth
+provider_registry = ProviderRegistry()
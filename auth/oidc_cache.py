@@ -0,0 +1,216 @@
+"""
+Cache for OpenID Connect discovery metadata and signing keys (JWKS).
+
+Verifying an ID token needs the provider's discovery document and key
+set. Authlib fetches them on first use with no expiry policy, and a
+burst of callbacks on a cold process fetches them once per request.
+This module caches them per process. Provides:
+- TTLs taken from the response's ``Cache-Control: max-age`` (minus
+  ``Age``), clamped to configured bounds
+- Refresh ahead of expiry in a background thread, so callbacks keep
+  using the cached copy while it is renewed
+- Single-flight fetching: concurrent misses for a URL wait for one
+  upstream request instead of each making their own
+- Last-known-good fallback when a refresh fails
+- Rate-limited forced refreshes (unknown ``kid`` after key rotation)
+
+Configuration (app.config / environment):
+- OIDC_CACHE_DEFAULT_TTL: TTL without Cache-Control (default 3600)
+- OIDC_CACHE_MIN_TTL: Lower TTL bound, also the retry delay after a
+  failed refresh (default 60)
+- OIDC_CACHE_MAX_TTL: Upper TTL bound (default 86400)
+- OIDC_CACHE_REFRESH_AHEAD: Fraction of the TTL after which a background
+  refresh starts (default 0.8)
+- OIDC_CACHE_WAIT: Seconds a waiting request waits for an in-flight
+  fetch (default 10)
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataUnavailable(ServiceUnavailable):
+    """Raised when a document cannot be fetched and none is cached."""
+    description = 'The sign-in provider is unavailable. Please try again in a moment.'
+
+
+class _Entry:
+    __slots__ = ('value', 'fetched_at', 'refresh_at', 'expires_at')
+
+    def __init__(self, value, fetched_at, ttl, refresh_ahead):
+        self.value = value
+        self.fetched_at = fetched_at
+        self.refresh_at = fetched_at + ttl * refresh_ahead
+        self.expires_at = fetched_at + ttl
+
+
+class MetadataCache:
+    """
+    Per-process cache of JSON documents fetched by URL.
+
+    Create once at module level and bind with ``init_app``; usable with
+    its defaults before that.
+    """
+
+    def __init__(self):
+        self.default_ttl = 3600
+        self.min_ttl = 60
+        self.max_ttl = 86400
+        self.refresh_ahead = 0.8
+        self.wait = 10.0
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'fetches': 0, 'failures': 0, 'stale_served': 0}
+
+    def init_app(self, app):
+        """
+        Configure TTL policy from the application config.
+
+        Args:
+            app: Flask application instance
+        """
+        app.config.setdefault('OIDC_CACHE_DEFAULT_TTL', int(os.getenv('OIDC_CACHE_DEFAULT_TTL', 3600)))
+        app.config.setdefault('OIDC_CACHE_MIN_TTL', int(os.getenv('OIDC_CACHE_MIN_TTL', 60)))
+        app.config.setdefault('OIDC_CACHE_MAX_TTL', int(os.getenv('OIDC_CACHE_MAX_TTL', 86400)))
+        app.config.setdefault('OIDC_CACHE_REFRESH_AHEAD', float(os.getenv('OIDC_CACHE_REFRESH_AHEAD', 0.8)))
+        app.config.setdefault('OIDC_CACHE_WAIT', float(os.getenv('OIDC_CACHE_WAIT', 10)))
+        self.default_ttl = app.config['OIDC_CACHE_DEFAULT_TTL']
+        self.min_ttl = app.config['OIDC_CACHE_MIN_TTL']
+        self.max_ttl = app.config['OIDC_CACHE_MAX_TTL']
+        self.refresh_ahead = app.config['OIDC_CACHE_REFRESH_AHEAD']
+        self.wait = app.config['OIDC_CACHE_WAIT']
+        app.extensions['oidc_cache'] = self
+
+    def get(self, url, fetch, force=False):
+        """
+        Return the cached document for a URL, fetching it if needed.
+
+        Args:
+            url (str): Document URL
+            fetch: Callable taking the URL and returning a requests
+                Response
+            force (bool): Refetch even if cached (at most once per
+                OIDC_CACHE_MIN_TTL), e.g. for an unknown signing key
+
+        Returns:
+            dict: Parsed JSON document
+
+        Raises:
+            MetadataUnavailable: If the fetch fails and nothing is cached
+        """
+        now = time.time()
+        entry = self._entries.get(url)
+        if entry is not None:
+            if force:
+                if now - entry.fetched_at < self.min_ttl:
+                    return self._hit(entry)
+            elif now < entry.refresh_at:
+                return self._hit(entry)
+            elif now < entry.expires_at:
+                self._refresh_in_background(url, fetch)
+                return self._hit(entry)
+        return self._fetch_once(url, fetch, entry)
+
+    def invalidate(self, url=None):
+        """Drop one cached document, or all of them."""
+        with self._lock:
+            if url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(url, None)
+
+    def stats(self):
+        """
+        Return cache counters for this process.
+
+        Returns:
+            dict: hits, fetches, failures, stale_served and entries
+        """
+        return dict(self._stats, entries=len(self._entries))
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _hit(self, entry):
+        self._count('hits')
+        return entry.value
+
+    def _ttl(self, headers):
+        """TTL in seconds from Cache-Control and Age headers."""
+        cache_control = headers.get('Cache-Control', '')
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            return self.min_ttl
+        match = re.search(r'(?:s-maxage|max-age)=(\d+)', cache_control)
+        if not match:
+            return self.default_ttl
+        age = headers.get('Age', '0')
+        ttl = int(match.group(1)) - (int(age) if age.isdigit() else 0)
+        return max(self.min_ttl, min(self.max_ttl, ttl))
+
+    def _fetch_once(self, url, fetch, stale):
+        """Fetch a URL, sharing one upstream request among concurrent callers."""
+        with self._lock:
+            done = self._inflight.get(url)
+            leader = done is None
+            if leader:
+                done = self._inflight[url] = threading.Event()
+
+        if not leader:
+            done.wait(self.wait)
+            entry = self._entries.get(url) or stale
+            if entry is None:
+                raise MetadataUnavailable()
+            return self._hit(entry)
+
+        try:
+            response = fetch(url)
+            response.raise_for_status()
+            entry = _Entry(response.json(), time.time(), self._ttl(response.headers), self.refresh_ahead)
+            self._count('fetches')
+            self._entries[url] = entry
+            return entry.value
+        except Exception as e:
+            self._count('failures')
+            if stale is None:
+                logger.error("Failed to fetch %s: %s", url, e)
+                raise MetadataUnavailable()
+            # Keep serving the last good copy and retry after a short delay
+            logger.warning("Failed to refresh %s, using cached copy: %s", url, e)
+            retry_at = time.time() + self.min_ttl
+            stale.refresh_at = retry_at
+            stale.expires_at = max(stale.expires_at, retry_at)
+            self._count('stale_served')
+            return stale.value
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            done.set()
+
+    def _refresh_in_background(self, url, fetch):
+        """Start a refresh thread; only the first caller past refresh_at does."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or url in self._inflight or time.time() < entry.refresh_at:
+                return
+            entry.refresh_at = entry.expires_at
+
+        def refresh():
+            try:
+                self._fetch_once(url, fetch, entry)
+            except MetadataUnavailable:
+                pass
+
+        threading.Thread(target=refresh, name='oidc-refresh', daemon=True).start()
+
+
+# Shared instance, bound to the app in init_oauth
+metadata_cache = MetadataCache()
@@ -0,0 +1,124 @@
+"""
+Password hashing policy.
+
+Central place for how local account passwords are hashed, so the cost
+can be tuned to the deployment's CPU budget. Signup, password reset and
+User.check_password all route through here. Provides:
+- Hashing with the configured algorithm and cost
+- Verification of hashes created under any earlier policy
+- Detection of hashes that should be upgraded to the current policy
+- Calibration of the iteration count for a target latency
+
+Configuration (app.config / environment):
+- PASSWORD_HASH_ALGORITHM: Werkzeug method, e.g. 'pbkdf2:sha256'
+- PASSWORD_HASH_ITERATIONS: PBKDF2 iteration count (default 260000)
+- PASSWORD_SALT_LENGTH: Salt length in characters (default 16)
+
+All hashing uses Werkzeug's security helpers and runs in the hashing
+pool (see auth/hashing.py).
+"""
+
+import time
+
+from flask import current_app, has_app_context
+from werkzeug import security
+
+from .hashing import hashing
+
+DEFAULT_ALGORITHM = 'pbkdf2:sha256'
+DEFAULT_ITERATIONS = 260000
+DEFAULT_SALT_LENGTH = 16
+
+
+def _policy():
+    """
+    Return the active (method, salt_length) policy.
+
+    Returns:
+        tuple: Werkzeug method string including iterations, salt length
+    """
+    config = current_app.config if has_app_context() else {}
+    algorithm = config.get('PASSWORD_HASH_ALGORITHM', DEFAULT_ALGORITHM)
+    iterations = config.get('PASSWORD_HASH_ITERATIONS', DEFAULT_ITERATIONS)
+    salt_length = config.get('PASSWORD_SALT_LENGTH', DEFAULT_SALT_LENGTH)
+    if algorithm.startswith('pbkdf2:'):
+        method = f'{algorithm}:{iterations}'
+    else:
+        method = algorithm
+    return method, salt_length
+
+
+def hash_password(password):
+    """
+    Hash a password with the current policy.
+
+    Args:
+        password (str): Plaintext password
+
+    Returns:
+        str: Werkzeug hash string (``method$salt$hash``)
+    """
+    method, salt_length = _policy()
+    return hashing.generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def verify_password(pwhash, password):
+    """
+    Verify a password against a stored hash from any policy.
+
+    Args:
+        pwhash (str): Stored hash
+        password (str): Plaintext password to check
+
+    Returns:
+        bool: True if the password matches
+    """
+    if not pwhash:
+        return False
+    return hashing.check_password_hash(pwhash, password)
+
+
+def needs_rehash(pwhash):
+    """
+    Check whether a stored hash was made with different parameters.
+
+    Args:
+        pwhash (str): Stored hash
+
+    Returns:
+        bool: True if the method, cost or salt length differs from policy
+    """
+    if not pwhash or pwhash.count('$') < 2:
+        return False
+    stored_method, salt, _ = pwhash.split('$', 2)
+    method, salt_length = _policy()
+    return stored_method != method or len(salt) != salt_length
+
+
+def calibrate(target_ms, algorithm=DEFAULT_ALGORITHM, samples=5):
+    """
+    Recommend a PBKDF2 iteration count for a target hash latency.
+
+    Args:
+        target_ms (float): Desired time for one hash, in milliseconds
+        algorithm (str): PBKDF2 method, e.g. 'pbkdf2:sha256'
+        samples (int): Timed runs per measurement (median is used)
+
+    Returns:
+        dict: ``iterations`` recommendation and measured ``hash_ms``
+
+    Runs inline on the current core, not in the hashing pool, so the
+    result reflects single-core cost.
+    """
+    def measure(iterations):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            security.generate_password_hash('calibration', method=f'{algorithm}:{iterations}')
+            timings.append(time.perf_counter() - started)
+        return sorted(timings)[len(timings) // 2] * 1000
+
+    probe = 20000
+    per_iteration_ms = measure(probe) / probe
+    iterations = max(1000, int(target_ms / per_iteration_ms) // 1000 * 1000)
+    return {'iterations': iterations, 'hash_ms': measure(iterations)}
@@ -0,0 +1,373 @@
+"""
+On-demand request profiling and a slow-request log.
+
+Shows where time goes inside a single request (e.g. ``login_page`` or
+``verify``) on a production worker. Provides:
+- A sampling profiler for selected requests: a background thread reads
+  the request thread's stack every PROFILING_INTERVAL seconds, so the
+  profiled request runs unmodified code
+- Selection by an admin header carrying PROFILING_TOKEN, or by a random
+  share of requests
+- Output per endpoint in collapsed-stack format (flamegraph.pl,
+  speedscope, inferno), appended to ``<endpoint>.collapsed``, and one
+  speedscope JSON file per profiled request
+- A slow-request log: every request over SLOW_REQUEST_MS is logged with
+  its SQL statements and hashing jobs and their timings
+
+When neither feature is enabled (the default) no hooks or listeners are
+installed, and the hashing call site costs a single attribute check.
+Stacks are sampled per OS thread, so under gevent the profile shows the
+worker's hub rather than the request.
+
+Configuration (app.config / environment):
+- PROFILING_ENABLED: Allow requests to be profiled (default False)
+- PROFILING_TOKEN: Value of the profiling header that triggers a profile
+  (default: none, header triggering disabled)
+- PROFILING_HEADER: Request header carrying the token (default X-Profile)
+- PROFILING_SAMPLE_RATE: Share of requests profiled without the header
+  (default 0.0)
+- PROFILING_INTERVAL: Seconds between stack samples (default 0.005)
+- PROFILING_DIR: Directory for profile output (default profiles)
+- PROFILING_FORMATS: Comma-separated output formats, ``collapsed`` and/or
+  ``speedscope`` (default both)
+- SLOW_REQUEST_MS: Log requests slower than this many milliseconds
+  (default: disabled)
+"""
+
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from functools import lru_cache
+
+from flask import request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_QUERY_STARTED = 'profiling_query_started'
+_MAX_STATEMENTS = 50
+
+
+class StackSampler:
+    """
+    Background thread sampling the stacks of registered threads.
+
+    The thread sleeps on an event while no request is being profiled,
+    and is restarted in each forked worker.
+
+    Args:
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._profiles = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+    def start(self, profile):
+        """Begin sampling the calling thread into ``profile``."""
+        self._ensure_started()
+        with self._lock:
+            self._profiles[threading.get_ident()] = profile
+        self._wake.set()
+
+    def stop(self):
+        """Stop sampling the calling thread."""
+        with self._lock:
+            self._profiles.pop(threading.get_ident(), None)
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Threads do not survive fork; drop the parent's registrations
+            self._profiles = {}
+            threading.Thread(target=self._loop, name='request-profiler', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _loop(self):
+        while True:
+            # Sample under the lock so a profile is complete once stop() returns
+            with self._lock:
+                if not self._profiles:
+                    self._wake.clear()
+                else:
+                    frames = sys._current_frames()
+                    for ident, profile in self._profiles.items():
+                        frame = frames.get(ident)
+                        if frame is not None:
+                            profile.add(frame)
+                    del frames, frame
+            if not self._wake.is_set():
+                self._wake.wait()
+                continue
+            time.sleep(self.interval)
+
+
+class Profile:
+    """
+    Stack samples collected for one request.
+
+    Args:
+        endpoint (str): Endpoint name the profile is filed under
+        interval (float): Seconds each sample stands for
+    """
+
+    def __init__(self, endpoint, interval):
+        self.id = uuid.uuid4().hex[:12]
+        self.endpoint = endpoint
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.elapsed = None
+        self.stacks = {}
+
+    def add(self, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack = tuple(reversed(stack))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def collapsed(self):
+        """Samples in collapsed-stack format, one ``frame;frame count`` line per stack."""
+        lines = []
+        for stack, count in self.stacks.items():
+            frames = ';'.join(f'{name} ({_short_path(path)}:{line})' for name, path, line in stack)
+            lines.append(f'{frames} {count}\n')
+        return ''.join(lines)
+
+    def speedscope(self):
+        """Samples as a speedscope "sampled" profile."""
+        frame_index = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            sample = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frame_index)
+                sample.append(frame_index[frame])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f'{self.endpoint} {self.id}',
+            'exporter': 'auth.profiling',
+            'shared': {
+                'frames': [
+                    {'name': name, 'file': path, 'line': line}
+                    for name, path, line in frame_index
+                ],
+            },
+            'profiles': [{
+                'type': 'sampled',
+                'name': self.endpoint,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self.elapsed or sum(weights),
+                'samples': samples,
+                'weights': weights,
+            }],
+        }
+
+
+class RequestTrace:
+    """SQL statements and hashing jobs of one request, for the slow log."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = []
+        self.statement_count = 0
+        self.statement_seconds = 0.0
+        self.hashes = []
+
+
+class RequestProfiler:
+    """
+    Flask bindings for request profiling and the slow-request log.
+
+    Create once at module level and bind with ``init_app``.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = None
+        self.config = {}
+        self.sampler = None
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def init_app(self, app, db=None):
+        """
+        Read settings and, if enabled, install the request hooks.
+
+        Args:
+            app: Flask application instance (after the other extensions)
+            db: Flask-SQLAlchemy extension whose statements are logged
+        """
+        app.config.setdefault(
+            'PROFILING_ENABLED',
+            os.getenv('PROFILING_ENABLED', 'False').lower() in ('true', 'yes', '1')
+        )
+        app.config.setdefault('PROFILING_TOKEN', os.getenv('PROFILING_TOKEN'))
+        app.config.setdefault('PROFILING_HEADER', os.getenv('PROFILING_HEADER', 'X-Profile'))
+        app.config.setdefault('PROFILING_SAMPLE_RATE', float(os.getenv('PROFILING_SAMPLE_RATE', 0.0)))
+        app.config.setdefault('PROFILING_INTERVAL', float(os.getenv('PROFILING_INTERVAL', 0.005)))
+        app.config.setdefault('PROFILING_DIR', os.getenv('PROFILING_DIR', 'profiles'))
+        app.config.setdefault('PROFILING_FORMATS', os.getenv('PROFILING_FORMATS', 'collapsed,speedscope'))
+        slow_ms = os.getenv('SLOW_REQUEST_MS')
+        app.config.setdefault('SLOW_REQUEST_MS', float(slow_ms) if slow_ms else None)
+
+        app.extensions['profiling'] = self
+        self.config = app.config
+        self.enabled = app.config['PROFILING_ENABLED']
+        self.slow_ms = app.config['SLOW_REQUEST_MS']
+        if not self.enabled and self.slow_ms is None:
+            return
+
+        if self.enabled:
+            self.sampler = StackSampler(app.config['PROFILING_INTERVAL'])
+            os.makedirs(app.config['PROFILING_DIR'], exist_ok=True)
+
+        # Run first before the request and last after it, so the other
+        # extensions' hooks are part of the profile
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+        if self.slow_ms is not None and db is not None:
+            with app.app_context():
+                engines = list(db.engines.values())
+            for engine in engines:
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def record_hash(self, name, seconds):
+        """
+        Note a hashing job in the current request's slow-log trace.
+
+        Args:
+            name (str): Hashing job name
+            seconds (float): Time the job took
+        """
+        if self.slow_ms is None:
+            return
+        trace = getattr(self._local, 'trace', None)
+        if trace is not None:
+            trace.hashes.append((name, seconds))
+
+    def _wants_profile(self):
+        token = self.config['PROFILING_TOKEN']
+        supplied = request.headers.get(self.config['PROFILING_HEADER'])
+        if token and supplied:
+            return hmac.compare_digest(supplied.encode(), token.encode())
+        rate = self.config['PROFILING_SAMPLE_RATE']
+        return rate > 0 and random.random() < rate
+
+    def _start_request(self):
+        self._local.trace = RequestTrace() if self.slow_ms is not None else None
+        self._local.profile = None
+        if self.enabled and self._wants_profile():
+            profile = Profile(request.endpoint or 'unmatched', self.sampler.interval)
+            self._local.profile = profile
+            self.sampler.start(profile)
+
+    def _finish_request(self, response):
+        profile = self._stop_profile()
+        if profile is not None:
+            response.headers['X-Profile-Id'] = profile.id
+        return response
+
+    def _teardown_request(self, exc):
+        self._stop_profile()
+        trace = getattr(self._local, 'trace', None)
+        self._local.trace = None
+        if trace is None:
+            return
+        elapsed_ms = (time.perf_counter() - trace.started) * 1000
+        if elapsed_ms >= self.slow_ms:
+            self._log_slow_request(trace, elapsed_ms, exc)
+
+    def _stop_profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            return None
+        self._local.profile = None
+        self.sampler.stop()
+        profile.elapsed = time.perf_counter() - profile.started
+        try:
+            self._write_profile(profile)
+        except OSError as e:
+            logger.error("Failed to write profile %s: %s", profile.id, e)
+        return profile
+
+    def _write_profile(self, profile):
+        directory = self.config['PROFILING_DIR']
+        formats = {f.strip() for f in self.config['PROFILING_FORMATS'].split(',')}
+        name = re.sub(r'[^\w.-]', '_', profile.endpoint)
+        if 'collapsed' in formats and profile.stacks:
+            # One write per profile, so appends from several workers do not interleave
+            with self._write_lock, open(os.path.join(directory, f'{name}.collapsed'), 'a') as f:
+                f.write(profile.collapsed())
+        if 'speedscope' in formats:
+            path = os.path.join(directory, f'{name}-{profile.id}.speedscope.json')
+            with open(path, 'w') as f:
+                json.dump(profile.speedscope(), f)
+
+    def _log_slow_request(self, trace, elapsed_ms, exc):
+        hash_ms = sum(seconds for _, seconds in trace.hashes) * 1000
+        logger.warning(
+            "Slow request: %s %s (%s) %.1f ms; %d SQL statements %.1f ms; %d hash jobs %.1f ms%s",
+            request.method, request.path, request.endpoint or 'unmatched', elapsed_ms,
+            trace.statement_count, trace.statement_seconds * 1000, len(trace.hashes), hash_ms,
+            f"; failed with {exc!r}" if exc is not None else '',
+            extra={
+                'event': 'slow_request',
+                'sql': [{'ms': round(seconds * 1000, 2), 'statement': statement}
+                        for statement, seconds in trace.statements],
+                'sql_omitted': trace.statement_count - len(trace.statements),
+                'hashes': [{'ms': round(seconds * 1000, 2), 'job': name} for name, seconds in trace.hashes],
+            }
+        )
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        trace = getattr(self._local, 'trace', None)
+        conn.info.setdefault(_QUERY_STARTED, []).append(
+            time.perf_counter() if trace is not None else None
+        )
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get(_QUERY_STARTED)
+        started = stack.pop() if stack else None
+        trace = getattr(self._local, 'trace', None)
+        if started is None or trace is None:
+            return
+        seconds = time.perf_counter() - started
+        trace.statement_count += 1
+        trace.statement_seconds += seconds
+        if len(trace.statements) < _MAX_STATEMENTS:
+            trace.statements.append((' '.join(statement.split())[:200], seconds))
+
+
+@lru_cache(maxsize=4096)
+def _short_path(path):
+    """File path relative to sys.path, as in tracebacks of installed code."""
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and path.startswith(prefix + os.sep):
+            return path[len(prefix) + 1:]
+    return path
+
+
+profiler = RequestProfiler()
@@ -0,0 +1,59 @@
+"""
+Per-request SQL statement and commit counters.
+
+Counts the statements and commits each request sends to the database so
+that the number of round trips per route can be checked and budgeted.
+Counts are kept on ``flask.g`` (``g.sql_statements``, ``g.sql_commits``)
+and, when SQL_STATS_HEADERS is enabled, returned in the
+``X-SQL-Statements`` and ``X-SQL-Commits`` response headers.
+
+Configuration (app.config / environment):
+- SQL_STATS_HEADERS: Add the count headers to responses (default False)
+"""
+
+import os
+
+from flask import g, has_app_context
+from sqlalchemy import event
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+
+
+def _count_commit(conn):
+    if has_app_context() and 'sql_commits' in g:
+        g.sql_commits += 1
+
+
+def init_query_stats(app, db):
+    """
+    Install the statement counters on every engine and request.
+
+    Args:
+        app: Flask application instance (after ``db.init_app``)
+        db: Flask-SQLAlchemy extension
+    """
+    app.config.setdefault(
+        'SQL_STATS_HEADERS',
+        os.getenv('SQL_STATS_HEADERS', 'False').lower() in ('true', 'yes', '1')
+    )
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _count_statement)
+        event.listen(engine, 'commit', _count_commit)
+
+    @app.before_request
+    def _reset_query_stats():
+        g.sql_statements = 0
+        g.sql_commits = 0
+
+    @app.after_request
+    def _add_query_stats_headers(response):
+        if app.config['SQL_STATS_HEADERS'] and 'sql_statements' in g:
+            response.headers['X-SQL-Statements'] = str(g.sql_statements)
+            response.headers['X-SQL-Commits'] = str(g.sql_commits)
+        return response
@@ -0,0 +1,177 @@
+"""
+Application-wide rate limiting.
+
+One Flask-Limiter instance shared by all blueprints, configured from the
+environment. Provides:
+- Shared storage (Redis or memcached) so limits hold across worker
+  processes, with an in-memory fallback if the storage is unreachable
+- Moving-window strategy
+- Composite keys (client IP + target account) for the login, password
+  reset and 2FA verification endpoints
+- An optional in-process fast path that answers clearly-under-limit
+  requests from hits reserved ahead in the shared storage, without a
+  round trip per request (``fastpath+`` storage URIs)
+
+Configuration (app.config / environment):
+- RATELIMIT_STORAGE_URI: e.g. redis://localhost:6379/1 (default memory://)
+- RATELIMIT_STRATEGY: Flask-Limiter strategy (default moving-window)
+- RATELIMIT_DEFAULT: Default limits (default "200 per day;50 per hour")
+- RATELIMIT_FASTPATH: Enable the in-process fast path (default False)
+- RATELIMIT_FASTPATH_FRACTION: Share of a limit below which a process
+  may reserve hits ahead (default 0.25)
+- RATELIMIT_FASTPATH_SYNC: Seconds a reserve is kept (default 1.0)
+"""
+
+import os
+import threading
+import time
+
+from flask import request, session
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import MovingWindowSupport, Storage, storage_from_string
+
+from .models import normalize_email
+
+# Keys tracked by the fast path before stale ones are dropped
+_MAX_LOCAL_KEYS = 10000
+
+
+def ip_and_email_key():
+    """
+    Rate limit key combining client IP and the submitted email.
+
+    Returns:
+        str: ``<ip>:<normalized email>``
+    """
+    email = normalize_email(request.form.get('email')) or '-'
+    return f'{get_remote_address()}:{email}'
+
+
+def ip_and_pending_user_key():
+    """
+    Rate limit key combining client IP and the user awaiting 2FA.
+
+    Returns:
+        str: ``<ip>:<verification user id>``
+    """
+    return f"{get_remote_address()}:{session.get('verification_user_id', '-')}"
+
+
+limiter = Limiter(key_func=get_remote_address)
+
+
+def init_rate_limiting(app):
+    """
+    Configure and bind the shared limiter.
+
+    Args:
+        app: Flask application instance
+    """
+    storage_uri = os.getenv('RATELIMIT_STORAGE_URI', 'memory://')
+    fastpath = os.getenv('RATELIMIT_FASTPATH', 'False').lower() in ('true', 'yes', '1')
+    if fastpath and not storage_uri.startswith(('memory', FastPathStorage.PREFIX)):
+        storage_uri = FastPathStorage.PREFIX + storage_uri
+
+    app.config.setdefault('RATELIMIT_STORAGE_URI', storage_uri)
+    app.config.setdefault('RATELIMIT_STRATEGY', os.getenv('RATELIMIT_STRATEGY', 'moving-window'))
+    app.config.setdefault('RATELIMIT_DEFAULT', os.getenv('RATELIMIT_DEFAULT', '200 per day;50 per hour'))
+    app.config.setdefault('RATELIMIT_IN_MEMORY_FALLBACK_ENABLED', True)
+    app.config.setdefault('RATELIMIT_STORAGE_OPTIONS', {
+        'fastpath_fraction': float(os.getenv('RATELIMIT_FASTPATH_FRACTION', 0.25)),
+        'fastpath_sync': float(os.getenv('RATELIMIT_FASTPATH_SYNC', 1.0)),
+    } if app.config['RATELIMIT_STORAGE_URI'].startswith(FastPathStorage.PREFIX) else {})
+
+    limiter.init_app(app)
+
+
+class FastPathStorage(Storage, MovingWindowSupport):
+    """
+    Moving-window storage that grants clearly-under-limit hits locally.
+
+    Wraps a shared storage (``fastpath+redis://...``). A process that
+    keeps hitting a key reserves a batch of hits for it in the shared
+    storage, in the same checked acquire as any other hit, and grants
+    later hits from that reserve without a round trip. Every hit is
+    therefore recorded in the shared storage before it is granted, and
+    the shared limit holds exactly across processes.
+
+    A reserve is sized to the hits the process granted for the key in
+    the previous ``sync`` seconds, is only taken while the key's count
+    stays under ``fraction`` of its limit, and is dropped after
+    ``sync`` seconds. Keys near their limit always go to the shared
+    storage; a reserve that goes unused counts against its key until it
+    leaves the window.
+    """
+
+    PREFIX = 'fastpath+'
+    STORAGE_SCHEME = ['fastpath+redis', 'fastpath+rediss', 'fastpath+redis+sentinel',
+                      'fastpath+redis+cluster', 'fastpath+memcached']
+
+    def __init__(self, uri, fastpath_fraction=0.25, fastpath_sync=1.0, **options):
+        self.inner = storage_from_string(uri[len(self.PREFIX):], **options)
+        self.fraction = fastpath_fraction
+        self.sync_interval = fastpath_sync
+        self.local_hits = 0
+        self._lock = threading.Lock()
+        # key -> [monotonic time of the reserve, reserved hits left, hits granted since]
+        self._local = {}
+        super().__init__(uri, **options)
+
+    @property
+    def base_exceptions(self):
+        return self.inner.base_exceptions
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        now = time.monotonic()
+        with self._lock:
+            state = self._local.get(key)
+            if state is not None and now - state[0] < self.sync_interval and state[1] >= amount:
+                state[1] -= amount
+                state[2] += amount
+                self.local_hits += amount
+                return True
+            # Only hits from the last interval say the key is being hit now
+            demand = state[2] if state is not None and now - state[0] < self.sync_interval else 0
+
+        # Reserve exhausted or stale: ask the shared storage, then reserve
+        # as many hits as were granted recently if the key is far from its limit
+        acquired = self.inner.acquire_entry(key, limit, expiry, amount=amount)
+        reserve = 0
+        if acquired and demand:
+            _, count = self.inner.get_moving_window(key, limit, expiry)
+            reserve = min(demand, int(limit * self.fraction) - count)
+            if reserve > 0 and not self.inner.acquire_entry(key, limit, expiry, amount=reserve):
+                reserve = 0
+        now = time.monotonic()
+        with self._lock:
+            if len(self._local) >= _MAX_LOCAL_KEYS:
+                self._local = {k: v for k, v in self._local.items() if now - v[0] < self.sync_interval}
+            self._local[key] = [now, max(reserve, 0), amount if acquired else 0]
+        return acquired
+
+    def get_moving_window(self, key, limit, expiry):
+        return self.inner.get_moving_window(key, limit, expiry)
+
+    # Fixed-window operations pass straight through
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        return self.inner.incr(key, expiry, elastic_expiry=elastic_expiry, amount=amount)
+
+    def get(self, key):
+        return self.inner.get(key)
+
+    def get_expiry(self, key):
+        return self.inner.get_expiry(key)
+
+    def check(self):
+        return self.inner.check()
+
+    def reset(self):
+        with self._lock:
+            self._local.clear()
+        return self.inner.reset()
+
+    def clear(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+        return self.inner.clear(key)
@@ -19,21 +19,26 @@ This module contains all routes related to user authentication including:
 
 Routes are implemented as a Flask Blueprint that gets registered
 with the main application. Uses Flask-Login for session management
-and Werkzeug for password hashing.
+and the password policy in auth/passwords.py for hashing.
 """
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, session
 from flask_login import LoginManager, login_user, logout_user, login_required
 from .. import verification_required
 import random
-from werkzeug.security import generate_password_hash
+import time
 
+from ..rate_limit import limiter, ip_and_email_key
 from flask_limiter.util import get_remote_address
-from itsdangerous import URLSafeTimedSerializer
 from urllib.parse import quote as url_quote
 from flask import current_app
-from ..models import User
+from ..models import User, normalize_email
 from .. import db
+from ..passwords import hash_password
+from ..login_guard import login_guard
+from ..tokens import token_service, password_fingerprint, RESET_TOKEN_SALT, VALID
+from ..identity_cache import identity_cache
+from ..sessions import regenerate_session
 
 # Create authentication blueprint
 auth_bp = Blueprint('auth', __name__)
@@ -43,6 +48,8 @@ from .. import login_manager
 login_manager.login_view = 'auth.login_page'
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@limiter.limit("30 per minute", methods=['POST'])
+@limiter.limit("10 per minute", key_func=ip_and_email_key, methods=['POST'])
 def login_page():
     """
     Handle user login requests.
@@ -55,28 +62,52 @@ def login_page():
     - Shows appropriate error message on failure
     
     Security measures:
-    - Rate limited (10 requests/min)
+    - Rate limited (10 requests/min per IP and email, 30/min per IP)
+    - Account and source lockout with backoff after repeated failures,
+      checked before any database or hashing work (see login_guard.py)
+    - Same message and similar response time for unknown emails and
+      wrong passwords, to avoid account enumeration
     - CSRF protected
     - Secure session cookies
     
     Error cases handled:
     - No user found with provided email
     - Incorrect password for user
+    - Locked account or source
     - Too many requests
     """
     # Clear any existing flash messages when visiting login page
     if request.method == 'GET':
         session.pop('_flashes', None)
     if request.method == 'POST':
+        started = time.perf_counter()
         email = request.form.get('email')
         password = request.form.get('password')
-        user = User.query.filter_by(email=email).first()
+        email_key = normalize_email(email) or ''
+        source = get_remote_address()
         
-        if not user:
-            flash('No account found with this email', 'error')
-        elif not user.check_password(password):
-            flash('Incorrect password for this account', 'error')
+        if login_guard.is_locked(email_key, source):
+            login_guard.pad(started)
+            flash('Too many failed attempts. Please try again later.', 'error')
+            return render_template('login.html')
+        
+        # The filter rules out unknown emails without a database lookup
+        user = User.find_by_email(email) if login_guard.may_exist(email_key) else None
+        if user:
+            verify_started = time.perf_counter()
+            valid = user.check_password(password)
+            login_guard.observe_verify(time.perf_counter() - verify_started)
+        
+        if not user or not valid:
+            login_guard.record_failure(email_key, source)
+            login_guard.pad(started)
+            flash('Invalid email or password', 'error')
         else:
+            login_guard.record_success(email_key)
+
+            # New session id for the now partly authenticated session
+            regenerate_session()
+
             # Store next URL in session
             session['next_url'] = request.args.get('next') or url_for('auth.profile')
             
@@ -91,8 +122,10 @@ def login_page():
             
             # Import send_verification_email here to avoid circular imports
             from .twofa import send_verification_email
-            # Send verification email with code
+            # Stage the verification code; a single commit stores it
+            # (and any password re-hash) and releases the email
             send_verification_email(user)
+            db.session.commit()
             
             return redirect(url_for('twofa.verify'))
     return render_template('login.html')
@@ -166,48 +199,52 @@ def signup():
         return redirect(url_for('auth.signup_page'))
 
     # Check if email exists
-    if User.query.filter_by(email=email).first():
+    if User.find_by_email(email):
         flash('Email already registered', 'error')
         return redirect(url_for('auth.signup_page'))
 
     # Create new user with 2FA enabled by default
     new_user = User(
         email=email,
-        password=generate_password_hash(password),
+        password=hash_password(password),
         provider='local',
         twofa_enabled=True,
         twofa_method='email'
     )
 
+    # Import send_verification_email here to avoid circular imports
+    from .twofa import send_verification_email
+    # Stage the user and verification code, then commit once
     db.session.add(new_user)
-    db.session.commit()
+    send_verification_email(new_user)
 
-    # Store new user ID in session for verification
+    regenerate_session()
+    # Store new user ID in session for verification (assigned by the
+    # flush above; reading it after the commit would reload the row)
     session['verification_user_id'] = new_user.id
     session['next_url'] = url_for('auth.profile')
     session['requires_2fa'] = True  # New users have 2FA enabled by default
-    
-    # Import send_verification_email here to avoid circular imports
-    from .twofa import send_verification_email
-    # Send verification email with code
-    send_verification_email(new_user)
+    db.session.commit()
     
     return redirect(url_for('twofa.verify'))
 
-def generate_token(email):
+# Lifetime of password reset links, in seconds
+RESET_TOKEN_MAX_AGE = 3600
+
+def generate_token(user):
     """
-    Generate a secure token for password reset.
+    Generate a single-use token for password reset.
     
     Args:
-        email (str): User's email to encode in token
+        user (User): User resetting their password
         
     Returns:
-        str: Time-limited signed token containing email
+        str: Time-limited signed token containing the user id and a
+        fingerprint of the current password hash
     """
-    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-    return serializer.dumps(email, salt='password-reset-salt')
+    return token_service.generate([user.id, password_fingerprint(user.password)], salt=RESET_TOKEN_SALT)
 
-def verify_token(token, expiration=3600):
+def verify_token(token, expiration=RESET_TOKEN_MAX_AGE):
     """
     Verify password reset token validity.
     
@@ -216,20 +253,30 @@ def verify_token(token, expiration=3600):
         expiration (int): Max token age in seconds (default 1 hour)
         
     Returns:
-        str|bool: Decoded email if valid, False otherwise
+        User|None: User the token was issued to, or None if the token is
+        invalid, expired, already redeemed or issued before the user's
+        password last changed
+        
+    Redeemed tokens are rejected from the revocation list without a
+    database read; the user is loaded through the identity cache.
     """
-    serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'])
-    try:
-        email = serializer.loads(
-            token,
-            salt='password-reset-salt',
-            max_age=expiration
-        )
-        return email
-    except Exception:
-        return False
+    if token_service.is_revoked(token):
+        return None
+    result = token_service.verify(token, expiration, salt=RESET_TOKEN_SALT)
+    if result.status != VALID:
+        return None
+    if isinstance(result.value, str):
+        # Links issued before tokens carried a fingerprint (email only);
+        # single use is enforced by the revocation list alone
+        return User.find_by_email(result.value)
+    user_id, fingerprint = result.value
+    user = identity_cache.get_user(user_id)
+    if user is None or password_fingerprint(user.password) != fingerprint:
+        return None
+    return user
 
 @auth_bp.route('/forgot-password', methods=['GET', 'POST'])
+@limiter.limit("5 per hour", key_func=ip_and_email_key, methods=['POST'])
 def forgot_password():
     """
     Handle password reset requests.
@@ -243,13 +290,15 @@ def forgot_password():
     
     On invalid email:
     - Shows error message
+    
+    Rate limited to 5 requests per hour per IP and email.
     """
     if request.method == 'POST':
         email = request.form.get('email')
-        user = User.query.filter_by(email=email).first()
+        user = User.find_by_email(email)
         
         if user:
-            token = generate_token(user.email)
+            token = generate_token(user)
             reset_url = url_for('auth.reset_password', token=token, _external=True)
             # In a real app, you would send this link via email
             flash(f'Password reset link: {reset_url}', 'info')
@@ -268,24 +317,21 @@ def reset_password(token):
     
     Validates:
     - Token expiration and signature
+    - Token not redeemed before and issued against the current password
     - Password confirmation match
     
     On success:
     - Updates user password
+    - Revokes the token, so the link cannot be used again
     - Redirects to login page
     
     On failure:
     - Shows appropriate error
     - Redirects to forgot password page
     """
-    email = verify_token(token)
-    if not email:
-        flash('Invalid or expired token', 'error')
-        return redirect(url_for('auth.forgot_password'))
-    
-    user = User.query.filter_by(email=email).first()
+    user = verify_token(token, RESET_TOKEN_MAX_AGE)
     if not user:
-        flash('User not found', 'error')
+        flash('Invalid or expired token', 'error')
         return redirect(url_for('auth.forgot_password'))
     
     if request.method == 'POST':
@@ -296,8 +342,11 @@ def reset_password(token):
             flash('Passwords do not match', 'error')
             return redirect(request.url)
             
-        user.password = generate_password_hash(password)
+        user.password = hash_password(password)
         db.session.commit()
+        # The new password hash already invalidates the token; revoking
+        # it lets later uses be rejected before any database read
+        token_service.revoke(token, RESET_TOKEN_MAX_AGE)
         flash('Password updated successfully', 'success')
         return redirect(url_for('auth.login_page'))
     
@@ -7,20 +7,23 @@ Handles authentication with:
 - Instagram
 - Twitter
 
-Implements OAuth 2.0 flows using Authlib library.
+Implements OAuth 2.0 flows using Authlib library. Providers are defined
+as data in auth/oauth_providers.py; only configured ones are offered.
 Creates/updates user records in database upon successful auth.
+Provider calls go through shared keep-alive connection pools with
+per-provider timeouts and concurrency caps (see auth/oauth_http.py).
 """
 
 from flask import Blueprint, redirect, url_for, session, flash
-from authlib.integrations.flask_client import OAuth
 from flask_login import login_user
 from ..models import User  # We'll need to create this later
+from .. import db
+from ..oauth_http import provider_pools
+from ..oauth_providers import provider_registry
+from ..oidc_cache import metadata_cache
+from ..sessions import regenerate_session
 
 oauth_bp = Blueprint('oauth', __name__)
-oauth = OAuth()
-
-# OAuth configuration will go here
-providers = ['google', 'github', 'instagram', 'twitter']
 
 def init_oauth(app):
     """
@@ -29,65 +32,20 @@ def init_oauth(app):
     Args:
         app: Flask application instance
         
-    Registers OAuth clients for all supported providers with:
-    - Client IDs and secrets from config
-    - Proper authorization endpoints
-    - Required scopes for each provider
-    - API base URLs
+    Loads the provider registry (see auth/oauth_providers.py). Only
+    providers with a <NAME>_CLIENT_ID configured are offered, and their
+    clients are registered with Authlib on first use, not here; Authlib
+    itself is imported then too.
+    
+    Endpoints can be overridden from the app config using Authlib's
+    naming (e.g. GITHUB_ACCESS_TOKEN_URL, GITHUB_API_BASE_URL), for
+    instance to point a provider at a local mock server.
     
     Called during app initialization to set up OAuth integration.
     """
-    # Google configuration
-    oauth.register(
-        name='google',
-        client_id=app.config['GOOGLE_CLIENT_ID'],
-        client_secret=app.config['GOOGLE_CLIENT_SECRET'],
-        access_token_url='https://accounts.google.com/o/oauth2/token',
-        access_token_params=None,
-        authorize_url='https://accounts.google.com/o/oauth2/auth',
-        authorize_params=None,
-        api_base_url='https://www.googleapis.com/oauth2/v1/',
-        client_kwargs={'scope': 'openid email profile'}
-    )
-
-    # GitHub configuration
-    oauth.register(
-        name='github',
-        client_id=app.config['GITHUB_CLIENT_ID'],
-        client_secret=app.config['GITHUB_CLIENT_SECRET'],
-        access_token_url='https://github.com/login/oauth/access_token',
-        access_token_params=None,
-        authorize_url='https://github.com/login/oauth/authorize',
-        authorize_params=None,
-        api_base_url='https://api.github.com/',
-        client_kwargs={'scope': 'user:email'}
-    )
-
-    # Instagram configuration
-    oauth.register(
-        name='instagram',
-        client_id=app.config['INSTAGRAM_CLIENT_ID'],
-        client_secret=app.config['INSTAGRAM_CLIENT_SECRET'],
-        access_token_url='https://api.instagram.com/oauth/access_token',
-        access_token_params=None,
-        authorize_url='https://api.instagram.com/oauth/authorize',
-        authorize_params=None,
-        api_base_url='https://graph.instagram.com/',
-        client_kwargs={'scope': 'user_profile,user_media'}
-    )
-
-    # Twitter (X) configuration
-    oauth.register(
-        name='twitter',
-        client_id=app.config['TWITTER_CLIENT_ID'],
-        client_secret=app.config['TWITTER_CLIENT_SECRET'],
-        access_token_url='https://api.twitter.com/2/oauth2/token',
-        access_token_params=None,
-        authorize_url='https://twitter.com/i/oauth2/authorize',
-        authorize_params=None,
-        api_base_url='https://api.twitter.com/2/',
-        client_kwargs={'scope': 'users.read tweet.read'}
-    )
+    provider_pools.init_app(app)
+    metadata_cache.init_app(app)
+    provider_registry.init_app(app)
 
 @oauth_bp.route('/login/<provider>')
 def login(provider):
@@ -101,13 +59,14 @@ def login(provider):
         Response: Redirect to provider's authorization endpoint
         
     Raises:
-        400 Error if provider is not supported
+        400 Error if provider is not supported or not configured
     """
-    if provider not in providers:
+    client = provider_registry.client(provider)
+    if client is None:
         return "Invalid provider", 400
         
     redirect_uri = url_for('oauth.authorize', provider=provider, _external=True)
-    return oauth.create_client(provider).authorize_redirect(redirect_uri)
+    return client.authorize_redirect(redirect_uri)
 
 @oauth_bp.route('/authorize/<provider>')
 def authorize(provider):
@@ -121,37 +80,25 @@ def authorize(provider):
         Response: Redirect to home page after successful authentication
         
     Raises:
-        400 Error if provider is not supported
+        400 Error if provider is not supported or not configured
         
     Handles:
         - Access token exchange
-        - User info retrieval
+        - Profile retrieval, normalized by the provider's mapper
         - User creation/updating
         - Session creation
     """
-    if provider not in providers:
+    client = provider_registry.client(provider)
+    if client is None:
         return "Invalid provider", 400
         
-    client = oauth.create_client(provider)
     token = client.authorize_access_token()
-    
-    # Handle different provider responses
-    if provider == 'github':
-        user_info = client.get('user').json()
-        user_info['sub'] = str(user_info['id'])  # Map to standard 'sub' claim
-    elif provider == 'instagram':
-        user_info = client.get('me', params={'fields': 'id,username'}).json()
-        user_info['sub'] = user_info['id']
-        user_info['name'] = user_info['username']
-    elif provider == 'twitter':
-        user_info = client.get('users/me', params={'user.fields': 'id,name,profile_image_url'}).json()['data']
-        user_info['sub'] = user_info['id']
-        user_info['picture'] = user_info.get('profile_image_url')
-    else:  # Google and standard OIDC providers
-        user_info = client.parse_id_token(token)
+    profile = provider_registry.fetch_profile(provider, client, token)
     
     # Create/get user and log them in
-    user = User.get_or_create(provider, user_info)
+    user = User.get_or_create(provider, profile)
+    db.session.commit()
+    regenerate_session()
     login_user(user)
     
     # Check if 2FA is enabled for this user
@@ -12,19 +12,26 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user, logout_user, login_user
 from flask_mail import Message
 from datetime import datetime, timedelta
+import logging
 import secrets
-import bcrypt
+import hashlib
+import hmac
 from ..models import db, User
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
+from ..mail_queue import mail_queue
+from ..hashing import hashing
+from ..identity_cache import identity_cache
+from ..sessions import regenerate_session
+from ..challenges import challenge_store
+from ..rate_limit import limiter, ip_and_pending_user_key
+from ..logs import echo_codes_enabled
+
+logger = logging.getLogger(__name__)
 
 # Create 2FA blueprint
 twofa_bp = Blueprint('twofa', __name__, url_prefix='/2fa')
 
-# Get limiter from app
-limiter = Limiter(key_func=get_remote_address)
-
 @twofa_bp.route('/verify', methods=['GET', 'POST'])
+@limiter.limit("10 per 15 minutes", key_func=ip_and_pending_user_key, methods=['POST'])
 def verify():
     """
     Handle 2FA verification process.
@@ -33,25 +40,29 @@ def verify():
     POST: Process verification code submission
     
     Verifies the submitted code against the stored hash and
-    marks the user as verified if successful.
+    marks the user as verified if successful. The user is loaded
+    through the identity cache and the request commits at most once.
     
     Security measures:
-    - Time-limited codes
-    - Secure code storage with bcrypt
+    - Rate limited (10 attempts per 15 minutes per IP and user)
+    - Time-limited, single-use codes with an attempt limit
+    - Keyed code hashes (HMAC-SHA256, or bcrypt for compatibility)
     - Session regeneration on success
     """
     # Get user from session
     if 'verification_user_id' not in session:
         return redirect(url_for('auth.login_page'))
         
-    user = User.query.get(session['verification_user_id'])
+    user = identity_cache.get_user(session['verification_user_id'])
     if not user:
         return redirect(url_for('auth.login_page'))
         
     if request.method == 'POST':
         code = request.form.get('code', '').strip()
-        if validate_2fa_code(user, code):
-            # Log in the user after successful verification
+        if validate_2fa_code(user, code, session.get('twofa_challenge_id')):
+            # Log in the user after successful verification, under a
+            # new session id
+            regenerate_session()
             login_user(user)
             user.twofa_verified = True
             db.session.commit()
@@ -59,13 +70,16 @@ def verify():
             # Clear verification session data
             session.pop('verification_user_id', None)
             session.pop('requires_2fa', None)
+            session.pop('twofa_challenge_id', None)
             
             flash('Verification successful', 'success')
             
             # Redirect to originally intended URL or profile page
             next_url = session.pop('next_url', None)
             return redirect(next_url or url_for('auth.profile'))
-            
+        
+        # Persist the failed attempt count
+        db.session.commit()
         flash('Invalid or expired verification code', 'danger')
     return render_template('twofa_verify.html')
 
@@ -82,6 +96,7 @@ def resend_code():
     # Always allow resending code regardless of verification status
         
     send_verification_email(current_user)
+    db.session.commit()
     flash('New verification code sent to your email', 'info')
     return redirect(url_for('twofa.verify'))
 
@@ -106,17 +121,16 @@ def settings():
             # Set as not verified and send verification email
             current_user.twofa_verified = False
             send_verification_email(current_user)
-            flash('Two-factor authentication enabled. Please verify your email address.', 'success')
             db.session.commit()
+            flash('Two-factor authentication enabled. Please verify your email address.', 'success')
             
             # Redirect to verification page
             return redirect(url_for('twofa.verify'))
-        else:
-            current_user.twofa_method = None
-            current_user.twofa_verified = True
-            flash('Two-factor authentication disabled', 'info')
-            
+        
+        current_user.twofa_method = None
+        current_user.twofa_verified = True
         db.session.commit()
+        flash('Two-factor authentication disabled', 'info')
         return redirect(url_for('twofa.settings'))
     
     return render_template('twofa_settings.html')
@@ -135,24 +149,138 @@ def generate_secure_code():
     expires_at = datetime.utcnow() + timedelta(minutes=15)
     return code, expires_at
 
-def validate_2fa_code(user, submitted_code):
+class HmacCodeHasher:
     """
-    Validate 2FA code with bcrypt and expiration check.
+    HMAC-SHA256 hasher for short-lived verification codes.
+    
+    A 6-digit code that expires in 15 minutes is protected by its expiry
+    and attempt limits rather than by hash cost, so a keyed MAC is enough:
+    without the server key the stored value cannot be brute-forced offline.
+    
+    Stored format: ``hmac-sha256$<salt hex>$<digest hex>``
+    
+    Args:
+        key (bytes): MAC key; defaults to TWOFA_CODE_KEY or a key derived
+            from the app SECRET_KEY
+    """
+    prefix = 'hmac-sha256$'
+    
+    def __init__(self, key=None):
+        self.key = key
+    
+    def _key(self):
+        if self.key is not None:
+            return self.key
+        configured = current_app.config.get('TWOFA_CODE_KEY')
+        if configured:
+            return configured.encode('utf-8')
+        secret = current_app.config['SECRET_KEY']
+        if isinstance(secret, str):
+            secret = secret.encode('utf-8')
+        return hmac.new(secret, b'twofa-code-hash', hashlib.sha256).digest()
+    
+    def _digest(self, salt, code):
+        return hmac.new(self._key(), salt + code.encode('utf-8'), hashlib.sha256).hexdigest()
+    
+    def hash(self, code):
+        salt = secrets.token_bytes(16)
+        return f'{self.prefix}{salt.hex()}${self._digest(salt, code)}'
+    
+    def verify(self, code, stored):
+        try:
+            salt_hex, digest = stored[len(self.prefix):].split('$', 1)
+            salt = bytes.fromhex(salt_hex)
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._digest(salt, code), digest)
+    
+    def identify(self, stored):
+        return stored.startswith(self.prefix)
+
+class BcryptCodeHasher:
+    """
+    bcrypt hasher for verification codes, kept for compatibility.
+    
+    Runs in the hashing pool (see auth/hashing.py).
+    """
+    
+    def hash(self, code):
+        return hashing.bcrypt_hash(code)
+    
+    def verify(self, code, stored):
+        return hashing.bcrypt_check(code, stored)
+    
+    def identify(self, stored):
+        return stored.startswith(('$2a$', '$2b$', '$2y$'))
+
+# Available code hashers, selected with the TWOFA_CODE_HASHER setting
+CODE_HASHERS = {
+    'hmac': HmacCodeHasher(),
+    'bcrypt': BcryptCodeHasher(),
+}
+
+def get_code_hasher():
+    """
+    Return the configured hasher for new verification codes.
+    
+    Returns:
+        The hasher named by TWOFA_CODE_HASHER (default 'hmac')
+    """
+    return CODE_HASHERS[current_app.config.get('TWOFA_CODE_HASHER', 'hmac')]
+
+def verify_code_hash(code, stored):
+    """
+    Verify a code against a stored hash from any known hasher.
+    
+    Args:
+        code (str): Submitted code
+        stored (str): Stored hash
+        
+    Returns:
+        bool: True if the code matches
+        
+    The hasher is chosen from the stored value's format, so codes issued
+    before a change of TWOFA_CODE_HASHER keep verifying until they expire.
+    """
+    for hasher in CODE_HASHERS.values():
+        if hasher.identify(stored):
+            return hasher.verify(code, stored)
+    return False
+
+def validate_2fa_code(user, submitted_code, challenge_id=None):
+    """
+    Validate 2FA code with hash, expiration and attempt checks.
     
     Args:
         user: User object
         submitted_code: Code submitted by user
+        challenge_id: Challenge id stored in the session when the code was issued
         
     Returns:
         bool: True if code is valid and not expired
         
-    Checks both the code hash and expiration time.
+    Checks the code against its challenge (see auth/challenges.py), which
+    is consumed on success and counts failed attempts. Codes issued before
+    challenges existed are still checked against the user row until they
+    expire. Changes are staged; the caller commits.
     """
+    if challenge_id:
+        return challenge_store.verify(
+            challenge_id,
+            user.id,
+            lambda code_hash: verify_code_hash(submitted_code, code_hash)
+        )
+    
+    # Legacy codes stored on the user row
     if not user.twofa_code_hash or not user.twofa_code_expires:
         return False
     if datetime.utcnow() > user.twofa_code_expires:
         return False
-    return bcrypt.checkpw(submitted_code.encode('utf-8'), user.twofa_code_hash.encode('utf-8'))
+    if not verify_code_hash(submitted_code, user.twofa_code_hash):
+        return False
+    user.twofa_code_hash = None
+    user.twofa_code_expires = None
+    return True
 
 def send_verification_email(user):
     """
@@ -161,15 +289,24 @@ def send_verification_email(user):
     Args:
         user: User object to send code to
         
-    Generates a new code, stores its hash and expiration,
-    and sends it to the user's email address.
+    Generates a new code, stores it as a new 2FA challenge (replacing
+    any earlier challenge in this session), keeps the challenge id in
+    the session, and sends the code to the user's email address.
     
-    Note: In production, this would use a proper email service.
+    Does not commit: the caller commits as part of its own unit of work,
+    and the message is queued for background delivery (see
+    auth/mail_queue.py) only once that commit succeeds.
     """
     code, expires = generate_secure_code()
-    user.twofa_code_hash = bcrypt.hashpw(code.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-    user.twofa_code_expires = expires
-    db.session.commit()
+    if user.id is None:
+        # New users need an id before a challenge can reference them
+        db.session.flush()
+    previous = session.pop('twofa_challenge_id', None)
+    if previous:
+        challenge_store.discard(previous)
+    session['twofa_challenge_id'] = challenge_store.create(
+        user.id, get_code_hasher().hash(code), expires
+    )
     
     # Create email message with noreply sender
     msg = Message(
@@ -197,31 +334,15 @@ The Security Team
         """
     )
     
-    # Import Flask utilities here to avoid circular imports
-    from flask import flash, current_app
-    
-    try:
-        # Import mail here to avoid circular imports
-        from app import mail
-        # Send email
-        mail.send(msg)
-        print(f"Email sent successfully to {user.email}")
-    except Exception as e:
-        # Log the error but don't expose it to the user
-        print(f"Error sending email: {str(e)}")
-        print("This is expected in development if email credentials are not configured.")
-        print("Check your .env file and ensure MAIL_USERNAME and MAIL_PASSWORD are set correctly.")
-        print("\nFor Gmail accounts, you need to:")
-        print("1. If 2FA is enabled: Create an App Password at https://myaccount.google.com/apppasswords")
-        print("2. If 2FA is not enabled: Enable 'Less secure app access' at https://myaccount.google.com/lesssecureapps")
-        print("3. Make sure your account doesn't have any security blocks: https://accounts.google.com/DisplayUnlockCaptcha")
-        
-        # Don't show verification code in UI, only log to console
-        # This prevents code leakage in the UI
-    
-    # For development, always print the code to console
-    print(f"============================================")
-    print(f"VERIFICATION CODE: {code}")
-    print(f"For user: {user.email}")
-    print(f"Valid until: {expires}")
-    print(f"============================================")
+    # Hand off to the background mail queue when the caller commits, so
+    # the request does not block on the SMTP handshake; delivery
+    # failures are logged there
+    mail_queue.enqueue_on_commit(msg)
+    
+    logger.info(
+        "Verification code issued for user %s", user.id,
+        extra={'event': 'twofa_code_issued', 'expires': expires.isoformat()}
+    )
+    # Development only: TWOFA_ECHO_CODES is ignored outside debug/testing
+    if echo_codes_enabled(current_app):
+        logger.info("Verification code for %s: %s", user.email, code, extra={'event': 'twofa_code_echo'})
@@ -0,0 +1,479 @@
+"""
+Server-side session storage.
+
+By default Flask keeps the whole session (pending 2FA user, next URL,
+flashed messages) in a signed cookie that is sent, verified and parsed
+on every request. This module can keep the data on the server instead,
+with only a random session id in the cookie. Provides:
+- Backends: in-memory LRU (single process), SQLite file and Redis
+  protocol servers (requires the ``redis`` package)
+- A compact binary encoding (MessagePack; the ``msgpack`` package is
+  used when installed, otherwise a built-in encoder for the same format)
+- Lazy loading: the store is only read when the request touches
+  ``session``
+- Write-back only when the session was modified; emptied sessions are
+  deleted and their cookie removed
+- Session id rotation on login (``regenerate_session``)
+
+Configuration (app.config / environment):
+- SESSION_BACKEND: 'cookie' (default, Flask's signed cookie), 'memory',
+  'sqlite' or 'redis'
+- SESSION_URL: Redis URL for the redis backend
+- SESSION_SQLITE_PATH: Database file for the sqlite backend
+  (default sessions.db)
+- SESSION_MEMORY_MAX: Sessions kept by the memory backend (default 10000)
+
+Stored sessions expire PERMANENT_SESSION_LIFETIME after their last write.
+"""
+
+import os
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from flask import session
+from flask.sessions import SessionInterface, SessionMixin
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _pack(obj, out):
+    """Append the MessagePack encoding of ``obj`` to ``out``."""
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -0x20 <= obj < 0:
+            out.append(obj & 0xff)
+        elif -2 ** 63 <= obj < 2 ** 63:
+            out += struct.pack('>Bq', 0xd3, obj)
+        else:
+            raise TypeError(f'Integer out of range: {obj}')
+    elif isinstance(obj, float):
+        out += struct.pack('>Bd', 0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        if len(data) < 32:
+            out.append(0xa0 | len(data))
+        else:
+            out += struct.pack('>BI', 0xdb, len(data))
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        out += struct.pack('>BI', 0xc6, len(obj))
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        if len(obj) < 16:
+            out.append(0x90 | len(obj))
+        else:
+            out += struct.pack('>BI', 0xdd, len(obj))
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        if len(obj) < 16:
+            out.append(0x80 | len(obj))
+        else:
+            out += struct.pack('>BI', 0xdf, len(obj))
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError(f'Cannot store {type(obj).__name__} in the session')
+
+
+def _unpack(data, pos):
+    """Decode one MessagePack value at ``pos``; returns (value, new pos)."""
+    tag = data[pos]
+    pos += 1
+    if tag < 0x80:
+        return tag, pos
+    if tag >= 0xe0:
+        return tag - 0x100, pos
+    if 0xa0 <= tag <= 0xbf or tag in (0xd9, 0xda, 0xdb):
+        if tag <= 0xbf:
+            size = tag & 0x1f
+        else:
+            width = {0xd9: 1, 0xda: 2, 0xdb: 4}[tag]
+            size = int.from_bytes(data[pos:pos + width], 'big')
+            pos += width
+        return data[pos:pos + size].decode('utf-8'), pos + size
+    if 0x90 <= tag <= 0x9f or tag in (0xdc, 0xdd):
+        if tag <= 0x9f:
+            size = tag & 0x0f
+        else:
+            width = 2 if tag == 0xdc else 4
+            size = int.from_bytes(data[pos:pos + width], 'big')
+            pos += width
+        items = []
+        for _ in range(size):
+            item, pos = _unpack(data, pos)
+            items.append(item)
+        return items, pos
+    if 0x80 <= tag <= 0x8f or tag in (0xde, 0xdf):
+        if tag <= 0x8f:
+            size = tag & 0x0f
+        else:
+            width = 2 if tag == 0xde else 4
+            size = int.from_bytes(data[pos:pos + width], 'big')
+            pos += width
+        result = {}
+        for _ in range(size):
+            key, pos = _unpack(data, pos)
+            result[key], pos = _unpack(data, pos)
+        return result, pos
+    if tag == 0xc0:
+        return None, pos
+    if tag in (0xc2, 0xc3):
+        return tag == 0xc3, pos
+    if tag in (0xc4, 0xc5, 0xc6):
+        width = {0xc4: 1, 0xc5: 2, 0xc6: 4}[tag]
+        size = int.from_bytes(data[pos:pos + width], 'big')
+        pos += width
+        return bytes(data[pos:pos + size]), pos + size
+    if tag == 0xca:
+        return struct.unpack_from('>f', data, pos)[0], pos + 4
+    if tag == 0xcb:
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    ints = {0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q', 0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q'}
+    if tag in ints:
+        return struct.unpack_from(ints[tag], data, pos)[0], pos + struct.calcsize(ints[tag])
+    raise ValueError(f'Unsupported MessagePack type 0x{tag:02x}')
+
+
+def dumps(data):
+    """
+    Encode a session dict as MessagePack.
+
+    Args:
+        data (dict): Session data (None, bool, int, float, str, bytes,
+            lists, tuples and dicts)
+
+    Returns:
+        bytes: Encoded data
+    """
+    if msgpack is None:
+        out = bytearray()
+        _pack(data, out)
+        return bytes(out)
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def loads(payload):
+    """
+    Decode MessagePack session data.
+
+    Args:
+        payload (bytes): Encoded data
+
+    Returns:
+        dict: Session data (tuples come back as lists)
+    """
+    if msgpack is None:
+        return _unpack(payload, 0)[0]
+    return msgpack.unpackb(payload, raw=False)
+
+
+class ServerSideSession(SessionMixin):
+    """
+    Session whose data is read from the store on first access.
+
+    Args:
+        sid (str): Session id
+        loader: Callable returning the stored dict (None if missing or
+            expired), or None for a new session
+
+    A session id that turns out to be unknown is replaced by a fresh one,
+    so a client cannot pick the id its session will be stored under.
+    Call ``regenerate`` whenever the session gains privileges (login) so
+    an id seen before then stops working.
+    """
+
+    def __init__(self, sid, loader=None, store=None):
+        self.sid = sid
+        self.new = loader is None
+        self.modified = False
+        self.accessed = False
+        self._loader = loader
+        self._store = store
+        self._data = None if loader else {}
+
+    @property
+    def loaded(self):
+        """Whether the stored data has been read."""
+        return self._data is not None
+
+    def _items(self):
+        if self._data is None:
+            self._data = self._loader()
+            self._loader = None
+            if self._data is None:
+                self._data = {}
+                self.sid = secrets.token_urlsafe(32)
+                self.new = True
+        self.accessed = True
+        return self._data
+
+    def regenerate(self):
+        """
+        Move the session data to a new session id.
+
+        The old id is deleted from the store at once, and the response
+        sets a cookie with the new one.
+        """
+        self._items()
+        if not self.new and self._store is not None:
+            self._store.delete(self.sid)
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+    def __getitem__(self, key):
+        return self._items()[key]
+
+    def __setitem__(self, key, value):
+        self._items()[key] = value
+        self.modified = True
+
+    def __delitem__(self, key):
+        del self._items()[key]
+        self.modified = True
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __len__(self):
+        return len(self._items())
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.sid[:8]}… {self._data!r}>'
+
+
+class MemorySessionStore:
+    """
+    Sessions in a process-local LRU dict.
+
+    Only suitable for a single worker process.
+
+    Args:
+        max_entries (int): Sessions kept before the least recently used
+            is evicted
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[1] < time.time():
+                del self._data[sid]
+                return None
+            self._data.move_to_end(sid)
+            return entry[0]
+
+    def set(self, sid, payload, ttl):
+        with self._lock:
+            self._data[sid] = (payload, time.time() + ttl)
+            self._data.move_to_end(sid)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._data.pop(sid, None)
+
+
+class SqliteSessionStore:
+    """
+    Sessions in a SQLite file shared by all worker processes.
+
+    Each thread keeps its own connection. Expired rows are purged on
+    roughly one write in a hundred.
+
+    Args:
+        path (str): SQLite database file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'sid TEXT PRIMARY KEY, '
+            'data BLOB NOT NULL, '
+            'expires_at REAL NOT NULL)'
+        )
+        conn.commit()
+
+    def _connection(self):
+        # Reconnect in forked workers rather than share the parent's handle
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE sid = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, payload, ttl):
+        conn = self._connection()
+        now = time.time()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                (sid, payload, now + ttl)
+            )
+            if secrets.randbelow(100) == 0:
+                conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+
+    def delete(self, sid):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+
+
+class RedisSessionStore:
+    """
+    Sessions in a Redis-protocol server, expired by the server.
+
+    Args:
+        url (str): Redis connection URL
+        prefix (str): Key prefix
+    """
+
+    def __init__(self, url, prefix='session:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        return self.client.get(self.prefix + sid)
+
+    def set(self, sid, payload, ttl):
+        self.client.setex(self.prefix + sid, ttl, payload)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface backed by a session store.
+
+    The cookie holds only a random session id. Data is decoded when the
+    request first touches ``session`` and written back only if changed.
+
+    Args:
+        store: Session store with ``get``, ``set`` and ``delete``
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if not sid or len(sid) > 64:
+            return ServerSideSession(secrets.token_urlsafe(32), store=self.store)
+
+        def load():
+            payload = self.store.get(sid)
+            if payload is None:
+                return None
+            try:
+                return loads(payload)
+            except (ValueError, TypeError, IndexError, UnicodeDecodeError):
+                return None
+
+        return ServerSideSession(sid, load, self.store)
+
+    def save_session(self, app, session, response):
+        name = app.session_cookie_name
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session.modified:
+            return
+
+        if not session:
+            # Cleared (e.g. logout): forget it on both sides
+            if not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        self.store.set(session.sid, dumps(dict(session)), ttl)
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def regenerate_session():
+    """
+    Give the current session a new id after a login.
+
+    Prevents session fixation: an id planted in or read from the browser
+    before the login does not carry the logged-in session. Signed cookie
+    sessions have no id to rotate, and are left as they are.
+    """
+    regenerate = getattr(session, 'regenerate', None)
+    if regenerate is not None:
+        regenerate()
+
+
+def init_sessions(app):
+    """
+    Install the configured session backend.
+
+    Args:
+        app: Flask application instance
+
+    Leaves Flask's signed cookie sessions in place for the default
+    'cookie' backend.
+    """
+    app.config.setdefault('SESSION_BACKEND', os.getenv('SESSION_BACKEND', 'cookie'))
+    app.config.setdefault('SESSION_URL', os.getenv('SESSION_URL', 'redis://localhost:6379/0'))
+    app.config.setdefault('SESSION_SQLITE_PATH', os.getenv('SESSION_SQLITE_PATH', 'sessions.db'))
+    app.config.setdefault('SESSION_MEMORY_MAX', int(os.getenv('SESSION_MEMORY_MAX', 10000)))
+
+    backend = app.config['SESSION_BACKEND']
+    if backend == 'cookie':
+        return
+    if backend == 'memory':
+        store = MemorySessionStore(app.config['SESSION_MEMORY_MAX'])
+    elif backend == 'sqlite':
+        store = SqliteSessionStore(app.config['SESSION_SQLITE_PATH'])
+    elif backend == 'redis':
+        store = RedisSessionStore(app.config['SESSION_URL'])
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    app.session_interface = ServerSideSessionInterface(store)
@@ -0,0 +1,218 @@
+"""
+Signed, time-limited tokens (password reset links).
+
+One serializer and signer per salt are built once per app and reused,
+instead of a new ``URLSafeTimedSerializer`` per call. Provides:
+- Signing keys derived once per secret and salt, then cached
+- Key rotation: several secrets may be configured; the newest signs and
+  all of them verify, so links issued before a rotation keep working
+  until they expire
+- Verification results that tell expired tokens from forged or
+  malformed ones
+- Bulk verification for auditing issued links offline
+- A revocation list of redeemed tokens, checked in O(1) before any
+  database read; entries expire with the token lifetime
+
+Configuration (app.config / environment):
+- TOKEN_SECRET_KEYS: Comma-separated signing secrets, oldest first and
+  newest last (default: the app SECRET_KEY)
+- TOKEN_REVOCATION_BACKEND: 'memory' (default, per process) or 'redis'
+  (shared by all workers)
+- TOKEN_REVOCATION_URL: Redis URL for the redis backend
+"""
+
+import hashlib
+import os
+from collections import namedtuple
+
+from itsdangerous import BadSignature, SignatureExpired, TimestampSigner, URLSafeTimedSerializer
+
+from .login_guard import MemoryCounterStore, RedisCounterStore
+
+RESET_TOKEN_SALT = 'password-reset-salt'
+
+VALID = 'valid'
+EXPIRED = 'expired'
+INVALID = 'invalid'
+
+# status is VALID, EXPIRED or INVALID; value is the payload when it could
+# be read (valid or expired tokens), otherwise None
+TokenResult = namedtuple('TokenResult', ['status', 'value'])
+
+
+class CachedKeySigner(TimestampSigner):
+    """Timestamp signer that derives each secret's signing key only once."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._derived = {}
+
+    def derive_key(self, secret_key=None):
+        if secret_key is None:
+            secret_key = self.secret_keys[-1]
+        key = self._derived.get(secret_key)
+        if key is None:
+            key = self._derived[secret_key] = super().derive_key(secret_key)
+        return key
+
+
+class CachedSerializer(URLSafeTimedSerializer):
+    """URL-safe timed serializer that reuses one signer per salt."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._signers = {}
+
+    def make_signer(self, salt=None):
+        if salt is None:
+            salt = self.salt
+        signer = self._signers.get(salt)
+        if signer is None:
+            signer = self._signers[salt] = super().make_signer(salt)
+        return signer
+
+
+class TokenService:
+    """
+    Issues and verifies signed tokens for the app.
+
+    Create once at module level and bind with ``init_app``.
+    """
+
+    def __init__(self):
+        self.secret_keys = None
+        self.revoked = None
+        self._serializers = {}
+
+    def init_app(self, app):
+        """
+        Configure signing secrets from the application config.
+
+        Args:
+            app: Flask application instance (after SECRET_KEY is set)
+        """
+        keys = os.getenv('TOKEN_SECRET_KEYS')
+        app.config.setdefault(
+            'TOKEN_SECRET_KEYS',
+            [key.strip() for key in keys.split(',') if key.strip()] if keys else [app.config['SECRET_KEY']]
+        )
+        app.config.setdefault('TOKEN_REVOCATION_BACKEND', os.getenv('TOKEN_REVOCATION_BACKEND', 'memory'))
+        app.config.setdefault('TOKEN_REVOCATION_URL', os.getenv('TOKEN_REVOCATION_URL', 'redis://localhost:6379/0'))
+
+        backend = app.config['TOKEN_REVOCATION_BACKEND']
+        if backend == 'memory':
+            self.revoked = MemoryCounterStore()
+        elif backend == 'redis':
+            self.revoked = RedisCounterStore(app.config['TOKEN_REVOCATION_URL'], prefix='token:revoked:')
+        else:
+            raise ValueError(f"Unknown TOKEN_REVOCATION_BACKEND: {backend}")
+
+        self.secret_keys = list(app.config['TOKEN_SECRET_KEYS'])
+        self._serializers = {}
+        app.extensions['tokens'] = self
+
+    def serializer(self, salt):
+        """
+        Return the cached serializer for a salt.
+
+        Args:
+            salt (str): Token purpose, e.g. RESET_TOKEN_SALT
+
+        Returns:
+            CachedSerializer: Serializer signing with the newest secret
+        """
+        serializer = self._serializers.get(salt)
+        if serializer is None:
+            serializer = CachedSerializer(self.secret_keys, salt=salt, signer=CachedKeySigner)
+            self._serializers[salt] = serializer
+        return serializer
+
+    def generate(self, value, salt=RESET_TOKEN_SALT):
+        """
+        Sign a value into a URL-safe token.
+
+        Args:
+            value: JSON-serializable payload
+            salt (str): Token purpose
+
+        Returns:
+            str: Signed, timestamped token
+        """
+        return self.serializer(salt).dumps(value)
+
+    def verify(self, token, max_age, salt=RESET_TOKEN_SALT):
+        """
+        Verify a token.
+
+        Args:
+            token (str): Token to check
+            max_age (int): Max token age in seconds
+            salt (str): Token purpose
+
+        Returns:
+            TokenResult: VALID with the payload, EXPIRED with the payload
+            of a genuine but too old token, or INVALID
+        """
+        serializer = self.serializer(salt)
+        try:
+            return TokenResult(VALID, serializer.loads(token, max_age=max_age))
+        except SignatureExpired as e:
+            try:
+                value = serializer.load_payload(e.payload)
+            except BadSignature:
+                value = None
+            return TokenResult(EXPIRED, value)
+        except BadSignature:
+            return TokenResult(INVALID, None)
+
+    def verify_many(self, tokens, max_age, salt=RESET_TOKEN_SALT):
+        """
+        Verify many tokens, e.g. to audit issued reset links.
+
+        Args:
+            tokens (iterable): Tokens to check
+            max_age (int): Max token age in seconds
+            salt (str): Token purpose
+
+        Returns:
+            list: One TokenResult per token, in order
+        """
+        return [self.verify(token, max_age, salt) for token in tokens]
+
+    @staticmethod
+    def _revocation_key(token):
+        return hashlib.blake2b(token.encode('utf-8'), digest_size=12).hexdigest()
+
+    def revoke(self, token, ttl):
+        """
+        Mark a token as redeemed.
+
+        Args:
+            token (str): Token to reject from now on
+            ttl (int): Seconds to remember it; the token lifetime is enough
+        """
+        self.revoked.set(self._revocation_key(token), int(ttl))
+
+    def is_revoked(self, token):
+        """Check whether a token has been redeemed."""
+        return self.revoked.exists(self._revocation_key(token))
+
+
+def password_fingerprint(password_hash):
+    """
+    Short fingerprint of a stored password hash.
+
+    Embedded in reset tokens so that a token stops working once the
+    password it was issued against has changed.
+
+    Args:
+        password_hash (str): Stored hash (may be empty for OAuth users)
+
+    Returns:
+        str: 16 hex characters
+    """
+    return hashlib.sha256((password_hash or '').encode('utf-8')).hexdigest()[:16]
+
+
+# Shared instance, bound to the app in init_auth
+token_service = TokenService()
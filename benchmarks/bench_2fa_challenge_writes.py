@@ -0,0 +1,110 @@
+"""
+Benchmark database writes per login with each 2FA challenge backend.
+
+Logs one user in repeatedly (password POST, then 2FA code POST) and
+counts INSERT/UPDATE/DELETE statements and commits per login, comparing
+the stored SQL challenges with stateless signed challenge tokens
+(TWOFA_CHALLENGE_BACKEND=token). Each backend runs in a fresh process.
+
+Outbound mail is captured in memory so the codes can be read back.
+
+Usage:
+    python benchmarks/bench_2fa_challenge_writes.py [logins]
+"""
+
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EMAIL = 'writes@example.com'
+PASSWORD = 'correct horse battery staple'
+BACKENDS = ('sql', 'token')
+
+
+class CapturedMail:
+    """Stand-in for Flask-Mail that keeps sent messages in memory."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, msg):
+        self.outbox.append(msg)
+
+    def last_code(self):
+        return re.search(r'verification code is: (\d{6})', self.outbox[-1].body).group(1)
+
+
+def run_backend(backend, logins, results):
+    """Log in ``logins`` times and report writes, commits and time per login."""
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'writes.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    os.environ['TWOFA_CHALLENGE_BACKEND'] = backend
+
+    from sqlalchemy import event
+
+    from app import create_app
+    from auth import db
+    from auth.mail_queue import mail_queue
+    from auth.models import User
+    from auth.passwords import hash_password
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    captured = CapturedMail()
+    mail_queue.mail = captured
+    limiter.enabled = False
+    counts = {'writes': 0, 'commits': 0}
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _count_write(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().split(None, 1)[0].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+                counts['writes'] += 1
+
+        @event.listens_for(db.engine, 'commit')
+        def _count_commit(conn):
+            counts['commits'] += 1
+
+    client = app.test_client()
+    elapsed = 0.0
+    for _ in range(logins):
+        started = time.perf_counter()
+        client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+        response = client.post('/auth/2fa/verify', data={'code': captured.last_code()})
+        elapsed += time.perf_counter() - started
+        assert response.status_code == 302, 'verification failed'
+        client.get('/auth/logout')
+    # Logout does no writes, so the counts cover login and verification only
+    results.put((backend, counts['writes'] / logins, counts['commits'] / logins, elapsed / logins))
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for backend in BACKENDS:
+        proc = ctx.Process(target=run_backend, args=(backend, logins, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{'backend':<10}{'writes/login':>14}{'commits/login':>15}{'ms/login':>10}")
+    for backend, writes, commits, seconds in rows:
+        print(f"{backend:<10}{writes:>14.2f}{commits:>15.2f}{seconds * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
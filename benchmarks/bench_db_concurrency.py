@@ -0,0 +1,116 @@
+"""
+Benchmark database throughput under concurrent login traffic.
+
+Runs N threads that each perform login lookups (User.find_by_email) and,
+for a fraction of operations, a 2FA code write plus commit. Reports
+throughput and "database is locked" error rates for:
+- sqlite-default: plain SQLite (rollback journal, no busy timeout)
+- sqlite-tuned: WAL, synchronous=NORMAL, busy timeout and mmap
+- database-url: the database in DATABASE_URL, if set
+
+Usage:
+    python benchmarks/bench_db_concurrency.py [threads] [seconds] [write_ratio]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+
+from auth import db
+from auth.database import load_database_config, init_engine
+from auth.models import User
+
+NUM_USERS = 1000
+
+
+def build_app(uri, tuned):
+    """Create an app bound to ``uri`` with SQLite tuning on or off."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLITE_TUNED'] = tuned
+    load_database_config(app)
+    db.init_app(app)
+    init_engine(app, db)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(
+            User(email=f'user{i}@example.com', username=f'user{i}@example.com', password='')
+            for i in range(NUM_USERS)
+        )
+        db.session.commit()
+    return app
+
+
+def worker(app, deadline, write_ratio, results):
+    """Run lookups and writes until ``deadline``; record counts."""
+    ops = writes = lock_errors = 0
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            user = User.find_by_email(f'user{random.randrange(NUM_USERS)}@example.com')
+            if random.random() < write_ratio:
+                try:
+                    user.twofa_code_hash = f'bench${random.random()}'
+                    db.session.commit()
+                    writes += 1
+                except OperationalError as e:
+                    db.session.rollback()
+                    if 'locked' in str(e):
+                        lock_errors += 1
+                    else:
+                        raise
+            ops += 1
+        db.session.remove()
+    results.append((ops, writes, lock_errors))
+
+
+def run(name, app, threads, seconds, write_ratio):
+    """Run one mode and print its results."""
+    results = []
+    deadline = time.perf_counter() + seconds
+    pool = [
+        threading.Thread(target=worker, args=(app, deadline, write_ratio, results))
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    ops = sum(r[0] for r in results)
+    writes = sum(r[1] for r in results)
+    lock_errors = sum(r[2] for r in results)
+    attempted = writes + lock_errors
+    error_rate = lock_errors / attempted * 100 if attempted else 0.0
+    print(f'{name:>15}: {ops / seconds:10.1f} ops/s, {writes / seconds:8.1f} writes/s, '
+          f'{lock_errors} lock errors ({error_rate:.2f}% of writes)')
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    write_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+    tmpdir = tempfile.mkdtemp()
+
+    modes = [
+        ('sqlite-default', f"sqlite:///{os.path.join(tmpdir, 'default.db')}", False),
+        ('sqlite-tuned', f"sqlite:///{os.path.join(tmpdir, 'tuned.db')}", True),
+    ]
+    if os.getenv('DATABASE_URL'):
+        modes.append(('database-url', os.getenv('DATABASE_URL'), False))
+
+    print(f'{threads} threads, {seconds}s per mode, {write_ratio:.0%} writes')
+    for name, uri, tuned in modes:
+        run(name, build_app(uri, tuned), threads, seconds, write_ratio)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Count upstream discovery/JWKS fetches under concurrent ID token checks.
+
+Starts a local OpenID provider stand-in that serves a discovery
+document and a JWKS (with ``Cache-Control: max-age``) after a delay,
+then releases 1,000 threads at once, each verifying a signed ID token
+the way the Google callback does (``parse_id_token``). Compares
+Authlib's default client with the cached client from
+auth/oauth_clients.py, on a cold process and again once warm, and counts
+the requests the stand-in received.
+
+Usage:
+    python benchmarks/bench_jwks_cache.py [callbacks] [latency seconds]
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from authlib.integrations.flask_client import FlaskIntegration, FlaskOAuth2App
+from authlib.jose import JsonWebKey, jwt
+
+from auth.oauth_clients import PooledOAuth2App
+from auth.oidc_cache import metadata_cache
+
+CLIENT_ID = 'standin-client'
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 2048
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.fetches[self.path] = server.fetches.get(self.path, 0) + 1
+        time.sleep(server.latency)
+        if self.path == '/.well-known/openid-configuration':
+            payload = server.discovery
+        elif self.path == '/jwks':
+            payload = server.jwks
+        else:
+            self.send_error(404)
+            return
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Cache-Control', 'public, max-age=300')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_standin(latency):
+    server = StandInServer(('127.0.0.1', 0), _Handler)
+    base = f'http://127.0.0.1:{server.server_address[1]}'
+    key = JsonWebKey.generate_key('RSA', 2048, is_private=True, options={'kid': 'key-1'})
+    server.lock = threading.Lock()
+    server.fetches = {}
+    server.latency = latency
+    server.key = key
+    server.issuer = base
+    server.discovery = {
+        'issuer': base,
+        'jwks_uri': f'{base}/jwks',
+        'id_token_signing_alg_values_supported': ['RS256'],
+    }
+    server.jwks = {'keys': [key.as_dict(is_private=False)]}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def id_token(server, nonce):
+    now = int(time.time())
+    claims = {'iss': server.issuer, 'sub': '42', 'aud': CLIENT_ID, 'iat': now, 'exp': now + 300, 'nonce': nonce}
+    return jwt.encode({'alg': 'RS256', 'kid': 'key-1'}, claims, server.key).decode('ascii')
+
+
+def burst(client, server, callbacks):
+    """Verify ``callbacks`` ID tokens at once; return (seconds, failures)."""
+    tokens = [{'access_token': 'x', 'id_token': id_token(server, f'n{i}')} for i in range(callbacks)]
+    barrier = threading.Barrier(callbacks)
+    failures = []
+
+    def callback(i):
+        barrier.wait()
+        try:
+            client.parse_id_token(tokens[i], nonce=f'n{i}')
+        except Exception as e:
+            failures.append(e)
+
+    threads = [threading.Thread(target=callback, args=(i,)) for i in range(callbacks)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, len(failures)
+
+
+def main():
+    callbacks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    print(f"{callbacks} concurrent callbacks, {latency * 1000:.0f} ms upstream latency")
+    print(f"{'client':<10}{'phase':<7}{'discovery':>11}{'jwks':>7}{'failed':>8}{'seconds':>9}")
+
+    for name, client_cls in (('authlib', FlaskOAuth2App), ('cached', PooledOAuth2App)):
+        server = start_standin(latency)
+        metadata_cache.invalidate()
+        client = client_cls(
+            FlaskIntegration('standin'), 'standin',
+            client_id=CLIENT_ID,
+            server_metadata_url=f'{server.issuer}/.well-known/openid-configuration',
+        )
+        for phase in ('cold', 'warm'):
+            server.fetches.clear()
+            seconds, failed = burst(client, server, callbacks)
+            print(f"{name:<10}{phase:<7}{server.fetches.get('/.well-known/openid-configuration', 0):>11}"
+                  f"{server.fetches.get('/jwks', 0):>7}{failed:>8}{seconds:>9.2f}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
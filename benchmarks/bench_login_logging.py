@@ -0,0 +1,199 @@
+"""
+Benchmark the cost of logging (auth/logs.py) in the login path.
+
+Times repeated POST /auth/login for a 2FA user (password check, new
+challenge, verification mail queued) with:
+- print: the console banner the 2FA path printed before auth/logs.py
+  (five print() lines per login) and logging at WARNING
+- off: logging at WARNING, so the login path emits nothing
+- json, sync: a JSON record formatted and written on the request thread
+- json, queued: the default; the request thread only queues the record
+- text, queued: plain text on the listener thread
+and reports the mean time per login (fastest of five batches), its
+overhead over ``off``, the cost of the log statement alone (timed over
+5000 calls, as the whole-login difference is within run-to-run noise)
+in wall time and in CPU time of the calling thread, and the bytes
+written per login. Wall time includes the listener thread's formatting
+when it holds the GIL; CPU time is what the request thread itself
+spends. Then logs a burst of SMTP failures and reports
+how many records deduplication let through.
+
+Each mode runs in a fresh process whose stdout and stderr go to a file,
+line-buffered, as under a process manager collecting logs with
+PYTHONUNBUFFERED set. Passwords are hashed with
+PASSWORD_HASH_ITERATIONS=1000 so the hash does not hide the logging cost.
+
+Usage:
+    python benchmarks/bench_login_logging.py [logins] [smtp failures]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EMAIL = 'logging@example.com'
+PASSWORD = 'correct horse battery staple'
+ROUNDS = 5
+CALLS = 5000
+MODES = {
+    'print': {'LOG_LEVEL': 'WARNING'},
+    'off': {'LOG_LEVEL': 'WARNING'},
+    'json, sync': {'LOG_ASYNC': 'False'},
+    'json, queued': {},
+    'text, queued': {'LOG_FORMAT': 'text'},
+}
+
+
+def _redirect_output(path):
+    """Point this process's stdout and stderr at ``path``, line-buffered as on a console."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+    sys.stdout.reconfigure(line_buffering=True)
+
+
+def _print_banner(user):
+    """The console banner the 2FA path printed for every code."""
+    # The code itself is only in the queued message; any six digits do
+    print("============================================")
+    print(f"VERIFICATION CODE: {123456}")
+    print(f"For user: {user.email}")
+    print(f"Valid until: {datetime.now()}")
+    print("============================================")
+
+
+def _log_issued(user):
+    """The record the 2FA path logs for every code (see send_verification_email)."""
+    from auth.routes.twofa import logger
+    logger.info(
+        "Verification code issued for user %s", user.id,
+        extra={'event': 'twofa_code_issued', 'expires': datetime.now().isoformat()}
+    )
+
+
+def _legacy_banner(send_verification_email):
+    """Wrap send_verification_email with the console banner it used to print."""
+    def send(user):
+        send_verification_email(user)
+        _print_banner(user)
+    return send
+
+
+def run_mode(mode, logins, results):
+    """Time logins with one logging configuration."""
+    workdir = tempfile.mkdtemp()
+    output = os.path.join(workdir, 'output.log')
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'logging_bench.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    os.environ['PASSWORD_HASH_ITERATIONS'] = '1000'
+    os.environ.update(MODES[mode])
+    _redirect_output(output)
+
+    from captured_mail import CapturedMail
+    from app import create_app
+    from auth import db
+    from auth.mail_queue import mail_queue
+    from auth.models import User
+    from auth.passwords import hash_password
+    from auth.rate_limit import limiter
+    import auth.routes.twofa as twofa
+    app = create_app()
+
+    mail_queue.mail = CapturedMail()
+    limiter.enabled = False
+    if mode == 'print':
+        twofa.send_verification_email = _legacy_banner(twofa.send_verification_email)
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    client = app.test_client()
+    form = {'email': EMAIL, 'password': PASSWORD}
+    for _ in range(20):
+        client.post('/auth/login', data=form)
+    sys.stdout.flush()
+    written = os.path.getsize(output)
+
+    batches = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for _ in range(logins):
+            response = client.post('/auth/login', data=form)
+        batches.append(time.perf_counter() - started)
+    assert response.status_code == 302, f'login returned {response.status_code}'
+
+    # The log statement alone, as the request thread pays for it
+    emit = _print_banner if mode == 'print' else _log_issued
+    with app.app_context():
+        user = User.query.filter_by(email=EMAIL).one()
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        for _ in range(CALLS):
+            emit(user)
+        call = ((time.perf_counter() - started) / CALLS, (time.thread_time() - cpu_started) / CALLS)
+
+    handler = app.extensions['logging']
+    handler.close()
+    sys.stdout.flush()
+    results.put((mode, min(batches) / logins, call, (os.path.getsize(output) - written) / (logins * ROUNDS + CALLS)))
+
+
+def run_smtp_failures(failures, results):
+    """Log a burst of delivery failures; count the records written."""
+    workdir = tempfile.mkdtemp()
+    output = os.path.join(workdir, 'output.log')
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'logging_bench.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    _redirect_output(output)
+
+    from flask_mail import Message
+    from app import create_app
+    from auth.mail_queue import _report_failure
+    app = create_app()
+
+    msg = Message(subject='Code', sender='noreply@example.com', recipients=[EMAIL], body='')
+    for _ in range(failures):
+        _report_failure(msg, ConnectionRefusedError(111, 'Connection refused'))
+    app.extensions['logging'].close()
+    with open(output) as f:
+        records = sum(1 for line in f if '"mail_send_failed"' in line)
+    results.put((failures, records))
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    failures = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for mode in MODES:
+        proc = ctx.Process(target=run_mode, args=(mode, logins, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    baseline = {mode: seconds for mode, seconds, _, _ in rows}['off']
+    print(f"{'logging':<16}{'us/login':>12}{'overhead us':>14}{'call us':>10}{'call cpu us':>14}{'bytes/login':>14}")
+    for mode, seconds, (call, call_cpu), written in rows:
+        print(f'{mode:<16}{seconds * 1e6:>12.0f}{(seconds - baseline) * 1e6:>14.1f}'
+              f'{call * 1e6:>10.2f}{call_cpu * 1e6:>14.2f}{written:>14.0f}')
+
+    proc = ctx.Process(target=run_smtp_failures, args=(failures, results))
+    proc.start()
+    sent, records = results.get()
+    proc.join()
+    print(f'\n{sent} SMTP failures -> {records} log records (LOG_DEDUP_SECONDS window)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark CPU cost of rejected login attempts.
+
+Measures CPU seconds per rejected POST /auth/login with the login guard
+off ("before") and on ("after"), for two attack patterns:
+- wrong-password: repeated wrong passwords for one existing account
+  (after: the account locks and further attempts skip the hash)
+- unknown-email: random non-existent emails
+  (after: the email filter skips the database lookup)
+
+Each mode runs in a fresh process. Hashing runs inline (HASH_POOL_SIZE=0)
+so its CPU time is counted; response padding sleeps and costs no CPU.
+
+Usage:
+    python benchmarks/bench_login_rejection.py [attempts]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EMAIL = 'victim@example.com'
+
+
+def run_mode(guard_enabled, attempts, results):
+    """Run both attack patterns in this process and report CPU per attempt."""
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reject.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    os.environ['LOGIN_GUARD_ENABLED'] = str(guard_enabled)
+    os.environ['LOGIN_EMAIL_FILTER'] = str(guard_enabled)
+
+    from app import create_app
+    from auth import db
+    from auth.login_guard import login_guard
+    from auth.models import User
+    from auth.passwords import hash_password
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password('right')))
+        db.session.commit()
+        if guard_enabled:
+            login_guard.may_exist('warmup')
+            while login_guard._filter is None:
+                time.sleep(0.05)
+
+    client = app.test_client()
+    patterns = {
+        'wrong-password': lambda i: {'email': EMAIL, 'password': f'wrong{i}'},
+        'unknown-email': lambda i: {'email': f'nobody{i}@example.com', 'password': 'x'},
+    }
+    for name, form in patterns.items():
+        started = time.process_time()
+        for i in range(attempts):
+            client.post('/auth/login', data=form(i), environ_base={'REMOTE_ADDR': f'198.51.100.{i % 250}'})
+        results.put((guard_enabled, name, (time.process_time() - started) / attempts))
+
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for guard_enabled in (False, True):
+        proc = ctx.Process(target=run_mode, args=(guard_enabled, attempts, results))
+        proc.start()
+        rows.extend(results.get() for _ in range(2))
+        proc.join()
+
+    print(f"{'pattern':<16}{'guard':>8}{'CPU ms/attempt':>18}")
+    for guard_enabled, name, cpu in sorted(rows, key=lambda r: (r[1], r[0])):
+        print(f"{name:<16}{'on' if guard_enabled else 'off':>8}{cpu * 1000:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark the cost of the metrics layer (auth/metrics.py) per request.
+
+Logs a user in, then times repeated GET /auth/login (template render)
+and GET /auth/profile (user loader, template) requests with metrics:
+- off (METRICS_ENABLED=False, the default)
+- sampled (METRICS_SAMPLE_RATE=0.1)
+- on (every request timed)
+- on, writing multi-process snapshots every request
+and reports the mean time per request and, where enabled, the time to
+render /metrics.
+
+Each mode runs in a fresh process.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [requests]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EMAIL = 'metrics@example.com'
+PASSWORD = 'correct horse battery staple'
+MODES = {
+    'off': {'METRICS_ENABLED': 'False'},
+    'sampled 10%': {'METRICS_ENABLED': 'True', 'METRICS_SAMPLE_RATE': '0.1'},
+    'on': {'METRICS_ENABLED': 'True'},
+    'on, multiproc': {'METRICS_ENABLED': 'True', 'METRICS_FLUSH_INTERVAL': '0'},
+}
+PATHS = ('/auth/login', '/auth/profile')
+
+
+def run_mode(mode, requests, results):
+    """Time requests with one metrics configuration."""
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'metrics_bench.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    os.environ.update(MODES[mode])
+    if mode == 'on, multiproc':
+        os.environ['METRICS_MULTIPROC_DIR'] = os.path.join(workdir, 'metrics')
+
+    from captured_mail import CapturedMail
+    from app import create_app
+    from auth import db
+    from auth.mail_queue import mail_queue
+    from auth.models import User
+    from auth.passwords import hash_password
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    captured = CapturedMail()
+    mail_queue.mail = captured
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+    client.post('/auth/2fa/verify', data={'code': captured.last_code()})
+
+    timings = []
+    for path in PATHS:
+        client.get(path)
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(path)
+        timings.append((time.perf_counter() - started) / requests)
+        assert response.status_code == 200, f'{path} returned {response.status_code}'
+
+    scrape = None
+    if app.config['METRICS_ENABLED']:
+        started = time.perf_counter()
+        response = client.get(app.config['METRICS_PATH'])
+        scrape = (time.perf_counter() - started, len(response.data))
+    results.put((mode, timings, scrape))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for mode in MODES:
+        proc = ctx.Process(target=run_mode, args=(mode, requests, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{'metrics':<16}" + ''.join(f'{path + " us":>20}' for path in PATHS) + f"{'scrape':>18}")
+    for mode, timings, scrape in rows:
+        scrape_text = f'{scrape[0] * 1e3:.1f}ms/{scrape[1]}B' if scrape else '-'
+        print(f'{mode:<16}' + ''.join(f'{seconds * 1e6:>20.0f}' for seconds in timings) + f'{scrape_text:>18}')
+
+
+if __name__ == '__main__':
+    main()
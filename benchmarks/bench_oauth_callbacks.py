@@ -0,0 +1,98 @@
+"""
+Benchmark OAuth callback latency under concurrent logins.
+
+Runs GitHub-style logins against a local mock provider (see
+mock_oauth_provider.py) from many threads. Each login starts the flow,
+follows the provider redirect and times only the callback
+(/auth/authorize/github), which exchanges the code for a token and
+fetches the profile. Reports p50/p99 callback latency and how many TCP
+connections the provider saw, with the shared connection pools on and
+off. Each mode runs in a fresh process.
+
+Usage:
+    python benchmarks/bench_oauth_callbacks.py [logins] [concurrency] [latency seconds]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_mode(pooled, logins, concurrency, latency, results):
+    """Run concurrent logins with the shared pools on or off."""
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'oauth.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['OAUTH_HTTP_POOL'] = str(pooled)
+    os.environ['OAUTH_HTTP_MAX_CONCURRENCY'] = str(concurrency)
+    # Providers without a client id are skipped when the app starts
+    os.environ['GITHUB_CLIENT_ID'] = 'mock-client'
+
+    from mock_oauth_provider import MockOAuthProvider
+
+    from app import create_app
+    from auth import db
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    provider = MockOAuthProvider(latency=latency).start()
+    # The client is built on first use, so these overrides take effect
+    app.config.update(provider.config('github'))
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+
+    def login(_):
+        client = app.test_client()
+        location = client.get('/auth/login/github').headers['Location']
+        state = parse_qs(urlparse(location).query)['state'][0]
+        code = f'{time.time_ns()}-{state[:8]}'
+        started = time.perf_counter()
+        response = client.get(f'/auth/authorize/github?code={code}&state={state}')
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 302, response.status_code
+        return elapsed
+
+    login(0)
+    provider.connections = provider.requests = 0
+    with ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(login, range(logins)))
+    results.put((pooled, percentile(latencies, 0.5), percentile(latencies, 0.99),
+                 provider.requests, provider.connections))
+    provider.stop()
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for pooled in (False, True):
+        proc = ctx.Process(target=run_mode, args=(pooled, logins, concurrency, latency, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{logins} logins, {concurrency} concurrent, {latency * 1000:.0f} ms provider latency")
+    print(f"{'pools':<8}{'p50 ms':>10}{'p99 ms':>10}{'upstream req':>14}{'connections':>13}")
+    for pooled, p50, p99, requests, connections in rows:
+        print(f"{'on' if pooled else 'off':<8}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{requests:>14}{connections:>13}")
+
+
+if __name__ == '__main__':
+    main()
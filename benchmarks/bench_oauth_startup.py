@@ -0,0 +1,83 @@
+"""
+Benchmark OAuth setup cost per process.
+
+Compares building every provider's Authlib client at startup (what
+``init_oauth`` used to do, whether or not the provider was configured)
+with the lazy provider registry, where startup only reads definitions
+and a client is built on its provider's first login. Each iteration
+uses a fresh Flask app and Authlib registry, as a new worker would.
+
+Usage:
+    python benchmarks/bench_oauth_startup.py [iterations]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from auth.oauth_clients import PooledOAuth
+from auth.oauth_providers import DEFAULT_PROVIDERS, ProviderRegistry
+
+CLIENT_PARAMS = ('authorize_url', 'access_token_url', 'api_base_url', 'server_metadata_url')
+
+
+def make_app(configured):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'benchmark-secret'
+    for name in DEFAULT_PROVIDERS:
+        prefix = name.upper()
+        app.config[f'{prefix}_CLIENT_ID'] = f'{name}-client' if name in configured else None
+        app.config[f'{prefix}_CLIENT_SECRET'] = f'{name}-secret' if name in configured else None
+    return app
+
+
+def startup(configured, eager):
+    """Seconds to set up OAuth in a fresh app."""
+    app = make_app(configured)
+    started = time.perf_counter()
+    oauth = PooledOAuth()
+    oauth.init_app(app)
+    if eager:
+        # Previous init_oauth: register every provider, configured or not
+        for name, spec in DEFAULT_PROVIDERS.items():
+            oauth.register(
+                name=name,
+                overwrite=True,
+                client_id=app.config[f'{name.upper()}_CLIENT_ID'],
+                client_secret=app.config[f'{name.upper()}_CLIENT_SECRET'],
+                client_kwargs={'scope': spec['scope']},
+                **{key: spec[key] for key in CLIENT_PARAMS if spec.get(key)}
+            )
+        return time.perf_counter() - started, 0.0
+    registry = ProviderRegistry()
+    registry.init_app(app, oauth)
+    elapsed = time.perf_counter() - started
+    first_use = time.perf_counter()
+    for name in configured:
+        registry.client(name)
+    return elapsed, time.perf_counter() - first_use
+
+
+def run(label, configured, eager, iterations):
+    totals = [0.0, 0.0]
+    for _ in range(iterations):
+        for i, value in enumerate(startup(configured, eager)):
+            totals[i] += value
+    print(f'{label:<34} startup {totals[0] / iterations * 1e6:8.1f}us'
+          f'   first logins {totals[1] / iterations * 1e6:8.1f}us')
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    print(f'{iterations} iterations, mean per process')
+    run('eager, all 4 clients at startup', ['google'], True, iterations)
+    run('lazy, only google configured', ['google'], False, iterations)
+    run('lazy, all 4 configured', list(DEFAULT_PROVIDERS), False, iterations)
+
+
+if __name__ == '__main__':
+    main()
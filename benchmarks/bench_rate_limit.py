@@ -0,0 +1,141 @@
+"""
+Load test global rate limit enforcement across worker processes.
+
+Starts several processes, each with its own copy of the app (as a
+pre-forking server would), and has them all hit one route limited to
+"100 per minute" for the same client IP at the same time: first at a
+steady pace for a few seconds, crossing several fast-path reserve
+intervals while the key is under its limit, then as fast as they can.
+With a shared limiter storage the total number of accepted requests
+must not exceed the limit, however the requests are spread; the script
+exits non-zero if it does, or if the fast path run answered no request
+locally.
+
+Runs twice, against the shared storage directly and through the
+in-process fast path (RATELIMIT_FASTPATH). Without
+RATELIMIT_STORAGE_URI the storage is a local server process from
+shared_limit_storage.py; point it at Redis to test that instead:
+    RATELIMIT_STORAGE_URI=redis://localhost:6379/1 \\
+        python benchmarks/bench_rate_limit.py [processes] [paced seconds] [burst requests]
+
+Set RATELIMIT_FASTPATH to run only one of the two.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LIMIT = 100
+PACE = 0.03  # seconds between paced requests, per process
+
+
+def configure_env(db_path):
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    # Leave headroom in the default limits so only the route's limit applies
+    os.environ['RATELIMIT_DEFAULT'] = '100000 per hour'
+
+
+def limited_app():
+    """App with an extra route limited to LIMIT per minute."""
+    import shared_limit_storage  # noqa: F401 (registers manager:// storage)
+    from app import create_app
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    @limiter.limit(f'{LIMIT} per minute')
+    def limited():
+        return 'ok'
+
+    app.add_url_rule('/bench/limited', 'limited', limited)
+    return app
+
+
+def worker(db_path, fastpath, paced, burst, barrier, results):
+    """Send paced then back-to-back requests from one process and record status codes."""
+    configure_env(db_path)
+    os.environ['RATELIMIT_FASTPATH'] = str(fastpath)
+    app = limited_app()
+    from auth.rate_limit import limiter
+
+    client = app.test_client()
+    codes = []
+    barrier.wait()
+    started = time.perf_counter()
+    while time.perf_counter() - started < paced:
+        codes.append(client.get('/bench/limited').status_code)
+        time.sleep(PACE)
+    for _ in range(burst):
+        codes.append(client.get('/bench/limited').status_code)
+    elapsed = time.perf_counter() - started
+    results.put((codes.count(200), codes.count(429), getattr(limiter.storage, 'local_hits', 0), elapsed))
+
+
+def run(db_path, fastpath, processes, paced, burst):
+    """Run one round of concurrent requests; returns (accepted, local hits)."""
+    from auth.rate_limit import limiter
+    limiter.reset()
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(processes)
+    results = ctx.Queue()
+    pool = [ctx.Process(target=worker, args=(db_path, fastpath, paced, burst, barrier, results))
+            for _ in range(processes)]
+    for proc in pool:
+        proc.start()
+    outcomes = [results.get(timeout=paced + 60) for _ in pool]
+    for proc in pool:
+        proc.join()
+
+    accepted = sum(o[0] for o in outcomes)
+    limited = sum(o[1] for o in outcomes)
+    local = sum(o[2] for o in outcomes)
+    print(f'{"fast path" if fastpath else "shared":<10} {processes} processes: {accepted} accepted '
+          f'({local} locally), {limited} limited in {max(o[3] for o in outcomes):.1f}s -> '
+          f'{"OK" if accepted <= LIMIT else "EXCEEDED"}')
+    return accepted, local
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    paced = float(sys.argv[2]) if len(sys.argv) > 2 else 2.5
+    burst = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    db_path = os.path.join(tempfile.mkdtemp(), 'ratelimit.db')
+
+    configure_env(db_path)
+    server = None
+    if os.getenv('RATELIMIT_STORAGE_URI', 'memory://').startswith('memory'):
+        from shared_limit_storage import SharedLimitServer
+        server = SharedLimitServer().start()
+        os.environ['RATELIMIT_STORAGE_URI'] = server.uri
+    print(f'Storage: {os.environ["RATELIMIT_STORAGE_URI"]}, limit {LIMIT} per minute')
+    if 'RATELIMIT_FASTPATH' in os.environ:
+        modes = [os.environ['RATELIMIT_FASTPATH'].lower() in ('true', 'yes', '1')]
+    else:
+        modes = [False, True]
+    limited_app()
+
+    failures = []
+    for fastpath in modes:
+        accepted, local = run(db_path, fastpath, processes, paced, burst)
+        if accepted > LIMIT:
+            failures.append(f'{"fast path" if fastpath else "shared"}: {accepted} accepted for a limit of {LIMIT}')
+        if fastpath and not local:
+            failures.append('fast path answered no request locally')
+    if server is not None:
+        server.stop()
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{len(failures)} failures')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
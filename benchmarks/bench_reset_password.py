@@ -0,0 +1,89 @@
+"""
+Benchmark the password reset GET/POST path.
+
+Times /auth/reset-password/<token> with the Flask test client for:
+- GET with a valid token (render the form)
+- GET and POST with an already redeemed token (rejected from the
+  revocation list)
+- POST with a valid token (includes hashing the new password)
+
+and reports the mean time and SQL statements per request.
+
+Usage:
+    python benchmarks/bench_reset_password.py [requests]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reset_bench.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['SQL_STATS_HEADERS'] = 'True'
+
+from app import create_app
+from auth import db
+from auth.models import User
+from auth.passwords import hash_password
+from auth.rate_limit import limiter
+from auth.routes.auth import generate_token
+
+app = create_app()
+
+EMAIL = 'reset-bench@example.com'
+
+
+def issue():
+    with app.app_context():
+        return generate_token(User.find_by_email(EMAIL))
+
+
+def measure(client, requests, method, token_for, form=None):
+    """Return (mean seconds, mean SQL statements) over ``requests`` calls."""
+    elapsed = statements = 0
+    for i in range(requests):
+        url = f'/auth/reset-password/{token_for(i)}'
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=form(i) if form else None)
+        elapsed += time.perf_counter() - started
+        statements += int(response.headers.get('X-SQL-Statements', 0))
+    return elapsed / requests, statements / requests
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password('initial password')))
+        db.session.commit()
+    client = app.test_client()
+
+    token = issue()
+    rows = [('GET valid', *measure(client, requests, 'GET', lambda i: token))]
+
+    # Redeem the token, then hammer it
+    client.post(f'/auth/reset-password/{token}', data={'password': 'p0', 'confirm_password': 'p0'})
+    rows.append(('GET redeemed', *measure(client, requests, 'GET', lambda i: token)))
+    rows.append(('POST redeemed', *measure(
+        client, requests, 'POST', lambda i: token, lambda i: {'password': 'x', 'confirm_password': 'x'}
+    )))
+
+    # Each successful POST changes the password, so every request needs a new token
+    posts = max(1, requests // 20)
+    rows.append(('POST valid', *measure(
+        client, posts, 'POST', lambda i: issue(), lambda i: {'password': f'p{i + 1}', 'confirm_password': f'p{i + 1}'}
+    )))
+
+    print(f"{'request':<16}{'ms/request':>12}{'SQL/request':>13}")
+    for name, seconds, statements in rows:
+        print(f"{name:<16}{seconds * 1000:>12.2f}{statements:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
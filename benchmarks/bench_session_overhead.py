@@ -0,0 +1,116 @@
+"""
+Benchmark session overhead on /auth/profile for each session backend.
+
+Logs a user in (password, then 2FA code), requests a password reset so
+the flashed reset link sits in the session, then times repeated
+GET /auth/profile requests. Reports per backend:
+- Session cookie bytes the browser sends on every request
+- Set-Cookie bytes per profile response
+- Mean time per profile request
+
+Each backend runs in a fresh process.
+
+Usage:
+    python benchmarks/bench_session_overhead.py [requests]
+"""
+
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+EMAIL = 'session@example.com'
+PASSWORD = 'correct horse battery staple'
+BACKENDS = ('cookie', 'memory', 'sqlite')
+
+
+class CapturedMail:
+    """Stand-in for Flask-Mail that keeps sent messages in memory."""
+
+    def __init__(self):
+        self.outbox = []
+
+    def send(self, msg):
+        self.outbox.append(msg)
+
+    def last_code(self):
+        return re.search(r'verification code is: (\d{6})', self.outbox[-1].body).group(1)
+
+
+def session_cookie(client, name):
+    """Return the value of the session cookie in the test client's jar."""
+    for cookie in client.cookie_jar:
+        if cookie.name == name:
+            return cookie.value
+    return ''
+
+
+def run_backend(backend, requests, results):
+    """Time profile requests with one session backend."""
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'sessions_bench.db')}"
+    os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+    os.environ['HASH_POOL_SIZE'] = '0'
+    os.environ['SESSION_BACKEND'] = backend
+    os.environ['SESSION_SQLITE_PATH'] = os.path.join(workdir, 'sessions.db')
+
+    from app import create_app
+    from auth import db
+    from auth.mail_queue import mail_queue
+    from auth.models import User
+    from auth.passwords import hash_password
+    from auth.rate_limit import limiter
+    app = create_app()
+
+    captured = CapturedMail()
+    mail_queue.mail = captured
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+    client.post('/auth/2fa/verify', data={'code': captured.last_code()})
+    # Leaves the reset link flashed in the session until the next render
+    client.post('/auth/forgot-password', data={'email': EMAIL})
+    cookie_bytes = len(session_cookie(client, app.session_cookie_name))
+
+    client.get('/auth/profile')
+    set_cookie_bytes = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get('/auth/profile')
+        set_cookie_bytes += sum(len(value) for value in response.headers.getlist('Set-Cookie'))
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200, 'not logged in'
+
+    results.put((backend, cookie_bytes, len(session_cookie(client, app.session_cookie_name)),
+                 set_cookie_bytes / requests, elapsed / requests))
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    rows = []
+    for backend in BACKENDS:
+        proc = ctx.Process(target=run_backend, args=(backend, requests, results))
+        proc.start()
+        rows.append(results.get())
+        proc.join()
+
+    print(f"{'backend':<10}{'cookie (flash)':>16}{'cookie (idle)':>15}{'Set-Cookie/req':>16}{'us/request':>12}")
+    for backend, flash_bytes, idle_bytes, set_cookie, seconds in rows:
+        print(f"{backend:<10}{flash_bytes:>16}{idle_bytes:>15}{set_cookie:>16.0f}{seconds * 1e6:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+In-memory stand-in for Flask-Mail used by the benchmarks and checks.
+
+Install with ``mail_queue.mail = CapturedMail()`` (and
+MAIL_QUEUE_ENABLED=False) so messages are kept instead of sent, and
+verification codes can be read back per recipient.
+"""
+
+import re
+import threading
+
+_CODE = re.compile(r'verification code is: (\d{6})')
+
+
+class CapturedMail:
+    """Keeps sent messages in memory; safe to use from many threads."""
+
+    def __init__(self):
+        self.outbox = []
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def send(self, msg):
+        with self._lock:
+            self.outbox.append(msg)
+            for recipient in msg.recipients:
+                self._last[recipient.lower()] = msg
+
+    def last_code(self):
+        """Verification code in the most recent message."""
+        with self._lock:
+            return _CODE.search(self.outbox[-1].body).group(1)
+
+    def code_for(self, email):
+        """Verification code in the most recent message to ``email``."""
+        with self._lock:
+            return _CODE.search(self._last[email.lower()].body).group(1)
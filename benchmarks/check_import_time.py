@@ -0,0 +1,102 @@
+"""
+Check application startup cost against an import-time budget.
+
+Runs ``python -X importtime`` in fresh processes for:
+- ``import app``, which should only define the factory
+- ``create_app()``, which builds a full app as a worker would
+and exits non-zero if:
+- importing ``app`` imports the auth package or SQLAlchemy
+- building the app imports a deferred dependency (Alembic via
+  Flask-Migrate, or Authlib)
+- the fastest of the runs of ``create_app()`` exceeds the budget
+
+Prints the modules with the largest cumulative import time.
+
+Usage:
+    python benchmarks/check_import_time.py [budget ms] [runs]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 1000
+DEFERRED = ('flask_migrate', 'alembic', 'authlib')
+NOT_ON_IMPORT = ('auth', 'sqlalchemy', 'flask_sqlalchemy')
+
+SNIPPETS = {
+    'import app': 'import app',
+    'create_app()': 'from app import create_app; create_app()',
+}
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+{snippet}
+elapsed = time.perf_counter() - started
+print(elapsed)
+print(','.join(sorted(name for name in sys.modules if '.' not in name)))
+"""
+
+
+def measure(snippet):
+    """Run a snippet in a fresh interpreter; returns (seconds, top-level modules, importtime rows)."""
+    env = dict(
+        os.environ,
+        FLASK_SECRET_KEY='import-time-check',
+        DATABASE_URL=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import_time.db')}",
+        MAIL_QUEUE_ENABLED='False',
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE.format(snippet=snippet)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    seconds, modules = result.stdout.strip().splitlines()[-2:]
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return float(seconds), set(modules.split(',')), rows
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_BUDGET_MS
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    failures = []
+    results = {}
+    for label, snippet in SNIPPETS.items():
+        samples = [measure(snippet) for _ in range(runs)]
+        results[label] = min(samples, key=lambda sample: sample[0])
+        print(f'{label:<14} {results[label][0] * 1000:7.1f} ms (fastest of {runs})')
+
+    _, modules, _ = results['import app']
+    for name in NOT_ON_IMPORT:
+        if name in modules:
+            failures.append(f'import app loads {name}; it should only define create_app')
+
+    seconds, modules, rows = results['create_app()']
+    for name in DEFERRED:
+        if name in modules:
+            failures.append(f'create_app() imports {name}, which should load on first use')
+    if seconds * 1000 > budget_ms:
+        failures.append(f'create_app() took {seconds * 1000:.1f} ms, budget {budget_ms:.0f} ms')
+
+    print('\nLargest cumulative imports in create_app():')
+    top_level = sorted((row for row in rows if not row[1].startswith('  ')), reverse=True)
+    for cumulative, name in top_level[:10]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name.strip()}')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
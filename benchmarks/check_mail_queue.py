@@ -0,0 +1,181 @@
+"""
+Check the background mail queue (auth/mail_queue.py) against a local
+SMTP server.
+
+Runs the queue with its durable spool against mock_smtp_server.py and
+exits non-zero if:
+- a login's verification email is not delivered, or its spool row is
+  left behind after delivery
+- a message that fails to send (SMTP server down) is removed from the
+  spool, or is not delivered once the server is back
+- a message staged with ``enqueue_on_commit`` is sent although the
+  transaction rolled back
+- worker processes sharing the spool claim the same row twice, claim a
+  row whose owner is alive, or leave a dead owner's rows unclaimed
+
+Usage:
+    python benchmarks/check_mail_queue.py
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp()
+SPOOL = os.path.join(WORKDIR, 'mail_spool.db')
+EMAIL = 'queued@example.com'
+PASSWORD = 'correct horse battery staple'
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'mail_queue.db')}"
+os.environ['HASH_POOL_SIZE'] = '0'
+
+from flask_mail import Message
+
+from mock_smtp_server import MockSMTPServer
+from app import create_app
+from auth import db
+from auth.mail_queue import MailSpool, mail_queue
+from auth.models import User
+from auth.passwords import hash_password
+from auth.rate_limit import limiter
+
+smtp = MockSMTPServer().start()
+app = create_app(dict(
+    smtp.config(),
+    MAIL_QUEUE_ENABLED=True,
+    MAIL_QUEUE_WORKERS=1,
+    MAIL_SPOOL_PATH=SPOOL,
+    MAIL_RETRY_BACKOFF=0.2,
+    LOG_LEVEL='CRITICAL',
+))
+
+
+def spooled():
+    """Rows left in the spool."""
+    with sqlite3.connect(SPOOL) as conn:
+        return conn.execute('SELECT COUNT(*) FROM mail_spool').fetchone()[0]
+
+
+def wait_for(condition, timeout=10.0):
+    """Poll ``condition`` until it holds; returns its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def body(message):
+    """Plain-text part of a received message."""
+    for part in message.walk():
+        if part.get_content_type() == 'text/plain':
+            return part.get_payload(decode=True).decode()
+    return ''
+
+
+def login(client):
+    response = client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+    return response.status_code == 302
+
+
+def claim_rows(path, results):
+    """Claim spooled rows as a separate worker process would."""
+    results.put([spool_id for spool_id, _ in MailSpool(path).claim(100)])
+
+
+def check_claims(failures, workers=4, rows=40):
+    """Let forked workers claim a shared spool at once."""
+    path = os.path.join(WORKDIR, 'shared_spool.db')
+    spool = MailSpool(path)
+    msg = Message(subject='Spooled', sender='noreply@example.com', recipients=[EMAIL], body='spooled')
+    orphaned = [spool.add(msg) for _ in range(rows)]
+    live = spool.add(msg)
+    with sqlite3.connect(path) as conn:
+        # Left behind by a process that died without renewing its lease
+        conn.execute('UPDATE mail_spool SET lease_until = 0 WHERE id != ?', (live,))
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    procs = [ctx.Process(target=claim_rows, args=(path, results)) for _ in range(workers)]
+    for proc in procs:
+        proc.start()
+    claimed = [results.get(timeout=30) for _ in procs]
+    for proc in procs:
+        proc.join()
+
+    ids = [spool_id for batch in claimed for spool_id in batch]
+    if len(ids) != len(set(ids)):
+        failures.append(f'{len(ids) - len(set(ids))} spool rows claimed by more than one worker')
+    if live in ids:
+        failures.append('a row owned by a live process was claimed by another')
+    if set(ids) != set(orphaned):
+        failures.append(f'{len(set(orphaned) - set(ids))} orphaned spool rows left unclaimed')
+    print(f'claims: {rows} orphaned rows -> {[len(batch) for batch in claimed]} per worker')
+
+
+def main():
+    global smtp
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    failures = []
+    client = app.test_client()
+
+    # Delivery
+    if not login(client):
+        failures.append('login failed')
+    if not wait_for(lambda: len(smtp.messages) == 1):
+        failures.append('verification email not delivered')
+    elif 'verification code is' not in body(smtp.messages[0][2]):
+        failures.append('delivered message carries no verification code')
+    if not wait_for(lambda: spooled() == 0):
+        failures.append(f'{spooled()} spool rows left after delivery')
+    print(f'delivered: {len(smtp.messages)} message(s), {spooled()} spooled, {mail_queue.stats()}')
+
+    # Nothing sent on rollback
+    with app.app_context():
+        mail_queue.enqueue_on_commit(Message(subject='Rolled back', sender='noreply@example.com',
+                                             recipients=[EMAIL], body='never sent'))
+        db.session.rollback()
+        db.session.commit()
+    time.sleep(0.5)
+    if len(smtp.messages) != 1 or spooled():
+        failures.append('message staged in a rolled-back transaction was sent or spooled')
+
+    # SMTP outage: the message stays spooled and goes out once the server is back
+    port = smtp.port
+    smtp.stop()
+    failed_before = mail_queue.stats()['failed']
+    login(client)
+    if not wait_for(lambda: mail_queue.stats()['failed'] > failed_before):
+        failures.append('send to a stopped SMTP server did not fail')
+    if spooled() != 1:
+        failures.append(f'{spooled()} spool rows after a failed send, expected 1')
+    print(f'outage: {spooled()} spooled, {mail_queue.stats()}')
+    smtp = MockSMTPServer(port).start()
+    if not wait_for(lambda: len(smtp.messages) == 1):
+        failures.append('failed message not retried once the server was back')
+    if not wait_for(lambda: spooled() == 0):
+        failures.append(f'{spooled()} spool rows left after the retry')
+    print(f'recovered: {len(smtp.messages)} message(s) after restart, {spooled()} spooled, {mail_queue.stats()}')
+
+    mail_queue.shutdown()
+    smtp.stop()
+
+    check_claims(failures)
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Check OAuth profile normalization against recorded provider payloads.
+
+Feeds the payloads in fixtures/oauth_profiles.json through the provider
+registry (auth/oauth_providers.py) with a stand-in Authlib client, and
+exits non-zero if:
+- a mapper's normalized profile differs from the recorded expectation
+- a profile is fetched from the wrong endpoint or with the wrong params
+- a client is registered before first use, or for an unconfigured
+  provider
+
+Usage:
+    python benchmarks/check_oauth_mappers.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from auth.oauth_providers import DEFAULT_PROVIDERS, ProviderRegistry
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'oauth_profiles.json')
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class StubClient:
+    """Answers profile requests with a recorded payload."""
+
+    def __init__(self, name):
+        self.name = name
+        self.payload = None
+        self.calls = []
+
+    def get(self, endpoint, params=None):
+        self.calls.append((endpoint, params))
+        return StubResponse(self.payload)
+
+    def parse_id_token(self, token, nonce=None):
+        raise AssertionError('ID token claims should come from the token response')
+
+
+class StubOAuth:
+    """Records client registrations."""
+
+    def __init__(self):
+        self.registered = []
+
+    def register(self, name, **kwargs):
+        self.registered.append(name)
+        return StubClient(name)
+
+
+def main():
+    with open(FIXTURES) as f:
+        fixtures = json.load(f)
+
+    app = Flask(__name__)
+    configured = [name for name in DEFAULT_PROVIDERS if name != 'instagram']
+    for name in DEFAULT_PROVIDERS:
+        app.config[f'{name.upper()}_CLIENT_ID'] = f'{name}-client' if name in configured else None
+    oauth = StubOAuth()
+    registry = ProviderRegistry()
+    registry.init_app(app, oauth)
+
+    failures = []
+    if oauth.registered:
+        failures.append(f'clients registered at startup: {oauth.registered}')
+    if 'instagram' in registry or registry.client('instagram') is not None:
+        failures.append('unconfigured provider instagram is offered')
+
+    # Configure every provider to check each mapper
+    app.config['INSTAGRAM_CLIENT_ID'] = 'instagram-client'
+    oauth.registered = []
+    registry.init_app(app, oauth)
+
+    checked = 0
+    for name, cases in fixtures.items():
+        client = registry.client(name)
+        if registry.client(name) is not client:
+            failures.append(f'{name}: client rebuilt on second use')
+        userinfo = DEFAULT_PROVIDERS[name]['userinfo']
+        for case in cases:
+            label = f"{name} ({case['description']})"
+            client.payload = case.get('response')
+            client.calls = []
+            profile = registry.fetch_profile(name, client, case.get('token', {'access_token': 'stub'}))
+            if profile != case['expected']:
+                failures.append(f'{label}: got {profile}, expected {case["expected"]}')
+            expected_calls = [] if userinfo is None else [(userinfo['endpoint'], userinfo.get('params'))]
+            if client.calls != expected_calls:
+                failures.append(f'{label}: requested {client.calls}, expected {expected_calls}')
+            checked += 1
+
+    if sorted(oauth.registered) != sorted(fixtures):
+        failures.append(f'registered {oauth.registered}, expected one client per provider')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{checked} recorded payloads checked, {len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Check that concurrent first OAuth logins for one account create one user.
+
+Calls ``User.get_or_create`` for the same provider identity from many
+threads at once (default 50), each in its own app context and database session, and
+exits non-zero if:
+- any login fails (e.g. on the email unique constraint)
+- the logins resolve to more than one user, or more than one row exists
+- a returning login with an unchanged profile and a warm identity cache
+  sends any SQL
+- a changed name is not written, or the identity cache serves the old one
+
+Usage:
+    python benchmarks/check_oauth_upsert.py [logins]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'oauth_upsert.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+
+from flask import g
+
+from app import create_app
+from auth import db
+from auth.identity_cache import identity_cache
+from auth.models import User
+
+app = create_app()
+
+PROFILE = {
+    'sub': '583231',
+    'email': 'octocat@github.com',
+    'name': 'The Octocat',
+    'picture': 'https://avatars.githubusercontent.com/u/583231?v=4',
+}
+
+
+def first_logins(count):
+    """Run ``count`` simultaneous first logins; returns (user ids, errors)."""
+    barrier = threading.Barrier(count)
+    user_ids, errors = [], []
+
+    def login():
+        with app.app_context():
+            barrier.wait()
+            try:
+                user = User.get_or_create('github', dict(PROFILE))
+                db.session.commit()
+                user_ids.append(user.id)
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=login) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return user_ids, errors
+
+
+def counted_login(profile):
+    """Log in once; returns (user id, fullname, statements sent)."""
+    with app.app_context():
+        g.sql_statements = 0
+        user = User.get_or_create('github', profile)
+        # Read before the commit expires the attributes
+        user_id, fullname = user.id, user.fullname
+        db.session.commit()
+        return user_id, fullname, g.sql_statements
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    with app.app_context():
+        db.create_all()
+
+    failures = []
+    user_ids, errors = first_logins(count)
+    for error in sorted(set(errors)):
+        failures.append(f'login failed: {error}')
+    if len(set(user_ids)) != 1:
+        failures.append(f'{count} logins resolved to users {sorted(set(user_ids))}')
+    with app.app_context():
+        rows = User.query.filter_by(provider='github', provider_id=PROFILE['sub']).count()
+    if rows != 1:
+        failures.append(f'{rows} rows for one identity')
+
+    # The first returning login loads the row into the identity cache,
+    # as the user loader would on the next request
+    counted_login(dict(PROFILE))
+    _, _, statements = counted_login(dict(PROFILE))
+    if statements:
+        failures.append(f'unchanged returning login sent {statements} statements')
+
+    counted_login(dict(PROFILE, name='Mona Lisa Octocat'))
+    with app.app_context():
+        stored = db.session.execute(db.select(User.fullname).filter_by(provider_id=PROFILE['sub'])).scalar()
+    _, cached_name, _ = counted_login(dict(PROFILE, name='Mona Lisa Octocat'))
+    if stored != 'Mona Lisa Octocat' or cached_name != stored:
+        failures.append(f'name change: stored {stored!r}, cached {cached_name!r}')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{count} concurrent first logins -> {len(set(user_ids))} user(s), '
+          f'identity cache {identity_cache.stats()}, {len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
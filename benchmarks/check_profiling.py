@@ -0,0 +1,146 @@
+"""
+Check the request profiler and slow-request log (auth/profiling.py).
+
+Logs in with the profiling header and exits non-zero if:
+- a request with the right token is not profiled, or the collapsed
+  stacks or speedscope file are missing, empty or do not reach the view
+- a request without the header, or with a wrong token, is profiled
+- the slow-request log for the login lacks its SQL statements or the
+  password_verify hash job
+- with profiling and the slow log off, any request hook is installed
+
+Usage:
+    python benchmarks/check_profiling.py
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKDIR = tempfile.mkdtemp()
+TOKEN = 'profile-secret'
+EMAIL = 'profiled@example.com'
+PASSWORD = 'correct horse battery staple'
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORKDIR, 'profiling.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['PROFILING_ENABLED'] = 'True'
+os.environ['PROFILING_TOKEN'] = TOKEN
+os.environ['PROFILING_DIR'] = os.path.join(WORKDIR, 'profiles')
+os.environ['PROFILING_INTERVAL'] = '0.001'
+os.environ['SLOW_REQUEST_MS'] = '0'
+
+from flask import Flask
+
+from captured_mail import CapturedMail
+from app import create_app
+from auth import db
+from auth.mail_queue import mail_queue
+from auth.models import User
+from auth.passwords import hash_password
+from auth.profiling import RequestProfiler
+from auth.rate_limit import limiter
+
+app = create_app()
+
+
+class CapturedLog(logging.Handler):
+    """Collects slow-request records from auth.profiling."""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def login(client, headers=None):
+    """POST a login; returns (response, slow-request log records)."""
+    captured = CapturedLog()
+    logger = logging.getLogger('auth.profiling')
+    logger.addHandler(captured)
+    try:
+        response = client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD}, headers=headers or {})
+    finally:
+        logger.removeHandler(captured)
+    return response, captured.records
+
+
+def main():
+    mail_queue.mail = CapturedMail()
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    failures = []
+    client = app.test_client()
+    profile_dir = app.config['PROFILING_DIR']
+
+    response, log = login(client, {'X-Profile': TOKEN})
+    profile_id = response.headers.get('X-Profile-Id')
+    if not profile_id:
+        failures.append('request with the profiling token was not profiled')
+    else:
+        collapsed_path = os.path.join(profile_dir, 'auth.login_page.collapsed')
+        speedscope_path = os.path.join(profile_dir, f'auth.login_page-{profile_id}.speedscope.json')
+        if not os.path.exists(collapsed_path):
+            failures.append(f'no collapsed stacks at {collapsed_path}')
+        else:
+            with open(collapsed_path) as f:
+                lines = f.read().splitlines()
+            if not any('login_page (' in line for line in lines):
+                failures.append(f'collapsed stacks ({len(lines)} lines) never reach login_page')
+            if not all(line.rsplit(' ', 1)[-1].isdigit() for line in lines):
+                failures.append('collapsed stack line without a sample count')
+        if not os.path.exists(speedscope_path):
+            failures.append(f'no speedscope file at {speedscope_path}')
+        else:
+            with open(speedscope_path) as f:
+                profile = json.load(f)['profiles'][0]
+            if not profile['samples'] or len(profile['samples']) != len(profile['weights']):
+                failures.append('speedscope profile has no samples or mismatched weights')
+        print(f'profiled login {profile_id}: {collapsed_path}')
+
+    slow = [record for record in log if getattr(record, 'event', None) == 'slow_request']
+    if not slow or not slow[0].getMessage().startswith('Slow request: POST /auth/login (auth.login_page)'):
+        failures.append('login missing from the slow-request log')
+    else:
+        record = slow[0]
+        if not record.sql:
+            failures.append('slow-request log lists no SQL statements')
+        if 'password_verify' not in [job['job'] for job in record.hashes]:
+            failures.append('slow-request log lists no password_verify hash job')
+        print(record.getMessage())
+        for statement in record.sql:
+            print(f"  sql  {statement['ms']:8.2f} ms  {statement['statement']}")
+        for job in record.hashes:
+            print(f"  hash {job['ms']:8.2f} ms  {job['job']}")
+
+    for label, headers in (('no header', None), ('wrong token', {'X-Profile': 'guess'})):
+        response, _ = login(app.test_client(), headers)
+        if 'X-Profile-Id' in response.headers:
+            failures.append(f'request with {label} was profiled')
+
+    idle = Flask(__name__)
+    idle.config.update(PROFILING_ENABLED=False, SLOW_REQUEST_MS=None)
+    RequestProfiler().init_app(idle)
+    if idle.before_request_funcs or idle.after_request_funcs or idle.teardown_request_funcs:
+        failures.append('hooks installed with profiling and the slow log off')
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Check that the hot user lookups are served by indexes.
+
+Builds a SQLite database from the User model, fills it with synthetic
+users (1,000,000 by default) and runs EXPLAIN QUERY PLAN for each hot
+lookup. Exits non-zero if any lookup falls back to a table scan.
+
+Usage:
+    python benchmarks/check_query_plans.py [num_users]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import text
+
+from auth import db
+from auth.models import User, normalize_email
+
+BATCH_SIZE = 50000
+
+
+def populate(num_users):
+    """Insert synthetic local and OAuth users in batches."""
+    insert = User.__table__.insert()
+    for start in range(0, num_users, BATCH_SIZE):
+        rows = []
+        for i in range(start, min(start + BATCH_SIZE, num_users)):
+            email = f'User{i}@Example.com'
+            oauth = i % 2 == 0
+            rows.append({
+                'username': email,
+                'email': email,
+                'email_lower': normalize_email(email),
+                'password': '' if oauth else 'pbkdf2:sha256:260000$salt$hash',
+                'provider': 'google' if oauth else 'local',
+                'provider_id': str(i) if oauth else None,
+            })
+        db.session.execute(insert, rows)
+    db.session.commit()
+
+
+def hot_lookups():
+    """Return (name, query) pairs for the lookups used by the auth routes."""
+    return [
+        ('load_user (primary key)', User.query.filter_by(id=12345)),
+        ('find_by_email', User.query.filter_by(email_lower=normalize_email('User777@example.com'))),
+        ('get_or_create', User.query.filter_by(provider='google', provider_id='4242')),
+    ]
+
+
+def explain(query):
+    """Return the SQLite query plan for an ORM query as one string."""
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')).fetchall()
+    return ' | '.join(str(row[-1]) for row in rows)
+
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    path = os.path.join(tempfile.mkdtemp(), 'plans.db')
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        populate(num_users)
+        print(f'Inserted {num_users} users in {time.perf_counter() - started:.1f}s')
+        db.session.execute(text('ANALYZE'))
+
+        for name, query in hot_lookups():
+            plan = explain(query)
+            # Rowid lookups are reported as USING INTEGER PRIMARY KEY
+            indexed = ('USING INDEX' in plan or 'USING COVERING INDEX' in plan
+                       or 'USING INTEGER PRIMARY KEY' in plan) and 'SCAN' not in plan
+            failures += 0 if indexed else 1
+            print(f"{'OK  ' if indexed else 'SCAN'} {name}: {plan}")
+
+    os.remove(path)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Check that password reset tokens are single-use.
+
+Drives the reset flow with the Flask test client and exits non-zero if:
+- a redeemed token is accepted again (GET or POST)
+- a token issued before a password change is accepted afterwards,
+  even when the revocation list has been lost (e.g. a worker restart)
+- a forged or expired token is accepted
+- a redeemed token needs a database read to be rejected
+
+Usage:
+    python benchmarks/check_reset_tokens.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'reset_tokens.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['SQL_STATS_HEADERS'] = 'True'
+
+from app import create_app
+from auth import db
+from auth.models import User
+from auth.passwords import hash_password
+from auth.rate_limit import limiter
+from auth.routes.auth import generate_token, verify_token
+from auth.tokens import token_service
+
+app = create_app()
+
+EMAIL = 'reset@example.com'
+
+
+def issue():
+    with app.app_context():
+        return generate_token(User.find_by_email(EMAIL))
+
+
+def accepted(client, token, method='GET', password='new password 1'):
+    """Return (accepted, SQL statements) for one reset request."""
+    form = {'password': password, 'confirm_password': password} if method == 'POST' else None
+    response = client.open(f'/auth/reset-password/{token}', method=method, data=form)
+    location = response.headers.get('Location', '')
+    ok = response.status_code == 200 if method == 'GET' else 'login' in location
+    return ok, int(response.headers.get('X-SQL-Statements', 0))
+
+
+def main():
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password('old password')))
+        db.session.commit()
+    client = app.test_client()
+    failures = []
+
+    def expect(name, condition):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    token = issue()
+    expect('fresh token accepted (GET)', accepted(client, token)[0])
+    expect('fresh token accepted (POST)', accepted(client, token, 'POST')[0])
+    reused, statements = accepted(client, token)
+    expect('redeemed token rejected (GET)', not reused)
+    expect('redeemed token rejected without SQL', statements == 0)
+    expect('redeemed token rejected (POST)', not accepted(client, token, 'POST', 'new password 2')[0])
+
+    # A second link issued before the reset stops working once it is used,
+    # even if this process forgets its revocation list
+    first, second = issue(), issue()
+    expect('second fresh token accepted (POST)', accepted(client, first, 'POST', 'new password 3')[0])
+    token_service.revoked = type(token_service.revoked)()
+    expect('token from before the password change rejected', not accepted(client, second)[0])
+    expect('redeemed token rejected after revocations are lost', not accepted(client, first)[0])
+
+    expect('forged token rejected', not accepted(client, issue()[:-2] + 'xx')[0])
+    with app.app_context():
+        expect('expired token rejected', verify_token(issue(), expiration=-1) is None)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
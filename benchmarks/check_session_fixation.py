@@ -0,0 +1,91 @@
+"""
+Check that server-side session ids are rotated on login.
+
+Drives the password login and 2FA flows with the memory session backend
+and exits non-zero if:
+- the session id from before a successful password check is kept
+- the session id from before a successful 2FA verification is kept
+- a replaced session id can still be read from the store
+
+Usage:
+    python benchmarks/check_session_fixation.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'session_fixation.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['SESSION_BACKEND'] = 'memory'
+
+from captured_mail import CapturedMail
+from app import create_app
+from auth import db
+from auth.mail_queue import mail_queue
+from auth.models import User
+from auth.passwords import hash_password
+from auth.rate_limit import limiter
+
+app = create_app()
+
+EMAIL = 'fixation@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+def session_id(client):
+    """Session id in the test client's cookie jar."""
+    return next((c.value for c in client.cookie_jar if c.name == app.session_cookie_name), None)
+
+
+def main():
+    captured = CapturedMail()
+    mail_queue.mail = captured
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(email=EMAIL, username=EMAIL, password=hash_password(PASSWORD), twofa_verified=True))
+        db.session.commit()
+
+    failures = []
+    store = app.session_interface.store
+    client = app.test_client()
+
+    # A failed login flashes a message, which stores a session: the id an
+    # attacker could plant in a victim's browser
+    client.post('/auth/login', data={'email': EMAIL, 'password': 'wrong'})
+    planted = session_id(client)
+    if planted is None:
+        failures.append('failed login stored no session to start from')
+
+    client.post('/auth/login', data={'email': EMAIL, 'password': PASSWORD})
+    pending = session_id(client)
+    if pending == planted:
+        failures.append('session id kept across the password check')
+    if planted and store.get(planted) is not None:
+        failures.append('pre-login session id still in the store')
+
+    response = client.post('/auth/2fa/verify', data={'code': captured.last_code()})
+    if 'profile' not in response.headers.get('Location', ''):
+        failures.append(f'2FA verification failed ({response.status_code})')
+    verified = session_id(client)
+    if verified == pending:
+        failures.append('session id kept across 2FA verification')
+    if pending and store.get(pending) is not None:
+        failures.append('pre-verification session id still in the store')
+    if client.get('/auth/profile').status_code != 200:
+        failures.append('logged-in session lost after rotation')
+
+    print(f'session ids: planted {str(planted)[:8]}… -> password {str(pending)[:8]}… -> 2FA {str(verified)[:8]}…')
+    for failure in failures:
+        print(f'FAIL {failure}')
+    print(f'{len(failures)} failures')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Check SQL statement and commit budgets for each auth route.
+
+Drives the real app through signup, 2FA verification, profile views,
+login, 2FA settings and password reset with the Flask test client and
+reads the per-request counters from auth/query_stats.py. Exits non-zero
+if any request exceeds its statement or commit budget.
+
+Outbound mail is captured in memory instead of being sent, so the
+verification codes can be read back.
+
+Usage:
+    python benchmarks/check_sql_budgets.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'budgets.db')}"
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['HASH_POOL_SIZE'] = '0'
+os.environ['SQL_STATS_HEADERS'] = 'True'
+
+from captured_mail import CapturedMail
+
+from app import create_app
+from auth import db
+from auth.mail_queue import mail_queue
+from auth.models import User
+from auth.rate_limit import limiter
+from auth.routes.auth import generate_token
+
+app = create_app()
+
+EMAIL = 'budget@example.com'
+PASSWORD = 'correct horse battery staple'
+
+
+def main():
+    captured = CapturedMail()
+    mail_queue.mail = captured
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    # (name, method, path or callable, form data or callable, max statements, max commits)
+    steps = [
+        ('signup', 'POST', '/auth/signup', lambda: {'email': EMAIL, 'password': PASSWORD}, 3, 1),
+        ('verify (signup)', 'POST', '/auth/2fa/verify', lambda: {'code': captured.last_code()}, 3, 1),
+        ('profile (cold)', 'GET', '/auth/profile', None, 1, 0),
+        ('profile (cached)', 'GET', '/auth/profile', None, 0, 0),
+        ('logout', 'GET', '/auth/logout', None, 1, 0),
+        ('login', 'POST', '/auth/login', lambda: {'email': EMAIL, 'password': PASSWORD}, 3, 1),
+        ('verify (login)', 'POST', '/auth/2fa/verify', lambda: {'code': captured.last_code()}, 3, 1),
+        ('2fa settings enable', 'POST', '/auth/2fa/settings', lambda: {'enable_2fa': 'on'}, 3, 1),
+        ('2fa settings disable', 'POST', '/auth/2fa/settings', lambda: {}, 3, 1),
+        ('forgot password', 'POST', '/auth/forgot-password', lambda: {'email': EMAIL}, 2, 0),
+        ('reset password (GET)', 'GET', lambda: f'/auth/reset-password/{reset_token()}', None, 2, 0),
+        ('reset password (POST)', 'POST', lambda: f'/auth/reset-password/{reset_token()}',
+         lambda: {'password': PASSWORD, 'confirm_password': PASSWORD}, 3, 1),
+    ]
+
+    def reset_token():
+        with app.app_context():
+            return generate_token(User.find_by_email(EMAIL))
+
+    failures = 0
+    print(f"{'route':<24}{'statements':>12}{'commits':>10}")
+    for name, method, path, data, max_statements, max_commits in steps:
+        url = path() if callable(path) else path
+        form = data() if callable(data) else data
+        response = client.open(url, method=method, data=form)
+        statements = int(response.headers.get('X-SQL-Statements', 0))
+        commits = int(response.headers.get('X-SQL-Commits', 0))
+        over = statements > max_statements or commits > max_commits
+        failures += over
+        print(f"{name:<24}{statements:>8} /{max_statements:<3}{commits:>6} /{max_commits:<3}"
+              f"{'  OVER BUDGET' if over else ''}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
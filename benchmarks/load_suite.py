@@ -0,0 +1,403 @@
+"""
+Load test the full auth flows and record the results as JSON.
+
+Drives the real app concurrently through each flow, either in-process
+with the Flask test client or over HTTP against a threaded Werkzeug
+WSGI server on localhost:
+- signup: signup form, then the emailed 2FA code
+- login: login page, password login, emailed 2FA code, profile
+- oauth: GitHub sign-in against a local mock provider (first login
+  for each iteration's account)
+- reset: forgot password, reset link from the page, new password
+- profile: authenticated profile views on logged-in sessions
+
+Mail is captured in memory (see captured_mail.py) so codes can be read
+back. For each flow and driver it reports requests per second, p50/p95/
+p99 request latency, SQL statements per request (from the
+X-SQL-Statements header) and CPU time per flow. CPU time is measured for
+this process, which also runs the client side and the mock provider;
+password hashing runs inline (HASH_POOL_SIZE=0) unless the environment
+says otherwise, so that it is included.
+
+Results are written to benchmarks/results/ (or --output) as JSON, and
+--compare prints the change against an earlier results file, e.g. to
+check a Flask/Werkzeug upgrade or a config change for regressions.
+
+Usage:
+    python benchmarks/load_suite.py [--driver test-client|server|both]
+        [--flows signup,login,oauth,reset,profile] [--iterations 40]
+        [--concurrency 4] [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark-secret')
+os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}")
+os.environ.setdefault('HASH_POOL_SIZE', '0')
+os.environ['MAIL_QUEUE_ENABLED'] = 'False'
+os.environ['SQL_STATS_HEADERS'] = 'True'
+# The mock provider's client id must be set before the app starts
+os.environ['GITHUB_CLIENT_ID'] = 'mock-client'
+
+import requests
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from captured_mail import CapturedMail
+from mock_oauth_provider import MockOAuthProvider
+
+from app import create_app
+from auth import db
+from auth.mail_queue import mail_queue
+from auth.models import User
+from auth.passwords import hash_password
+from auth.rate_limit import limiter
+
+app = create_app()
+
+FLOWS = ('signup', 'login', 'oauth', 'reset', 'profile')
+PASSWORD = 'correct horse battery staple'
+# Settings that change the numbers; recorded with each run
+CONFIG_KEYS = (
+    'PASSWORD_HASH_ALGORITHM', 'PASSWORD_HASH_ITERATIONS', 'HASH_POOL_SIZE', 'TWOFA_CODE_HASHER',
+    'TWOFA_CHALLENGE_BACKEND', 'SESSION_BACKEND', 'IDENTITY_CACHE_BACKEND', 'RATELIMIT_STORAGE_URI',
+    'OAUTH_HTTP_POOL',
+)
+
+# Figures shown as a change against --compare, with their labels
+COMPARED = {'requests_per_second': 'req/s', 'p95_ms': 'p95', 'sql_per_request': 'sql', 'cpu_ms_per_flow': 'cpu'}
+
+Reply = namedtuple('Reply', 'status headers text')
+
+
+class FlowError(Exception):
+    """Raised when a response is not the one the flow expects."""
+
+
+class TestClientDriver:
+    """Sends requests in-process through the Flask test client."""
+    name = 'test-client'
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def session(self):
+        client = app.test_client()
+
+        def send(method, path, data):
+            response = client.open(path, method=method, data=data)
+            return Reply(response.status_code, response.headers, response.get_data(as_text=True))
+        return send
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class ServerDriver:
+    """Sends requests over HTTP to a threaded Werkzeug server."""
+    name = 'server'
+
+    def __init__(self):
+        self._server = None
+
+    def start(self):
+        self._server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=_QuietHandler)
+        threading.Thread(target=self._server.serve_forever, name='load-suite-wsgi', daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def session(self):
+        http = requests.Session()
+        base_url = f'http://127.0.0.1:{self._server.server_port}'
+
+        def send(method, path, data):
+            response = http.request(method, base_url + path, data=data, allow_redirects=False)
+            return Reply(response.status_code, response.headers, response.text)
+        return send
+
+
+class Client:
+    """One browser session, recording latency and SQL statements per request."""
+
+    def __init__(self, send, samples):
+        self.send = send
+        self.samples = samples
+
+    def request(self, method, path, data=None, expect=(200,)):
+        started = time.perf_counter()
+        reply = self.send(method, path, data)
+        elapsed = time.perf_counter() - started
+        if self.samples is not None:
+            self.samples.append((elapsed, int(reply.headers.get('X-SQL-Statements', 0))))
+        if reply.status not in expect:
+            raise FlowError(f'{method} {path} returned {reply.status}')
+        return reply
+
+    def get(self, path, expect=(200,)):
+        return self.request('GET', path, expect=expect)
+
+    def post(self, path, data, expect=(302,)):
+        return self.request('POST', path, data, expect=expect)
+
+
+class Flows:
+    """
+    The user journeys, each run as ``flow(client, worker, iteration)``.
+
+    Args:
+        mail (CapturedMail): Mail stand-in to read codes from
+        run_id (str): Prefix keeping account emails unique per run
+    """
+
+    def __init__(self, mail, run_id):
+        self.mail = mail
+        self.run_id = run_id
+
+    def email(self, flow, worker, iteration=0):
+        return f'{flow}-{self.run_id}-{worker}-{iteration}@load.test'
+
+    def seed(self, flow, workers, password_hash):
+        """Create one verified local account per worker for a flow."""
+        with app.app_context():
+            for worker in range(workers):
+                db.session.add(User(
+                    email=self.email(flow, worker),
+                    password=password_hash,
+                    provider='local',
+                    twofa_enabled=True,
+                    twofa_method='email',
+                ))
+            db.session.commit()
+
+    def signup(self, client, worker, iteration):
+        email = self.email('signup', worker, iteration + 1)
+        client.post('/auth/signup', {'fullname': 'Load Test', 'email': email, 'password': PASSWORD})
+        client.post('/auth/2fa/verify', {'code': self.mail.code_for(email)})
+
+    def login(self, client, worker, iteration):
+        self._login(client, self.email('login', worker))
+
+    def _login(self, client, email):
+        client.get('/auth/login')
+        client.post('/auth/login', {'email': email, 'password': PASSWORD})
+        client.post('/auth/2fa/verify', {'code': self.mail.code_for(email)})
+        client.get('/auth/profile')
+
+    def oauth(self, client, worker, iteration):
+        location = client.get('/auth/login/github', expect=(302,)).headers['Location']
+        state = parse_qs(urlparse(location).query)['state'][0]
+        # A fresh code gives a fresh access token, and so a new account
+        code = f'{self.run_id}-{worker}-{iteration}-{time.time_ns()}'
+        client.get(f'/auth/authorize/github?code={code}&state={state}', expect=(302,))
+
+    def reset(self, client, worker, iteration):
+        client.post('/auth/forgot-password', {'email': self.email('reset', worker)})
+        page = client.get('/auth/forgot-password').text
+        match = re.search(r'/auth/reset-password/([\w.\-]+)', page)
+        if match is None:
+            raise FlowError('no reset link on the forgot password page')
+        path = f'/auth/reset-password/{match.group(1)}'
+        client.get(path)
+        client.post(path, {'password': PASSWORD, 'confirm_password': PASSWORD})
+
+    def profile_setup(self, client, worker):
+        self._login(client, self.email('profile', worker))
+
+    def profile(self, client, worker, iteration):
+        client.get('/auth/profile')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def run_flow(driver, flows, name, iterations, concurrency):
+    """
+    Run one flow from ``concurrency`` workers.
+
+    Returns:
+        dict: Throughput, latency, SQL and CPU figures for the flow
+    """
+    flow = getattr(flows, name)
+    setup = getattr(flows, f'{name}_setup', None)
+    per_worker = [iterations // concurrency + (w < iterations % concurrency) for w in range(concurrency)]
+    samples = [[] for _ in range(concurrency)]
+    errors = []
+    ready = threading.Barrier(concurrency + 1)
+    done = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        client = Client(driver.session(), None)
+        try:
+            if setup is not None:
+                setup(client, index)
+        except Exception as e:
+            errors.append(f'setup: {e!r}')
+        ready.wait()
+        client.samples = samples[index]
+        for iteration in range(per_worker[index]):
+            try:
+                # Flows other than profile start from a fresh browser session
+                if setup is None:
+                    client = Client(driver.session(), samples[index])
+                flow(client, index, iteration)
+            except Exception as e:
+                errors.append(repr(e))
+        done.wait()
+
+    threads = [threading.Thread(target=worker, args=(w,), daemon=True) for w in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    started, cpu_started = time.perf_counter(), time.process_time()
+    done.wait()
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    for thread in threads:
+        thread.join()
+
+    latencies = [latency for worker_samples in samples for latency, _ in worker_samples]
+    statements = [count for worker_samples in samples for _, count in worker_samples]
+    completed = iterations - len([e for e in errors if not e.startswith('setup')])
+    return {
+        'iterations': iterations,
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'requests': len(latencies),
+        'seconds': round(elapsed, 4),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'flows_per_second': round(completed / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'sql_per_request': round(sum(statements) / len(statements), 2) if statements else 0.0,
+        'cpu_ms_per_flow': round(cpu / iterations * 1000, 2) if iterations else 0.0,
+    }
+
+
+def package_versions():
+    found = {}
+    for package in ('Flask', 'Werkzeug', 'SQLAlchemy', 'Flask-SQLAlchemy', 'Authlib'):
+        try:
+            found[package] = version(package)
+        except PackageNotFoundError:
+            found[package] = None
+    return found
+
+
+def print_results(results, previous=None):
+    print(f"{'driver':<12}{'flow':<9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'sql/req':>9}{'cpu ms/flow':>13}{'errors':>8}")
+    for driver, flows in results['drivers'].items():
+        for name, row in flows.items():
+            line = (f"{driver:<12}{name:<9}{row['requests_per_second']:>8}{row['p50_ms']:>9}"
+                    f"{row['p95_ms']:>9}{row['p99_ms']:>9}{row['sql_per_request']:>9}"
+                    f"{row['cpu_ms_per_flow']:>13}{row['errors']:>8}")
+            before = (previous or {}).get('drivers', {}).get(driver, {}).get(name)
+            if before:
+                line += '  ' + '  '.join(
+                    f"{label} {change(before[key], row[key])}" for key, label in COMPARED.items()
+                )
+            print(line)
+            for error in row['error_samples']:
+                print(f'    {error}')
+
+
+def change(before, after):
+    if not before:
+        return 'n/a'
+    return f'{(after - before) / before * 100:+.0f}%'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--driver', choices=('test-client', 'server', 'both'), default='both')
+    parser.add_argument('--flows', default=','.join(FLOWS))
+    parser.add_argument('--iterations', type=int, default=40, help='Flow runs per flow and driver')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent browser sessions')
+    parser.add_argument('--provider-latency', type=float, default=0.0, help='Mock OAuth provider delay (s)')
+    parser.add_argument('--output', help='Results file (default benchmarks/results/load-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    names = [name for name in args.flows.split(',') if name]
+    unknown = set(names) - set(FLOWS)
+    if unknown:
+        parser.error(f"unknown flows: {', '.join(sorted(unknown))}")
+    drivers = {'test-client': [TestClientDriver()], 'server': [ServerDriver()],
+               'both': [TestClientDriver(), ServerDriver()]}[args.driver]
+
+    mail = CapturedMail()
+    mail_queue.mail = mail
+    limiter.enabled = False
+    provider = MockOAuthProvider(latency=args.provider_latency).start()
+    app.config.update(provider.config('github'))
+    with app.app_context():
+        db.create_all()
+    password_hash = hash_password(PASSWORD)
+
+    stamp = datetime.now(timezone.utc)
+    results = {
+        'created': stamp.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'packages': package_versions(),
+        'config': {key: app.config.get(key, os.getenv(key)) for key in CONFIG_KEYS},
+        'iterations': args.iterations,
+        'concurrency': args.concurrency,
+        'drivers': {},
+    }
+    for driver in drivers:
+        flows = Flows(mail, f'{driver.name}-{stamp:%H%M%S}')
+        for name in ('login', 'reset', 'profile'):
+            if name in names:
+                flows.seed(name, args.concurrency, password_hash)
+        driver.start()
+        try:
+            results['drivers'][driver.name] = {
+                name: run_flow(driver, flows, name, args.iterations, args.concurrency) for name in names
+            }
+        finally:
+            driver.stop()
+    provider.stop()
+
+    output = args.output or os.path.join(HERE, 'results', f'load-{stamp:%Y%m%dT%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    print(f'Results written to {output}')
+    failed = sum(row['errors'] for flows in results['drivers'].values() for row in flows.values())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Local mock OAuth 2.0 provider for benchmarks.
+
+Serves a GitHub-style provider over plain HTTP on localhost:
+- GET  /authorize  Redirects back to redirect_uri with a code and state
+- POST /token      Exchanges any code for an access token
+- GET  /user       Returns a profile derived from the access token
+
+Every response can be delayed to simulate provider round trips, and the
+server counts requests and TCP connections so that connection reuse
+can be measured.
+
+Usage:
+    python benchmarks/mock_oauth_provider.py [port] [latency seconds]
+"""
+
+import hashlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without TCP_NODELAY the
+    # body waits for a delayed ACK on reused connections
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self):
+        self.server.provider.record_request()
+        if self.server.provider.latency:
+            time.sleep(self.server.provider.latency)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == '/authorize':
+            code = hashlib.sha256(f'{time.time_ns()}{query.get("state")}'.encode()).hexdigest()[:16]
+            location = f"{query['redirect_uri']}?{urlencode({'code': code, 'state': query.get('state', '')})}"
+            self.send_response(302)
+            self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self._count()
+        if url.path == '/user':
+            token = self.headers.get('Authorization', '').split(' ')[-1]
+            user_id = int(hashlib.sha256(token.encode()).hexdigest()[:12], 16)
+            self._send_json({
+                'id': user_id,
+                'login': f'mock{user_id}',
+                'name': f'Mock User {user_id}',
+                'email': f'mock{user_id}@mock.test',
+                'avatar_url': None,
+            })
+        else:
+            self._send_json({'error': 'not_found'}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        self._count()
+        if urlparse(self.path).path == '/token':
+            self._send_json({
+                'access_token': f"tok-{form.get('code', '')}",
+                'token_type': 'Bearer',
+                'expires_in': 3600,
+                'scope': 'user:email',
+            })
+        else:
+            self._send_json({'error': 'not_found'}, 404)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        self.provider.record_connection()
+        super().process_request(request, client_address)
+
+
+class MockOAuthProvider:
+    """
+    Mock provider running in a background thread.
+
+    Args:
+        port (int): Port to listen on (0 picks a free port)
+        latency (float): Seconds to delay each token and API response
+    """
+
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.provider = self
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def config(self, name):
+        """
+        App config pointing a provider at this server.
+
+        Args:
+            name (str): Provider name, e.g. 'github'
+
+        Returns:
+            dict: Authlib-style endpoint overrides and client credentials
+        """
+        prefix = name.upper()
+        return {
+            f'{prefix}_CLIENT_ID': 'mock-client',
+            f'{prefix}_CLIENT_SECRET': 'mock-secret',
+            f'{prefix}_AUTHORIZE_URL': f'{self.base_url}/authorize',
+            f'{prefix}_ACCESS_TOKEN_URL': f'{self.base_url}/token',
+            f'{prefix}_API_BASE_URL': f'{self.base_url}/',
+        }
+
+    def start(self):
+        """Serve in a daemon thread; returns self."""
+        threading.Thread(target=self._server.serve_forever, name='mock-oauth', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8900
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    provider = MockOAuthProvider(port, latency)
+    print(f"Mock OAuth provider on {provider.base_url} (latency {latency}s)")
+    provider._server.serve_forever()
@@ -0,0 +1,142 @@
+"""
+Local debugging SMTP server for benchmarks and checks.
+
+Speaks enough SMTP for smtplib and Flask-Mail (EHLO/HELO, MAIL, RCPT,
+DATA, RSET, NOOP, QUIT) without TLS or authentication, and keeps every
+message it receives. A stand-in for ``python -m aiosmtpd -n``, which is
+not a dependency of this project.
+
+Stopping the server also drops open connections, so a sender holding a
+persistent connection sees the outage on its next message.
+
+Usage:
+    python benchmarks/mock_smtp_server.py [port]
+"""
+
+import email
+import socket
+import socketserver
+import sys
+import threading
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+
+    def handle(self):
+        server = self.server.smtp
+        server.track(self.connection)
+        try:
+            self._reply('220 mock-smtp ready')
+            sender, recipients = None, []
+            for raw in self.rfile:
+                line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+                verb = line[:4].upper()
+                if verb in ('EHLO', 'HELO'):
+                    self._reply('250 mock-smtp')
+                elif verb == 'MAIL':
+                    sender, recipients = line[10:].split()[0].strip('<>'), []
+                    self._reply('250 OK')
+                elif verb == 'RCPT':
+                    recipients.append(line[8:].split()[0].strip('<>'))
+                    self._reply('250 OK')
+                elif verb == 'DATA':
+                    self._reply('354 End data with <CR><LF>.<CR><LF>')
+                    lines = []
+                    for data in self.rfile:
+                        if data in (b'.\r\n', b'.\n'):
+                            break
+                        lines.append(data[1:] if data.startswith(b'..') else data)
+                    server.record(sender, recipients, b''.join(lines))
+                    self._reply('250 OK: queued')
+                elif verb == 'RSET':
+                    sender, recipients = None, []
+                    self._reply('250 OK')
+                elif verb == 'NOOP':
+                    self._reply('250 OK')
+                elif verb == 'QUIT':
+                    self._reply('221 Bye')
+                    break
+                else:
+                    self._reply('502 Command not implemented')
+        except OSError:
+            pass
+        finally:
+            server.untrack(self.connection)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MockSMTPServer:
+    """
+    SMTP server running in a background thread.
+
+    Args:
+        port (int): Port to listen on (0 picks a free port)
+
+    Attributes:
+        messages (list): (sender, recipients, email.message.Message)
+            tuples, in the order received
+    """
+
+    def __init__(self, port=0):
+        self.messages = []
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.smtp = self
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def config(self):
+        """App config pointing Flask-Mail at this server."""
+        return {
+            'MAIL_SERVER': '127.0.0.1',
+            'MAIL_PORT': self.port,
+            'MAIL_USE_TLS': False,
+            'MAIL_USERNAME': None,
+            'MAIL_PASSWORD': None,
+        }
+
+    def record(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, email.message_from_bytes(data)))
+
+    def track(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+
+    def untrack(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+
+    def start(self):
+        """Serve in a daemon thread; returns self."""
+        threading.Thread(target=self._server.serve_forever, name='mock-smtp', daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop listening and drop open connections."""
+        self._server.shutdown()
+        self._server.server_close()
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._connections.clear()
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8025
+    server = MockSMTPServer(port)
+    print(f"Mock SMTP server on 127.0.0.1:{server.port}")
+    server._server.serve_forever()
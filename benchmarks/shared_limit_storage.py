@@ -0,0 +1,128 @@
+"""
+Shared rate limit storage for benchmarks, served by a local process.
+
+A stand-in for Redis when load testing limits across worker processes
+on one machine: ``SharedLimitServer`` hosts a single in-memory limits
+storage in a manager process, and every process that imports this
+module can reach it as ``manager://127.0.0.1:<port>`` (and, wrapped in
+auth.rate_limit.FastPathStorage, as ``fastpath+manager://...``). Each
+limiter call is a round trip to the server, as it would be to Redis.
+
+Usage:
+    server = SharedLimitServer().start()
+    os.environ['RATELIMIT_STORAGE_URI'] = server.uri
+    # import this module in every worker before create_app()
+"""
+
+import os
+import sys
+from multiprocessing.managers import BaseManager
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits.storage import MemoryStorage, MovingWindowSupport, Storage
+
+from auth.rate_limit import FastPathStorage
+
+_AUTHKEY = b'shared-limit-storage'
+_storage = None
+
+
+def _shared_storage():
+    """The server process's single storage, handed to every client."""
+    global _storage
+    if _storage is None:
+        _storage = MemoryStorage()
+    return _storage
+
+
+class _Manager(BaseManager):
+    pass
+
+
+_Manager.register('storage', callable=_shared_storage, exposed=(
+    'acquire_entry', 'get_moving_window', 'incr', 'get', 'get_expiry', 'reset', 'clear',
+))
+
+
+class SharedLimitServer:
+    """
+    Manager process holding the shared storage.
+
+    Args:
+        port (int): Port to listen on (0 picks a free port)
+    """
+
+    def __init__(self, port=0):
+        self._manager = _Manager(address=('127.0.0.1', port), authkey=_AUTHKEY)
+
+    @property
+    def uri(self):
+        host, port = self._manager.address
+        return f'manager://{host}:{port}'
+
+    def start(self):
+        """Start the server process; returns self."""
+        self._manager.start()
+        return self
+
+    def stop(self):
+        self._manager.shutdown()
+
+
+class ManagerStorage(Storage, MovingWindowSupport):
+    """Limits storage that forwards every call to a SharedLimitServer."""
+
+    STORAGE_SCHEME = ['manager']
+
+    def __init__(self, uri, **options):
+        parsed = urlparse(uri)
+        manager = _Manager(address=(parsed.hostname, parsed.port), authkey=_AUTHKEY)
+        manager.connect()
+        self._storage = manager.storage()
+        super().__init__(uri, **options)
+
+    @property
+    def base_exceptions(self):
+        return (ConnectionError, EOFError)
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        return self._storage.acquire_entry(key, limit, expiry, amount)
+
+    def get_moving_window(self, key, limit, expiry):
+        return self._storage.get_moving_window(key, limit, expiry)
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        return self._storage.incr(key, expiry, amount=amount)
+
+    def get(self, key):
+        return self._storage.get(key)
+
+    def get_expiry(self, key):
+        return self._storage.get_expiry(key)
+
+    def check(self):
+        try:
+            self._storage.get('check')
+            return True
+        except self.base_exceptions:
+            return False
+
+    def reset(self):
+        return self._storage.reset()
+
+    def clear(self, key):
+        return self._storage.clear(key)
+
+
+class FastPathManagerStorage(FastPathStorage):
+    """FastPathStorage over a SharedLimitServer (``fastpath+manager://``)."""
+
+    STORAGE_SCHEME = ['fastpath+manager']
+
+
+if __name__ == '__main__':
+    server = SharedLimitServer(int(sys.argv[1]) if len(sys.argv) > 1 else 0)._manager.get_server()
+    print(f"Shared limit storage on manager://127.0.0.1:{server.address[1]}")
+    server.serve_forever()
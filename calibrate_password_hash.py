@@ -0,0 +1,36 @@
+"""
+Password hash calibration script
+
+Measures PBKDF2 hash time on this machine and recommends
+PASSWORD_HASH_ITERATIONS for a target latency per hash.
+
+Usage:
+    python calibrate_password_hash.py [target_ms] [algorithm]
+
+Example:
+    python calibrate_password_hash.py 100 pbkdf2:sha256
+"""
+
+import sys
+
+from auth.passwords import DEFAULT_ALGORITHM, calibrate
+
+def run_calibration():
+    """
+    Run the calibration and print the recommended settings.
+    
+    Reads the target latency (default 100ms) and PBKDF2 algorithm
+    (default pbkdf2:sha256) from the command line.
+    """
+    target_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    algorithm = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_ALGORITHM
+    
+    result = calibrate(target_ms, algorithm)
+    print(f"Target: {target_ms:.0f}ms per hash using {algorithm}")
+    print(f"Measured: {result['hash_ms']:.1f}ms at {result['iterations']} iterations")
+    print("Add to your .env file:")
+    print(f"PASSWORD_HASH_ALGORITHM={algorithm}")
+    print(f"PASSWORD_HASH_ITERATIONS={result['iterations']}")
+
+if __name__ == '__main__':
+    run_calibration()
@@ -1,9 +1,11 @@
-from app import app
+from app import create_app
 from auth.models import User
 from auth import db
+from auth.identity_cache import identity_cache
 import sys
 
 def delete_all_users():
+    app = create_app()
     with app.app_context():
         try:
             # Get count before deletion
@@ -22,6 +24,8 @@ def delete_all_users():
             # Perform deletion
             User.query.delete()
             db.session.commit()
+            # Bulk deletes bypass the ORM's change tracking
+            identity_cache.clear()
             print(f"Successfully deleted {count} users")
             
         except Exception as e:
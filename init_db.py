@@ -7,7 +7,7 @@ Handles:
 - Should be run during initial setup or when schema changes
 """
 
-from app import app
+from app import create_app
 from auth.models import db
 
 def initialize_database():
@@ -21,6 +21,7 @@ def initialize_database():
     - Called directly when script is run
     - Can be imported and called from other modules
     """
+    app = create_app()
     with app.app_context():
         db.drop_all()
         db.create_all()
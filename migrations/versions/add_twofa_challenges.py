@@ -0,0 +1,37 @@
+"""Add twofa_challenges table for pending 2FA codes
+
+Revision ID: add_twofa_challenges
+Revises: add_user_lookup_indexes
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_twofa_challenges'
+down_revision = 'add_user_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'twofa_challenges',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('code_hash', sa.String(length=128), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_twofa_challenges_user_id', 'twofa_challenges', ['user_id'])
+    op.create_index('ix_twofa_challenges_expires_at', 'twofa_challenges', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_twofa_challenges_expires_at', table_name='twofa_challenges')
+    op.drop_index('ix_twofa_challenges_user_id', table_name='twofa_challenges')
+    op.drop_table('twofa_challenges')
@@ -0,0 +1,52 @@
+"""Add lookup indexes for email and OAuth identity
+
+Revision ID: add_user_lookup_indexes
+Revises: add_profile_pic_field
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_lookup_indexes'
+down_revision = 'add_profile_pic_field'
+branch_labels = None
+depends_on = None
+
+
+def _create_index(name, columns, unique=False):
+    # Build indexes without blocking writes where the database supports it.
+    # CONCURRENTLY cannot run inside a transaction on PostgreSQL.
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(name, 'users', columns, unique=unique, postgresql_concurrently=True)
+    else:
+        op.create_index(name, 'users', columns, unique=unique)
+
+
+def _drop_index(name):
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name='users', postgresql_concurrently=True)
+    else:
+        op.drop_index(name, table_name='users')
+
+
+def upgrade():
+    # Add and backfill the normalized email column
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_lower', sa.String(length=120), nullable=True))
+    op.execute('UPDATE users SET email_lower = lower(trim(email)) WHERE email IS NOT NULL')
+
+    _create_index('ix_users_email_lower', ['email_lower'])
+    _create_index('ix_users_provider_provider_id', ['provider', 'provider_id'], unique=True)
+
+
+def downgrade():
+    _drop_index('ix_users_provider_provider_id')
+    _drop_index('ix_users_email_lower')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('email_lower')
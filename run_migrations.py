@@ -5,7 +5,8 @@ This script applies all pending Alembic migrations to bring
 the database schema up to date with the current models.
 """
 
-from app import app
+from app import create_app
+from auth import init_migrations
 from flask_migrate import upgrade
 
 def run_migrations():
@@ -15,6 +16,8 @@ def run_migrations():
     Uses Flask-Migrate's upgrade command to apply all migrations
     that haven't been applied yet.
     """
+    app = create_app()
+    init_migrations(app)
     with app.app_context():
         # Run migrations
         upgrade()